@@ -0,0 +1,171 @@
+'''
+A uniform grid over floor triangles, for finding the floor height under
+a point without a CollisionTraverser.
+
+Each triangle is entered into every grid cell its XY bounds touch, so a
+query only looks at the few triangles in one cell, however many have been
+added overall.
+
+Triangles added in bulk (insertTriangles) are binned into cells with NumPy
+and kept as index arrays into their block, and only turned into the
+per-cell lists the first time a query looks in that cell.
+
+Created on Oct 18, 2026
+'''
+from math import floor
+
+import numpy
+
+# size of a grid cell, in world units
+DEFAULT_CELL_SIZE = 4.0
+
+# triangles whose XY projection is smaller than this are walls, not floors
+MIN_FLOOR_AREA = 1e-6
+
+
+class FloorGrid(object):
+    def __init__(self, cellSize=DEFAULT_CELL_SIZE):
+        self.cellSize = float(cellSize)
+        self.invCellSize = 1.0 / self.cellSize
+        self.clear()
+
+    def clear(self):
+        # (ix, iy) -> list of triangles
+        self.cells = {}
+        # (ix, iy) -> list of (terms, indices) from insertTriangles not yet
+        # added to that cell's list
+        self.pending = {}
+        self.numTriangles = 0
+
+    def getNumTriangles(self):
+        return self.numTriangles
+
+    def getNumCells(self):
+        return len(self.cells.viewkeys() | self.pending.viewkeys())
+
+    def addTriangle(self, a, b, c):
+        """
+        Add the floor triangle @a, @b, @c (each x, y, z).
+        :return: False if it is edge-on from above, so can't be stood on
+        """
+        x0, y0, z0 = a[0], a[1], a[2]
+        e1x, e1y, e1z = b[0] - x0, b[1] - y0, b[2] - z0
+        e2x, e2y, e2z = c[0] - x0, c[1] - y0, c[2] - z0
+
+        det = e1x * e2y - e2x * e1y
+        if abs(det) < MIN_FLOOR_AREA:
+            return False
+
+        # what a query needs to find (u, v) in the triangle and the z there
+        tri = (x0, y0, z0, e1x, e1y, e1z, e2x, e2y, e2z, 1.0 / det)
+
+        inv = self.invCellSize
+        self._insert(tri,
+                     int(floor(min(x0, b[0], c[0]) * inv)),
+                     int(floor(max(x0, b[0], c[0]) * inv)),
+                     int(floor(min(y0, b[1], c[1]) * inv)),
+                     int(floor(max(y0, b[1], c[1]) * inv)))
+        return True
+
+    def addQuad(self, l0, r0, l1, r1):
+        """
+        Add the quad from the row @l0, @r0 to the row @l1, @r1, as two triangles.
+        :return: how many were added (walls are skipped)
+        """
+        return self.addTriangle(l0, r0, l1) + self.addTriangle(r0, r1, l1)
+
+    def insertTriangles(self, terms, bounds):
+        """
+        Add triangles already worked out in bulk (see geomarrays.addFloorTriangles).
+        @param terms: array of shape (triangles, 10): per triangle,
+        (x0, y0, z0, e1x, e1y, e1z, e2x, e2y, e2z, 1/det) where e1 and e2 are
+        the edges from the first corner and det is the cross product of
+        their XY parts
+        @param bounds: int array of shape (triangles, 4): the cells each
+        covers, as (minX, maxX, minY, maxY)
+        """
+        terms = numpy.asarray(terms, dtype=numpy.float64)
+        minX, maxX, minY, maxY = numpy.asarray(bounds, dtype=numpy.int64).T
+        if not len(terms):
+            return
+
+        # one entry per (triangle, cell it covers)
+        height = maxY - minY + 1
+        counts = (maxX - minX + 1) * height
+        tri = numpy.repeat(numpy.arange(len(terms)), counts)
+        offset = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        ix = minX[tri] + offset // height[tri]
+        iy = minY[tri] + offset % height[tri]
+
+        # group the entries by cell
+        order = numpy.lexsort((iy, ix))
+        tri, ix, iy = tri[order], ix[order], iy[order]
+        starts = numpy.flatnonzero(numpy.concatenate(([True], (ix[1:] != ix[:-1]) | (iy[1:] != iy[:-1]))))
+        ends = numpy.append(starts[1:], len(tri))
+
+        pending = self.pending
+        for x, y, start, end in zip(ix[starts].tolist(), iy[starts].tolist(), starts.tolist(), ends.tolist()):
+            blocks = pending.get((x, y))
+            if blocks is None:
+                pending[x, y] = [(terms, tri[start:end])]
+            else:
+                blocks.append((terms, tri[start:end]))
+
+        self.numTriangles += len(terms)
+
+    def _unpack(self, key):
+        """ Add the bulk triangles waiting for cell @key to its list. """
+        triangles = []
+        for terms, indices in self.pending.pop(key):
+            triangles.extend(tuple(tri) for tri in terms[indices].tolist())
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = triangles
+        else:
+            cell.extend(triangles)
+
+    def _insert(self, tri, minX, maxX, minY, maxY):
+        cells = self.cells
+        for ix in xrange(minX, maxX + 1):
+            for iy in xrange(minY, maxY + 1):
+                cell = cells.get((ix, iy))
+                if cell is None:
+                    cells[ix, iy] = [tri]
+                else:
+                    cell.append(tri)
+
+        self.numTriangles += 1
+
+    def getFloorHeight(self, x, y, top=None, bottom=None):
+        """
+        Find the highest floor under (@x, @y).
+        @param top: if not None, ignore floors above this height
+        @param bottom: if not None, ignore floors below this height
+        :return: the floor's height, or None
+        """
+        inv = self.invCellSize
+        key = int(floor(x * inv)), int(floor(y * inv))
+        if key in self.pending:
+            self._unpack(key)
+        cell = self.cells.get(key)
+        if not cell:
+            return None
+
+        best = None
+        for x0, y0, z0, e1x, e1y, e1z, e2x, e2y, e2z, invDet in cell:
+            px = x - x0
+            py = y - y0
+            u = (px * e2y - e2x * py) * invDet
+            if u < 0 or u > 1:
+                continue
+            v = (e1x * py - px * e1y) * invDet
+            if v < 0 or u + v > 1:
+                continue
+            z = z0 + u * e1z + v * e2z
+            if top is not None and z > top:
+                continue
+            if bottom is not None and z < bottom:
+                continue
+            if best is None or z > best:
+                best = z
+        return best
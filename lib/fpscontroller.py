@@ -13,6 +13,7 @@ Created on Feb 25, 2015
 @author: ejs
 '''
 from math import pi, sin, cos
+from array import array
 
 from panda3d.core import loadPrcFile, Vec3, Vec3F, PandaNode,\
     KeyboardButton, WindowProperties, Camera
@@ -42,13 +43,59 @@ JUMP_SCALE = JUMP_HEIGHT / JUMP_TIME ** 2
 # number of steps before new velocity takes over
 STEPS = 8
 
+# amplitude and rate (cycles per second) of the head bob while walking
+BOB_HEIGHT = 0.25
+BOB_RATE = 1.5
+
+# most fixed steps to run in one frame; after a stall, the rest of the
+# time is dropped instead of being caught up with ever more steps
+MAX_STEPS_PER_FRAME = 5
+
+# the step length the TurnSmoother curves were tuned at
+TURN_STEP = 1 / 60.0
+
+# bits for the keys in FpsController's key mask
+KEY_TURN_LEFT = 1 << 0
+KEY_TURN_RIGHT = 1 << 1
+KEY_FRONT = 1 << 2
+KEY_BACK = 1 << 3
+KEY_STRAFE_LEFT = 1 << 4
+KEY_STRAFE_RIGHT = 1 << 5
+KEY_REVERSE = 1 << 6
+KEY_UP = 1 << 7
+KEY_DOWN = 1 << 8
+KEY_LOOK_UP = 1 << 9
+KEY_LOOK_DOWN = 1 << 10
+KEY_LOOK_RESET = 1 << 11
+KEY_JUMP = 1 << 12
+# shift, polled once per frame rather than sent as events
+KEY_RUN = 1 << 13
+
+KEY_WALK = KEY_FRONT | KEY_BACK | KEY_STRAFE_LEFT | KEY_STRAFE_RIGHT
+
+KEY_BITS = {"turnLeft" : KEY_TURN_LEFT, "turnRight": KEY_TURN_RIGHT,
+            "front": KEY_FRONT, "back": KEY_BACK,
+            "strafeLeft": KEY_STRAFE_LEFT, "strafeRight": KEY_STRAFE_RIGHT,
+            "reverse" : KEY_REVERSE,
+            "up": KEY_UP , "down": KEY_DOWN,
+            "lookUp" : KEY_LOOK_UP, "lookDown" : KEY_LOOK_DOWN, "lookReset": KEY_LOOK_RESET,
+            "jump": KEY_JUMP, "run": KEY_RUN }
+
+# how many key changes can wait for the fixed-step loop
+INPUT_RING_SIZE = 256
+
+# degrees turned per pixel of mouse movement, in raw mouse look
+MOUSE_SENSITIVITY = 0.2
+
 class TurnSmoother(object):
-    def __init__(self, minRate, maxRate, targetLag, rangeX):
+    def __init__(self, minRate, maxRate, targetLag, rangeX, analytic=False):
         """
         @param minRate: minimum turn rate (degrees per second)
         @param maxRate: minimum turn rate (degrees per second)
         @param targetLag: how long it takes to retarget (2=fastest)
         @param rangeX: if not None, the min and max angles allowed
+        @param analytic: if True, evaluate the curves in closed form for
+        any dt (see setAnalytic)
         """
         self.turnTime = 0
         self.turnAccelTime = 1.0 / 30
@@ -63,10 +110,45 @@ class TurnSmoother(object):
 
         self.heading = 0        
         self.debug = False
+        self.analytic = analytic
+        # whether to drop the fraction of a degree once turning stops
+        self.snap = True
+        # in analytic mode, the heading change worked out by updateTurn/unTurn
+        # for update() to apply
+        self.pendingTurn = None
         self.reset()
         
     def setDebug(self, debug):
         self.debug = debug
+
+    def setAnalytic(self, analytic):
+        """
+        In analytic mode, the turn ramp, the unturn decay and the easing
+        towards a target are computed in closed form from dt, as if
+        dt / TURN_STEP of the original steps had run.  At TURN_STEP this
+        follows the same curves; a long dt costs one evaluation.
+        """
+        self.analytic = analytic
+        self.pendingTurn = None
+        if not analytic:
+            # the stepped ramp shifts the increment
+            self.turnIncr = int(self.turnIncr)
+
+    def isAnalytic(self):
+        return self.analytic
+
+    def setSnap(self, snap):
+        """ Set whether the heading is truncated to whole degrees when not turning. """
+        self.snap = snap
+
+    def getSnapshot(self):
+        """ Get the turning state, as a dict for setSnapshot. """
+        snapshot = dict(self.__dict__)
+        del snapshot['debug']
+        return snapshot
+
+    def setSnapshot(self, snapshot):
+        self.__dict__.update(snapshot)
         
     def setHeading(self, heading):
         self.heading = heading
@@ -90,6 +172,7 @@ class TurnSmoother(object):
         self.turnDirec = 0
         self.targeting = False
         self.curMaxRate = self.maxRate
+        self.pendingTurn = None
 
     def updateTurn(self, direc, dt):
         self.targeting = False
@@ -99,6 +182,12 @@ class TurnSmoother(object):
             # switching direction, restart
             self.turnDirec = direc
             self.turnIncr = direc * self.minRate
+            if self.analytic:
+                # the restart takes one step at the current rate, then ramps
+                hold = min(dt, TURN_STEP)
+                self.pendingTurn = self.turnRate * hold + self.rampTurn(dt - hold)
+        elif self.analytic:
+            self.pendingTurn = self.rampTurn(dt)
         else:
             self.updateTowards(dt)
             
@@ -113,13 +202,50 @@ class TurnSmoother(object):
         self.turnIncr <<= 1
         self.turnRate += self.turnIncr
         
+    def rampTurn(self, dt):
+        """
+        Run the turn ramp for @dt in closed form.  Each step doubles the
+        increment and adds it to the rate, until the rate reaches maxRate,
+        so after n steps the rate is rate + incr * (2^(n+1) - 2).
+        :return: the heading change over @dt
+        """
+        n = dt / TURN_STEP
+        if n <= 0:
+            return 0
+        
+        rate, incr = self.turnRate, self.turnIncr
+        limit = self.turnDirec * self.maxRate
+        
+        # the first step at which the rate would reach the limit
+        reach = (limit - rate) / float(incr) + 2
+        if reach > 2:
+            capStep = max(1, int(math.ceil(math.log(reach, 2) - 1 - 1e-9)))
+        else:
+            capStep = 1
+            
+        # heading change over the steps before the cap...
+        ramp = min(n, capStep - 1)
+        turn = TURN_STEP * (rate * ramp + incr * (2 ** (ramp + 2) - 4) - 2 * incr * ramp)
+        
+        if n < capStep:
+            self.turnIncr = incr * 2 ** n
+            self.turnRate = rate + incr * (2 ** (n + 1) - 2)
+        else:
+            # ...and at the limit after it
+            turn += limit * TURN_STEP * (n - ramp)
+            self.turnIncr = self.turnDirec * self.turnIncrMax
+            self.turnRate = limit
+            
+        return turn
         
     def unTurn(self, dt):
         if self.turnDirec != 0:
             if not self.turnIncr:
                 self.turnIncr = self.turnDirec * self.minRate   # shouldn't happen
                 
-        if self.turnRate != 0:
+        if self.analytic:
+            self.pendingTurn = self.decayTurn(dt)
+        elif self.turnRate != 0:
             self.turnRate /= 2.0
         
             if abs(self.turnRate) < 1:
@@ -129,6 +255,34 @@ class TurnSmoother(object):
             if self.debug:                
                 print "unturn:",self.turnIncr, self.turnRate
 
+    def decayTurn(self, dt):
+        """
+        Run the unturn decay for @dt in closed form.  Each step halves the
+        rate, and it stops once it falls under 1.
+        :return: the heading change over @dt
+        """
+        rate = self.turnRate
+        if rate == 0:
+            return 0
+        
+        n = dt / TURN_STEP
+        
+        # the first step at which the rate falls under 1
+        stopStep = math.frexp(abs(rate))[1]
+        
+        decay = min(n, stopStep - 1)
+        turn = rate * TURN_STEP * (1 - 0.5 ** decay)
+        
+        if n < stopStep:
+            self.turnRate = rate * 0.5 ** n
+        else:
+            self.turnRate = 0
+            self.turnIncr = 0
+
+        if self.debug:                
+            print "unturn:",self.turnIncr, self.turnRate
+        return turn
+
     def setTarget(self, angle):
         if not self.targeting and angle != int(self.heading) % 360:
             if self.debug:
@@ -165,7 +319,12 @@ class TurnSmoother(object):
 #             self.turnRate = self.turnDirec * self.minRate 
 #             self.targeting = False
 
-        self.heading = (self.heading * (self.targetLag - 1) + self.target) / float(self.targetLag)
+        if self.analytic:
+            # each step keeps (lag-1)/lag of the distance left
+            keep = (self.targetLag - 1) / float(self.targetLag)
+            self.heading = self.target + (self.heading - self.target) * keep ** (dt / TURN_STEP)
+        else:
+            self.heading = (self.heading * (self.targetLag - 1) + self.target) / float(self.targetLag)
 
         self.turnRate = 1
         
@@ -174,13 +333,16 @@ class TurnSmoother(object):
             self.targeting = False
             
     def update(self, dt):
+        turn, self.pendingTurn = self.pendingTurn, None
         if self.targeting:
             self.updateTarget(dt)
         else:
-            if self.turnRate:
+            if self.turnRate or turn:
                 if self.debug:
                     print "update for turnRate=",self.turnRate,"from",self.heading
-                self.heading = (self.heading + self.turnRate * dt)
+                if turn is None:
+                    turn = self.turnRate * dt
+                self.heading = (self.heading + turn)
                 
                 if self.range:
                     if self.turnRate < 0 and self.heading < self.range[0]:
@@ -194,11 +356,123 @@ class TurnSmoother(object):
                 else:
                     self.heading %= 360.0
                 
-            else:
+                if not self.turnRate and self.snap:
+                    # the turn died out during this update
+                    self.heading = int(self.heading)
+            elif self.snap:
                 self.heading = int(self.heading)
 
         return self.heading
 
+class MoveState(object):
+    """
+    The per-step state of an FpsController, kept in plain preallocated
+    fields so that a step doesn't build Vec3s or go through the NodePath.
+    """
+    __slots__ = (
+        # true position (without any jump)
+        'x', 'y', 'z',
+        'velX', 'velY', 'velZ',
+        # the heading the cached trig was computed for
+        'trigHeading', 'sinH', 'cosH',
+        # the latest step's pose
+        'showX', 'showY', 'showZ', 'showH', 'showP',
+        # the pose from the step before
+        'prevX', 'prevY', 'prevZ', 'prevH', 'prevP',
+        # where the player was last placed
+        'setX', 'setY', 'setZ',
+    )
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0.0)
+        self.trigHeading = None
+
+
+class InputRing(object):
+    """
+    A fixed-size ring of timestamped key changes, oldest first, and the
+    key mask they build up.
+
+    advance() applies the changes up to a time and reports every key that
+    was down at some point since the previous call, so a key pressed and
+    released between two calls is still seen once.
+    """
+    __slots__ = ('_times', '_changes', '_mask', '_head', '_count', 'bits')
+
+    def __init__(self, size=INPUT_RING_SIZE):
+        """
+        @param size: capacity, a power of two
+        """
+        assert size & (size - 1) == 0, "size must be a power of two"
+        self._times = array('d', [0.0]) * size
+        # the bit, negated for a release
+        self._changes = array('l', [0]) * size
+        self._mask = size - 1
+        self._head = 0
+        self._count = 0
+        # the keys down after the last change applied
+        self.bits = 0
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+        self.bits = 0
+
+    def getSnapshot(self):
+        """ Get the key mask and the waiting changes, as (bits, [(time, bit, down), ...]). """
+        changes = []
+        for i in xrange(self._count):
+            index = (self._head + i) & self._mask
+            change = self._changes[index]
+            changes.append((self._times[index], abs(change), change > 0))
+        return self.bits, changes
+
+    def setSnapshot(self, snapshot):
+        bits, changes = snapshot
+        self.clear()
+        self.bits = bits
+        for time, bit, down in changes:
+            self.push(time, bit, down)
+
+    def push(self, time, bit, down):
+        """ Record that key @bit went down (or up) at @time. """
+        if self._count > self._mask:
+            # full: the oldest change takes effect now
+            self.advance(self._times[self._head])
+        index = (self._head + self._count) & self._mask
+        self._times[index] = time
+        self._changes[index] = bit if down else -bit
+        self._count += 1
+
+    def advance(self, until):
+        """
+        Apply the changes stamped at or before @until.
+        :return: the mask of keys down at any point since the last call
+        """
+        bits = seen = self.bits
+        times = self._times
+        changes = self._changes
+        head = self._head
+        count = self._count
+        while count and times[head] <= until:
+            change = changes[head]
+            if change > 0:
+                bits |= change
+                seen |= change
+            else:
+                bits &= ~-change
+            head = (head + 1) & self._mask
+            count -= 1
+        self._head = head
+        self._count = count
+        self.bits = bits
+        return seen
+
+
 class FpsController(object):
     def __init__(self, base, player=None):
         
@@ -208,12 +482,33 @@ class FpsController(object):
             player = self.base.cam
             
         self.player = player
-        self.lastSetPos = None
+        self.state = MoveState()
+        # may be missing when running without a window
+        self.mouseWatcher = getattr(base, 'mouseWatcherNode', None)
+        self.shiftButton = KeyboardButton.shift()
+
+        self.input = InputRing()
+        # the keys seen by the current step
+        self.stepKeys = 0
+        # the pointer position steering the current step, in non-raw mouse look
+        self.stepPointer = None
+        # where input timestamps come from; the fixed steps are laid out
+        # on the same clock
+        self.inputClock = globalClock.getRealTime # @UndefinedVariable
+        # if set, told about each input and step (see fpsrecord)
+        self.recorder = None
 
         # Disable the camera trackball controls.
         self.base.disableMouse()
 
         self.mouseLook = False
+        # in raw mouse look, the pointer's movement each frame turns the view
+        # directly instead of setting turn rates
+        self.rawMouse = False
+        self.mouseSensitivity = MOUSE_SENSITIVITY
+        # whether the window reports relative movement, so needs no recentering
+        self.pointerRelative = False
+        self.lastPointerX = self.lastPointerY = None
         
         self.setupKeys()
         
@@ -223,6 +518,9 @@ class FpsController(object):
 
         self.tickTime = 0.0
         self.tickQuantum = 1 / 60.0
+        self.maxStepsPerFrame = MAX_STEPS_PER_FRAME
+        # simulated time, advanced by tickQuantum per step
+        self.stepTime = 0.0
         
         self.reset()
 
@@ -231,12 +529,27 @@ class FpsController(object):
     def isMouseLook(self):
         return self.mouseLook
     
-    def setMouseLook(self, mouseLook):
+    def setMouseLook(self, mouseLook, raw=True):
+        """
+        @param raw: if True, turn by the pointer's movement once per frame;
+        else, steer the turn rates from the pointer position each step
+        """
         self.mouseLook = mouseLook
         self.mouseGrabbed = mouseLook   # for now
+        self.rawMouse = mouseLook and raw
+        self.lastPointerX = self.lastPointerY = None
+        
+        # don't let raw movement get truncated to whole degrees
+        self.headingTurner.setSnap(not self.rawMouse)
+        self.lookTurner.setSnap(not self.rawMouse)
 
         wp = WindowProperties()
-        wp.setMouseMode(mouseLook and WindowProperties.MConfined or WindowProperties.MAbsolute)
+        if not mouseLook:
+            wp.setMouseMode(WindowProperties.MAbsolute)
+        elif self.rawMouse:
+            wp.setMouseMode(WindowProperties.MRelative)
+        else:
+            wp.setMouseMode(WindowProperties.MConfined)
         wp.setCursorHidden(mouseLook)
         self.base.win.requestProperties(wp)
        
@@ -244,16 +557,75 @@ class FpsController(object):
 
     def resolveMouse(self, t):
         wp = self.base.win.getProperties()
-        self.mouseGrabbed = wp.getMouseMode() == WindowProperties.MConfined
-        print "ACTUAL GRAB MODE:", self.mouseGrabbed
+        if self.rawMouse and wp.getMouseMode() != WindowProperties.MRelative:
+            # not supported here: confine it and recenter once per frame
+            fallback = WindowProperties()
+            fallback.setMouseMode(WindowProperties.MConfined)
+            self.base.win.requestProperties(fallback)
+            self.pointerRelative = False
+            self.mouseGrabbed = True    # for now
+        else:
+            self.pointerRelative = wp.getMouseMode() == WindowProperties.MRelative
+            self.mouseGrabbed = wp.getMouseMode() in (WindowProperties.MConfined, WindowProperties.MRelative)
+        print "ACTUAL GRAB MODE:", self.mouseGrabbed, self.pointerRelative and "(relative)" or ""
         
         # re-center mouse, or else we get no good delta
-        if not wp.getFullscreen():
+        if not wp.getFullscreen() and not self.pointerRelative:
             ret = self.base.win.movePointer(0, self.base.win.getXSize() / 2, self.base.win.getYSize() / 2)
             print "movePointer:", ret
+        self.lastPointerX = self.lastPointerY = None
+
+    def readMouse(self):
+        """
+        Turn by how far the pointer moved since the last frame.  Called
+        once per frame in raw mouse look.
+        """
+        win = self.base.win
+        pointer = win.getPointer(0)
+        if not pointer.getInWindow():
+            self.lastPointerX = self.lastPointerY = None
+            return
+        
+        x, y = pointer.getX(), pointer.getY()
+        if self.lastPointerX is not None:
+            # window y grows downwards
+            scale = self.mouseSensitivity
+            self.turnBy((self.lastPointerX - x) * scale, (self.lastPointerY - y) * scale)
+        
+        if self.mouseGrabbed and not self.pointerRelative:
+            cx, cy = win.getXSize() // 2, win.getYSize() // 2
+            if x != cx or y != cy:
+                win.movePointer(0, cx, cy)
+                x, y = cx, cy
+        self.lastPointerX, self.lastPointerY = x, y
+
+    def turnBy(self, dh, dp):
+        """
+        Turn the heading by @dh and the look angle by @dp degrees right
+        away, including the poses being interpolated between.
+        """
+        if self.recorder:
+            self.recorder.recordTurn(dh, dp)
+        state = self.state
+        
+        self.headingTurner.setHeading((self.headingTurner.getHeading() + dh) % 360.0)
+        
+        look = self.lookTurner.getHeading()
+        newLook = look + dp
+        if self.lookTurner.range:
+            low, high = self.lookTurner.range
+            newLook = min(high, max(low, newLook))
+        self.lookTurner.setHeading(newLook)
+        dp = newLook - look
+        
+        state.showH += dh
+        state.prevH += dh
+        state.showP += dp
+        state.prevP += dp
         
     def reset(self):
-        self.truePos = self.player.getPos()
+        state = self.state
+        state.x, state.y, state.z = self.player.getPos()
         
         self.headingTurner.reset()
         self.reversing = False
@@ -267,28 +639,73 @@ class FpsController(object):
         
         self.bob = Vec3(0, 0, 0)
                 
-        self.setVelocity(self.player, Vec3(0, 0, 0))
+        state.velX = state.velY = state.velZ = 0.0
         self.walkCycle = 0
         
         self.flyMode = False
         
         self.lastMouseX, self.lastMouseY = None, None
         
+        self.resetPose()
+        
+    def resetPose(self):
+        """ Start interpolating afresh from where the player is now. """
+        state = self.state
+        x, y, z = self.player.getPos()
+        h, p, _ = self.player.getHpr()
+        state.showX, state.showY, state.showZ, state.showH, state.showP = x, y, z, h, p
+        state.prevX, state.prevY, state.prevZ, state.prevH, state.prevP = x, y, z, h, p
+        state.setX, state.setY, state.setZ = x, y, z
         
     def getPos(self):
         return self.player.getPos()
+
+    # the controller fields that getSnapshot saves
+    SNAPSHOT_FIELDS = ('tickQuantum', 'stepTime', 'stepKeys',
+                       'jumping', 'jumpTime', 'jumpZ', 'walkCycle',
+                       'flyMode', 'lookSticky', 'reversing',
+                       'mouseLook', 'rawMouse', 'mouseSensitivity')
+
+    def getSnapshot(self):
+        """
+        Get everything the fixed step depends on, as a dict of plain
+        values for setSnapshot.
+        """
+        state = self.state
+        return {
+            'state': dict((name, getattr(state, name)) for name in MoveState.__slots__),
+            'fields': dict((name, getattr(self, name)) for name in self.SNAPSHOT_FIELDS),
+            'bob': tuple(self.bob),
+            'heading': self.headingTurner.getSnapshot(),
+            'look': self.lookTurner.getSnapshot(),
+            'input': self.input.getSnapshot(),
+        }
+
+    def setSnapshot(self, snapshot):
+        state = self.state
+        for name, value in snapshot['state'].iteritems():
+            setattr(state, name, value)
+        for name, value in snapshot['fields'].iteritems():
+            setattr(self, name, value)
+        self.bob = Vec3(*snapshot['bob'])
+        self.headingTurner.setSnapshot(snapshot['heading'])
+        self.lookTurner.setSnapshot(snapshot['look'])
+        self.input.setSnapshot(snapshot['input'])
+        self.applyPose(1.0)
     
         
     def setPos(self, pos):
         self.player.setFluidPos(pos)
-        self.truePos = pos
-        self.lastSetPos = pos
+        state = self.state
+        state.x, state.y, state.z = self.player.getPos()
+        self.resetPose()
 
     def setHpr(self, hpr):
         self.lookSticky = True
         self.player.setHpr(hpr)
         self.headingTurner.setHeading(self.player.getH())
         self.lookTurner.setHeading(self.player.getP())
+        self.resetPose()
 
     def getHeading(self):
         return self.player.getH()
@@ -302,18 +719,9 @@ class FpsController(object):
         self.flyMode = on
     
     def setupKeys(self):
-        #A dictionary of what keys are currently being pressed
-        #The key events update this list, and our task will query it as input
-        self.keys = {"turnLeft" : 0, "turnRight": 0,
-                     "front": 0, "back": 0,
-                     "strafeLeft": 0, "strafeRight": 0,
-                     "reverse" : 0,
-                     "up": 0 , "down": 0,
-                     "lookUp" : 0, "lookDown" : 0, "lookReset": 0,
-                     "jump": 0 }
-    
         self.lastKeys = []
-        # Other keys events set the appropriate value in our key dictionary
+        # Key events are queued in self.input with the time they arrived,
+        # and each fixed step takes the ones from its own slice of time
         self.mapOnOffKey("arrow_left", "turnLeft")
         self.mapOnOffKey("arrow_right", "turnRight")
         self.mapOnOffKey("w", "front")
@@ -336,125 +744,236 @@ class FpsController(object):
         self.base.accept(name, self.setKey, [token, 1])
         self.base.accept(name + "-up",  self.setKey, [token, 0])
         
-    #As described earlier, this simply sets a key in the self.keys dictionary to
-    #the given value
-    def setKey(self, key, val): 
-        self.keys[key] = val
+    def setKey(self, key, val, time=None):
+        """
+        Queue a press or release of @key (a KEY_BITS name).
+        @param time: when it happened, on the inputClock; defaults to now
+        """
+        if time is None:
+            time = self.inputClock()
+        bit = KEY_BITS[key]
+        self.input.push(time, bit, val)
+        if self.recorder:
+            self.recorder.recordKey(time, bit, val)
+
+    def isKeyDown(self, key):
+        """ Tell whether @key (a KEY_BITS name) is down as of the current step. """
+        return bool(self.stepKeys & KEY_BITS[key])
 
     def setupGameLoop(self):
         self.fpsCameraTask = taskMgr.add(self.fpsCameraHandler, "fpsCameraHandler")
         
     def fpsCameraHandler(self, task):
         self.tickTime += globalClock.getDt() # @UndefinedVariable
+        if self.rawMouse and self.mouseLook:
+            self.readMouse()
+        self.runSteps()
+        return Task.cont
+
+    def runSteps(self):
+        """
+        Run as many fixed steps as the accumulated time allows, then
+        place the player between the last two steps' poses.
+        """
+        state = self.state
+
+        # something else moved the player (e.g. a collision handler);
+        # carry that over to the simulation
+        pos = self.player.getPos()
+        dx, dy, dz = pos.x - state.setX, pos.y - state.setY, pos.z - state.setZ
+        if abs(dx) > 1e-4 or abs(dy) > 1e-4 or abs(dz) > 1e-4:
+            self.carryOffset(dx, dy, dz)
+
+        # the step slices end at these times on the input clock
+        now = self.inputClock()
+        
+        mw = self.mouseWatcher
+        run = KEY_RUN if mw and mw.isButtonDown(self.shiftButton) else 0
+        mouseRates = self.mouseLook and not self.rawMouse
+        
+        steps = 0
         while self.tickTime >= self.tickQuantum:
-            self.movePlayer(self.player, self.tickTime)  
+            if steps >= self.maxStepsPerFrame:
+                # too far behind: drop the time rather than spiral
+                self.tickTime %= self.tickQuantum
+                break
             self.tickTime -= self.tickQuantum
+            pointer = None
+            if mouseRates:
+                pointer = self.samplePointer()
+            self.fixedStep(now - self.tickTime, run, pointer)
+            steps += 1
 
-        return Task.cont
+        self.applyPose(self.tickTime / self.tickQuantum)
+        return steps
+
+    def carryOffset(self, dx, dy, dz):
+        """ Shift the simulated position, and the poses, by (@dx, @dy, @dz). """
+        if self.recorder:
+            self.recorder.recordOffset(dx, dy, dz)
+        state = self.state
+        state.x += dx
+        state.y += dy
+        state.z += dz
+        state.showX += dx
+        state.showY += dy
+        state.showZ += dz
+        state.prevX += dx
+        state.prevY += dy
+        state.prevZ += dz
+
+    def samplePointer(self):
+        """
+        Read the pointer for a step's turn rates in non-raw mouse look,
+        recentering it if grabbed.
+        :return: (x, y), or None if the pointer is not in the window
+        """
+        mw = self.mouseWatcher
+        if not mw or not mw.hasMouse():
+            return None
+        mx, my = mw.getMouseX(), mw.getMouseY()
+        if self.mouseGrabbed:
+            props = self.base.win.getProperties()
+            self.base.win.movePointer(0, int(props.getXSize() / 2), int(props.getYSize() / 2))
+        return mx, my
+
+    def fixedStep(self, until, extraKeys=0, pointer=None):
+        """
+        Run one fixed step, with the key changes stamped up to @until.
+        @param extraKeys: key bits to add for this step (e.g. KEY_RUN)
+        @param pointer: the (x, y) from samplePointer that steers the
+        turn rates in non-raw mouse look, or None
+        """
+        state = self.state
+        state.prevX, state.prevY, state.prevZ = state.showX, state.showY, state.showZ
+        state.prevH, state.prevP = state.showH, state.showP
+        self.stepTime += self.tickQuantum
+        self.stepKeys = self.input.advance(until) | extraKeys
+        self.stepPointer = pointer
+        if pointer and self.recorder:
+            self.recorder.recordPointer(*pointer)
+        self.movePlayer(self.player, self.tickQuantum)
+        if self.recorder:
+            self.recorder.recordStep(until, self.stepKeys, state)
+
+    def applyPose(self, alpha):
+        """ Place the player @alpha (0..1) of the way from the previous step's pose to the latest. """
+        state = self.state
+
+        # turn the short way round
+        dh = (state.showH - state.prevH + 180) % 360 - 180
+
+        x = state.prevX + (state.showX - state.prevX) * alpha
+        y = state.prevY + (state.showY - state.prevY) * alpha
+        z = state.prevZ + (state.showZ - state.prevZ) * alpha
+        self.player.setPosHpr(x, y, z,
+                              state.prevH + dh * alpha,
+                              state.prevP + (state.showP - state.prevP) * alpha,
+                              0)
+        state.setX, state.setY, state.setZ = x, y, z
 
     def movePlayer(self, player, dt):
-        mw = self.base.mouseWatcherNode
+        keys = self.stepKeys
+        state = self.state
 
         heading = self.headingTurner.getHeading()  # Heading is the roll value for this model
-        lookAngle = player.getP()
+        lookAngle = self.lookTurner.getHeading()
 
         # y is forward/back, x is left/right, z is up/down 
         
-        curVel = self.getVelocity(player)
-        
         # Accelerate in the direction the player is currently facing
         y = 0
-        if self.keys["front"]:
+        if keys & KEY_FRONT:
             y = 1
-        elif self.keys["back"]:
+        elif keys & KEY_BACK:
             y = -1
         x = 0
-        if self.keys["strafeLeft"]:
+        if keys & KEY_STRAFE_LEFT:
             x = -1
-        elif self.keys["strafeRight"]:
+        elif keys & KEY_STRAFE_RIGHT:
             x = 1
         
         z = 0
-        if self.keys["up"]:
+        if keys & KEY_UP:
             z = 1
-        elif self.keys["down"]:
+        elif keys & KEY_DOWN:
             z = -1
         
-        if mw.isButtonDown(KeyboardButton.shift()):
+        if keys & KEY_RUN:
             x *= 2
             y *= 2
             
-        if self.keys["jump"]:
+        if keys & KEY_JUMP:
             if not self.jumping:
                 self.jumpTime = 0
                 self.jumping = True
                 self.jumpZ = 0
 
-        now = globalClock.getFrameTime() 
+        now = self.stepTime
         if x or y:
             if not self.walkCycle:
                 self.walkCycle = now
             
-        heading_rad = DEG_TO_RAD * (360 - heading)
-        
-        newFwdBack = Vec3(sin(heading_rad)*y, cos(heading_rad) * y, 0)
-        
-        if self.flyMode:
-            newFwdBack.z = sin(DEG_TO_RAD * lookAngle) * y
+        # heading_rad = (360 - heading) degrees, so sin(heading_rad) = -sin(heading);
+        # only redo the trig when the heading changed
+        if heading != state.trigHeading:
+            heading_rad = DEG_TO_RAD * heading
+            state.sinH = -sin(heading_rad)
+            state.cosH = cos(heading_rad)
+            state.trigHeading = heading
+        sinH = state.sinH
+        cosH = state.cosH
+
+        # forward/back plus strafe, in the XY plane
+        newX = sinH * y + cosH * x
+        newY = cosH * y - sinH * x
+        newZ = z
+        if self.flyMode and y:
+            newZ += sin(DEG_TO_RAD * lookAngle) * y
          
-        newStrafe = Vec3(-sin(heading_rad-pi/2) * x, -cos(heading_rad-pi/2)*x, 0)
-        
-        newUpDown = Vec3(0, 0, z)
-        
-        newVel = (newFwdBack + newStrafe + newUpDown) * ACCELERATION
-        playerVel = (curVel * (STEPS-1) + newVel) / STEPS
+        # blend towards the new velocity over STEPS steps
+        state.velX = (state.velX * (STEPS-1) + newX * ACCELERATION) / STEPS
+        state.velY = (state.velY * (STEPS-1) + newY * ACCELERATION) / STEPS
+        state.velZ = (state.velZ * (STEPS-1) + newZ * ACCELERATION) / STEPS
         
-        self.setVelocity(player, playerVel)
+        # the mouse steers the turn rates, rather than turning by itself
+        mouseRates = self.mouseLook and not self.rawMouse
         
-        if self.mouseLook and mw.hasMouse():
-            x, y = mw.getMouseX(), mw.getMouseY()
+        if mouseRates and self.stepPointer:
+            mx, my = self.stepPointer
             
-            dx, dy = x, y
-            
-            self.headingTurner.setTurnRate(math.sin(dx) * -1440)
+            self.headingTurner.setTurnRate(math.sin(mx) * -1440)
             #self.headingTurner.setTarget(dx / pi)
-            self.lookTurner.setTurnRate(math.sin(dy) * 1440)
+            self.lookTurner.setTurnRate(math.sin(my) * 1440)
             #self.lookTurner.setTarget(y * 90)
             
-            self.lastMouseX, self.lastMouseY = x, y
-            
-            if self.mouseGrabbed:
-                self.base.win.movePointer(0, 
-                                      int(self.base.win.getProperties().getXSize() / 2),
-                                      int(self.base.win.getProperties().getYSize() / 2))
-
+            self.lastMouseX, self.lastMouseY = mx, my
                 
             
         # Change heading if left or right is being pressed
-        now = globalClock.getFrameTime()
-        if self.keys["turnRight"]:
+        if keys & KEY_TURN_RIGHT:
             self.headingTurner.updateTurn(-1, dt)
 
-        elif self.keys["turnLeft"]:
+        elif keys & KEY_TURN_LEFT:
             self.headingTurner.updateTurn(1, dt)
 
-        elif self.keys["reverse"]:
+        elif keys & KEY_REVERSE:
             self.headingTurner.setTarget(heading + 180)
             
-        elif not self.mouseLook:
+        elif not mouseRates:
             self.headingTurner.unTurn(dt)
                 
         heading = self.headingTurner.update(dt)
             
         # Adjust view angle
         
-        if self.keys["lookDown"]:
+        if keys & KEY_LOOK_DOWN:
             self.lookTurner.updateTurn(-1, dt)
             self.lookSticky = True
-        elif self.keys["lookUp"]:
+        elif keys & KEY_LOOK_UP:
             self.lookTurner.updateTurn(1, dt)
             self.lookSticky = True
-        elif self.keys["lookReset"]:
+        elif keys & KEY_LOOK_RESET:
             self.lookTurner.setTarget(0)
             self.lookSticky = False
         elif not self.mouseLook:
@@ -466,18 +985,18 @@ class FpsController(object):
 
             if not self.lookSticky:
                 self.lookTurner.setTarget(0)                    
+        elif self.rawMouse:
+            # the look angle stays where the mouse left it
+            self.lookTurner.unTurn(dt)
             
         lookAngle = self.lookTurner.update(dt)
             
-
-        player.setH(heading)
-        
-        player.setP(lookAngle)
-        
-        
         # Finally, update the position as with any other object
         self.updatePos(player, now, dt)
 
+        state.showH = heading
+        state.showP = lookAngle
+
     def forward(self, units, forceLook=False):
         heading_rad = DEG_TO_RAD * (360 - self.getHeading())
         newFwdBack = Vec3(sin(heading_rad)*units, cos(heading_rad) * units, 0)
@@ -502,19 +1021,20 @@ class FpsController(object):
         return self.bob
     
     def updatePos(self, obj, now, dt):
-        vel = self.getVelocity(obj)
-        
-        if self.lastSetPos:
-            self.truePos += obj.getPos() - self.lastSetPos
-            
-        newPos = self.truePos + (vel*dt)
+        """
+        Step the position, leaving the position to show (including any
+        jump) in the MoveState.
+        """
+        state = self.state
         
-        self.truePos = newPos
+        state.x += state.velX * dt
+        state.y += state.velY * dt
+        state.z += state.velZ * dt
 
-        pos = Vec3F(newPos)
+        showZ = state.z
         if not self.jumping:
-            if self.keys["front"] or self.keys["back"] or self.keys["strafeLeft"] or self.keys["strafeRight"]:
-                walkZ = sin((now - self.walkCycle) * 1.5 * 2 * pi) * 0.25
+            if self.stepKeys & KEY_WALK:
+                walkZ = sin((now - self.walkCycle) * BOB_RATE * 2 * pi) * BOB_HEIGHT
                 self.bob.z = walkZ 
                 #pos.z = self.truePos.z + walkZ
             else:
@@ -539,18 +1059,22 @@ class FpsController(object):
                 else:
                     self.jumpZ = JUMP_HEIGHT - JUMP_SCALE*((self.jumpTime - JUMP_TIME) ** 2)
 
-            pos.z += self.jumpZ
+            showZ += self.jumpZ
 
         
 #         print self.truePos,vel,pos
-        self.lastSetPos = pos
-        obj.setPos(pos)
+        state.showX = state.x
+        state.showY = state.y
+        state.showZ = showZ
         
     def setVelocity(self, obj, val):
-        obj.setPythonTag("velocity", val)
+        """ The velocity is kept on the controller; @obj is ignored. """
+        state = self.state
+        state.velX, state.velY, state.velZ = val
     
     def getVelocity(self, obj):
-        return obj.getPythonTag("velocity")
+        state = self.state
+        return Vec3(state.velX, state.velY, state.velZ)
 
     
     def setDebugHeading(self, debug):
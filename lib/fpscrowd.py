@@ -0,0 +1,238 @@
+'''
+Batched movement for many walkers with the feel of FpsController.
+
+Each agent's position, velocity, heading, look angle and jump state live
+in NumPy arrays, one row per agent, and a fixed step integrates all of
+them at once.  Poses are pushed to the NodePaths in a single pass per
+frame, interpolated between the last two steps like FpsController does.
+
+Agents are driven by their inputs (forward/back, strafe, up/down, turn
+and look rates, jump requests) rather than by keys.
+
+Created on Oct 18, 2026
+'''
+import numpy
+
+from direct.task import Task
+
+from fpscontroller import DEG_TO_RAD, ACCELERATION, STEPS, \
+    JUMP_HEIGHT, JUMP_TIME, JUMP_SCALE, MAX_STEPS_PER_FRAME, BOB_HEIGHT, BOB_RATE
+
+
+class FpsCrowd(object):
+    def __init__(self, base, players):
+        """
+        @param base: the ShowBase
+        @param players: the NodePaths to drive, one per agent
+        """
+        self.base = base
+        self.players = list(players)
+        count = len(self.players)
+        self.count = count
+
+        # true position (without any jump) and velocity
+        self.pos = numpy.zeros((count, 3))
+        self.vel = numpy.zeros((count, 3))
+        self.heading = numpy.zeros(count)
+        self.lookAngle = numpy.zeros(count)
+
+        # inputs: x=strafe, y=forward/back, z=up/down, each -1..1
+        # (2 for running); turn and look rates are in degrees per second
+        self.move = numpy.zeros((count, 3))
+        self.turnRate = numpy.zeros(count)
+        self.lookRate = numpy.zeros(count)
+        self.jumpRequest = numpy.zeros(count, dtype=bool)
+
+        self.jumping = numpy.zeros(count, dtype=bool)
+        self.jumpTime = numpy.zeros(count)
+        self.jumpZ = numpy.zeros(count)
+
+        # when each agent first walked, or 0 if it hasn't (as FpsController
+        # keeps it: not reset when the agent stops)
+        self.walkCycle = numpy.zeros(count)
+        self.bob = numpy.zeros(count)
+
+        # the latest step's pose and the one before, as rows of x, y, z, h, p
+        self.pose = numpy.zeros((count, 5))
+        self.prevPose = numpy.zeros((count, 5))
+
+        self.flyMode = False
+
+        self.tickTime = 0.0
+        self.tickQuantum = 1 / 60.0
+        self.maxStepsPerFrame = MAX_STEPS_PER_FRAME
+        self.stepTime = 0.0
+
+        self.reset()
+
+        self.setupGameLoop()
+
+    def reset(self):
+        """ Take the agents' poses from their NodePaths and stop them. """
+        for i, player in enumerate(self.players):
+            self.pos[i] = player.getPos()
+            self.heading[i] = player.getH()
+            self.lookAngle[i] = player.getP()
+
+        self.vel.fill(0)
+        self.move.fill(0)
+        self.turnRate.fill(0)
+        self.lookRate.fill(0)
+        self.jumpRequest.fill(False)
+        self.jumping.fill(False)
+        self.jumpTime.fill(0)
+        self.jumpZ.fill(0)
+        self.walkCycle.fill(0)
+        self.bob.fill(0)
+
+        self.pose[:, 0:3] = self.pos
+        self.pose[:, 3] = self.heading
+        self.pose[:, 4] = self.lookAngle
+        self.prevPose[:] = self.pose
+
+    def getCount(self):
+        return self.count
+
+    def setFlyMode(self, flyMode):
+        self.flyMode = flyMode
+
+    def isFlyMode(self):
+        return self.flyMode
+
+    def setMove(self, index, forward, strafe=0, up=0):
+        """ Set how agent @index wants to move, each in -1..1 (2 to run). """
+        self.move[index] = (strafe, forward, up)
+
+    def setTurnRate(self, index, rate):
+        self.turnRate[index] = rate
+
+    def setLookRate(self, index, rate):
+        self.lookRate[index] = rate
+
+    def jump(self, index):
+        """ Start agent @index jumping, unless it already is. """
+        self.jumpRequest[index] = True
+
+    def getPos(self, index):
+        """ Get where agent @index is shown after the latest step, as (x, y, z). """
+        return tuple(self.pose[index, 0:3])
+
+    def getHeading(self, index):
+        return self.heading[index]
+
+    def getLookAngle(self, index):
+        return self.lookAngle[index]
+
+    def getBob(self, index):
+        """ Get the head-bob height of agent @index. """
+        return self.bob[index]
+
+    def setupGameLoop(self):
+        self.crowdTask = self.base.taskMgr.add(self.crowdHandler, "fpsCrowdHandler")
+
+    def crowdHandler(self, task):
+        self.tickTime += globalClock.getDt() # @UndefinedVariable
+        self.runSteps()
+        return Task.cont
+
+    def runSteps(self):
+        """
+        Run as many fixed steps as the accumulated time allows, then
+        place the agents between the last two steps' poses.
+        :return: the number of steps run
+        """
+        steps = 0
+        while self.tickTime >= self.tickQuantum:
+            if steps >= self.maxStepsPerFrame:
+                # too far behind: drop the time rather than spiral
+                self.tickTime %= self.tickQuantum
+                break
+            self.stepTime += self.tickQuantum
+            self.step(self.tickQuantum)
+            self.tickTime -= self.tickQuantum
+            steps += 1
+
+        self.applyPoses(self.tickTime / self.tickQuantum)
+        return steps
+
+    def step(self, dt):
+        """ Integrate every agent by @dt seconds. """
+        now = self.stepTime
+        move = self.move
+        x = move[:, 0]
+        y = move[:, 1]
+
+        self.prevPose[:] = self.pose
+
+        # start new jumps
+        starting = self.jumpRequest & ~self.jumping
+        self.jumping |= starting
+        self.jumpTime[starting] = 0
+        self.jumpZ[starting] = 0
+        self.jumpRequest.fill(False)
+
+        # note when agents first walk
+        walking = (x != 0) | (y != 0)
+        self.walkCycle[walking & (self.walkCycle == 0)] = now
+
+        # heading_rad = (360 - heading) degrees, so sin(heading_rad) = -sin(heading)
+        headingRad = self.heading * DEG_TO_RAD
+        sinH = -numpy.sin(headingRad)
+        cosH = numpy.cos(headingRad)
+
+        # forward/back plus strafe, blended towards over STEPS steps
+        newVel = numpy.empty_like(self.vel)
+        newVel[:, 0] = sinH * y + cosH * x
+        newVel[:, 1] = cosH * y - sinH * x
+        newVel[:, 2] = move[:, 2]
+        if self.flyMode:
+            newVel[:, 2] += numpy.sin(self.lookAngle * DEG_TO_RAD) * y
+        newVel *= ACCELERATION
+
+        self.vel *= (STEPS - 1)
+        self.vel += newVel
+        self.vel /= STEPS
+
+        self.heading += self.turnRate * dt
+        self.heading %= 360.0
+        self.lookAngle += self.lookRate * dt
+        numpy.clip(self.lookAngle, -90, 90, out=self.lookAngle)
+
+        self.pos += self.vel * dt
+
+        # head bob, or let it settle; left as it is while jumping
+        onFoot = ~self.jumping
+        bobbing = walking & onFoot
+        settling = ~walking & onFoot
+        self.bob[settling] *= (STEPS - 1) / float(STEPS)
+        self.bob[bobbing] = numpy.sin((now - self.walkCycle[bobbing]) * BOB_RATE * 2 * numpy.pi) * BOB_HEIGHT
+
+        # jump arcs
+        jumping = self.jumping
+        self.jumpTime[jumping] += dt
+        landed = jumping & (self.jumpTime >= JUMP_TIME * 2)
+        jumping &= ~landed
+        self.jumpZ[landed] = 0
+        self.jumpZ[jumping] = JUMP_HEIGHT - JUMP_SCALE * (self.jumpTime[jumping] - JUMP_TIME) ** 2
+
+        pose = self.pose
+        pose[:, 0:3] = self.pos
+        pose[:, 2] += self.jumpZ
+        pose[:, 3] = self.heading
+        pose[:, 4] = self.lookAngle
+
+    def applyPoses(self, alpha):
+        """ Place every agent @alpha (0..1) of the way from the previous step's pose to the latest. """
+        prev = self.prevPose
+        delta = self.pose - prev
+
+        # turn the short way round
+        delta[:, 3] += 180
+        delta[:, 3] %= 360
+        delta[:, 3] -= 180
+
+        delta *= alpha
+        delta += prev
+
+        for player, (x, y, z, h, p) in zip(self.players, delta.tolist()):
+            player.setPosHpr(x, y, z, h, p, 0)
@@ -0,0 +1,176 @@
+'''
+Record an FpsController session to a compact binary log, and replay it
+without a window.
+
+The log starts with a header and a snapshot of the controller, followed by
+one record for each key change, raw mouse turn, pointer sample (in
+non-raw mouse look, where the pointer steers each step's turn rates),
+outside move (e.g. from a collision handler) and fixed step.  Step
+records carry the end of the step's input slice and the pose the step
+produced, so a replay feeds the same input to the same steps and can
+check that it still ends up in the same place.
+
+To record:
+
+    recorder = SessionRecorder(app.fpscamera, "session.fpslog")
+    recorder.start()
+    ...
+    recorder.stop()
+
+Created on Oct 18, 2026
+'''
+import cPickle
+import struct
+import time
+
+from panda3d.core import NodePath
+
+from fpscontroller import FpsController, KEY_RUN
+
+MAGIC = 'FPSL'
+VERSION = 2
+
+# magic, version, length of the pickled snapshot that follows
+HEADER = struct.Struct('<4sHI')
+
+# each record starts with a tag
+KEY_RECORD = struct.Struct('<cdHB')     # time, bit, down
+TURN_RECORD = struct.Struct('<cdd')     # heading change, look change
+POINTER_RECORD = struct.Struct('<cdd')  # pointer x, y for the next step
+OFFSET_RECORD = struct.Struct('<cddd')  # dx, dy, dz
+STEP_RECORD = struct.Struct('<cdH5f')   # slice end, keys, x, y, z, h, p
+
+
+class SessionRecorder(object):
+    def __init__(self, controller, filename):
+        self.controller = controller
+        self.filename = filename
+        self.file = None
+        self.steps = 0
+
+    def start(self):
+        """ Open the log, write the controller's current state, and start recording. """
+        snapshot = cPickle.dumps(self.controller.getSnapshot(), 2)
+        self.file = open(self.filename, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(snapshot)))
+        self.file.write(snapshot)
+        self.steps = 0
+        self.controller.recorder = self
+
+    def stop(self):
+        if self.controller.recorder is self:
+            self.controller.recorder = None
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def getSteps(self):
+        return self.steps
+
+    def recordKey(self, time, bit, down):
+        self.file.write(KEY_RECORD.pack('K', time, bit, down))
+
+    def recordTurn(self, dh, dp):
+        self.file.write(TURN_RECORD.pack('M', dh, dp))
+
+    def recordPointer(self, x, y):
+        self.file.write(POINTER_RECORD.pack('P', x, y))
+
+    def recordOffset(self, dx, dy, dz):
+        self.file.write(OFFSET_RECORD.pack('X', dx, dy, dz))
+
+    def recordStep(self, until, keys, state):
+        self.file.write(STEP_RECORD.pack('S', until, keys,
+                                         state.showX, state.showY, state.showZ,
+                                         state.showH, state.showP))
+        self.steps += 1
+
+
+class SessionReplayer(object):
+    def __init__(self, base, filename, player=None):
+        """
+        @param base: the ShowBase; it needs no window
+        @param filename: the log written by SessionRecorder
+        @param player: the NodePath to drive; by default, a detached one
+        """
+        with open(filename, 'rb') as f:
+            self.data = f.read()
+
+        magic, version, length = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not an FpsController session log" % filename)
+        # version 1 logs just lack pointer records
+        if version not in (1, VERSION):
+            raise ValueError("%s has log version %d, expected %d" % (filename, version, VERSION))
+        start = HEADER.size
+        self.snapshot = cPickle.loads(self.data[start:start + length])
+        self.recordStart = start + length
+
+        if player is None:
+            player = NodePath('replay')
+        self.controller = FpsController(base, player)
+        base.taskMgr.remove(self.controller.fpsCameraTask)
+
+    def run(self, check=True, tolerance=1e-3):
+        """
+        Replay the whole log from the recorded starting state.
+        @param check: if True, compare each step's pose with the recorded one
+        @param tolerance: how far a pose may be off (relative, for large values)
+        :return: (steps, seconds, mismatched steps, index of the first mismatch or None)
+        """
+        ctl = self.controller
+        ctl.setSnapshot(self.snapshot)
+        state = ctl.state
+        push = ctl.input.push
+
+        data = self.data
+        offset = self.recordStart
+        end = len(data)
+        steps = 0
+        mismatches = 0
+        first = None
+        pointer = None
+
+        t0 = time.time()
+        while offset < end:
+            tag = data[offset]
+            if tag == 'S':
+                _, until, keys, x, y, z, h, p = STEP_RECORD.unpack_from(data, offset)
+                offset += STEP_RECORD.size
+                ctl.fixedStep(until, keys & KEY_RUN, pointer)
+                pointer = None
+                if check:
+                    pose = (state.showX, state.showY, state.showZ, state.showH, state.showP)
+                    for got, want in zip(pose, (x, y, z, h, p)):
+                        if abs(got - want) > tolerance * max(1.0, abs(want)):
+                            break
+                    else:
+                        if ctl.stepKeys == keys:
+                            steps += 1
+                            continue
+                    mismatches += 1
+                    if first is None:
+                        first = steps
+                steps += 1
+            elif tag == 'K':
+                _, when, bit, down = KEY_RECORD.unpack_from(data, offset)
+                offset += KEY_RECORD.size
+                push(when, bit, down)
+            elif tag == 'M':
+                _, dh, dp = TURN_RECORD.unpack_from(data, offset)
+                offset += TURN_RECORD.size
+                ctl.turnBy(dh, dp)
+            elif tag == 'P':
+                _, x, y = POINTER_RECORD.unpack_from(data, offset)
+                offset += POINTER_RECORD.size
+                pointer = (x, y)
+            elif tag == 'X':
+                _, dx, dy, dz = OFFSET_RECORD.unpack_from(data, offset)
+                offset += OFFSET_RECORD.size
+                ctl.carryOffset(dx, dy, dz)
+            else:
+                raise ValueError("bad record tag %r at offset %d" % (tag, offset))
+        elapsed = time.time() - t0
+
+        ctl.applyPose(1.0)
+        return steps, elapsed, mismatches, first
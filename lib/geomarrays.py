@@ -0,0 +1,123 @@
+'''
+Read Geom vertex columns and primitive indices as NumPy arrays in bulk,
+instead of one GeomVertexReader call per vertex.
+
+The arrays are read with one copy of each buffer, so changing the Geom
+afterwards doesn't change them.
+
+The drawing programs don't read their Geoms back any more: they give the
+FloorGrid each quad as it is drawn, and baked paths carry their floor
+triangles. getVertexArray and getTriangleIndices are kept for floors made
+from existing Geoms, and bench_floormesh.py compares them with the
+per-vertex readers.
+
+Created on Oct 18, 2026
+'''
+import numpy
+
+from panda3d.core import Geom
+
+from floorgrid import MIN_FLOOR_AREA
+
+INDEX_TYPES = {
+    Geom.NTUint8: numpy.uint8,
+    Geom.NTUint16: numpy.uint16,
+    Geom.NTUint32: numpy.uint32,
+}
+
+NUMERIC_TYPES = {
+    Geom.NTUint8: numpy.uint8,
+    Geom.NTUint16: numpy.uint16,
+    Geom.NTUint32: numpy.uint32,
+    Geom.NTFloat32: numpy.float32,
+    Geom.NTFloat64: numpy.float64,
+}
+
+
+def getArrayBytes(arrayData):
+    """ Get a copy of the bytes of a GeomVertexArrayData as a uint8 array. """
+    # (under Python 2, memoryview() of it can't be handed to NumPy, so
+    # take one copy through the handle)
+    return numpy.frombuffer(arrayData.getHandle().getData(), dtype=numpy.uint8)
+
+
+def getVertexArray(vertexData, column='vertex'):
+    """
+    Get a 3-component float column of @vertexData.
+    :return: an array of shape (rows, 3)
+    """
+    fmt = vertexData.getFormat()
+    arrayIndex = fmt.getArrayWith(column)
+    col = fmt.getColumn(column)
+    if arrayIndex < 0 or col is None:
+        raise ValueError("no %s column in %s" % (column, vertexData.getName()))
+    if col.getNumericType() != Geom.NTFloat32 or col.getNumComponents() < 3:
+        raise ValueError("%s column is not 3 floats" % column)
+
+    stride = fmt.getArray(arrayIndex).getStride()
+    rows = vertexData.getNumRows()
+    raw = getArrayBytes(vertexData.getArray(arrayIndex))
+    return numpy.ndarray(shape=(rows, 3), dtype=numpy.float32, buffer=raw,
+                         offset=col.getStart(), strides=(stride, 4))
+
+
+def getArrayDtype(arrayFormat):
+    """
+    Get a record type laid out like one row of @arrayFormat, with a field
+    per column, named for the column (e.g. 'vertex', 'color').
+    """
+    names, formats, offsets = [], [], []
+    for i in xrange(arrayFormat.getNumColumns()):
+        col = arrayFormat.getColumn(i)
+        ntype = NUMERIC_TYPES.get(col.getNumericType())
+        if ntype is None:
+            raise ValueError("can't lay out column %s" % col.getName().getName())
+        count = col.getNumComponents()
+        names.append(col.getName().getName())
+        formats.append(count > 1 and (ntype, (count,)) or ntype)
+        offsets.append(col.getStart())
+    return numpy.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                        'itemsize': arrayFormat.getStride()})
+
+
+def getPrimitiveIndices(prim):
+    """ Get every vertex index of @prim, in order, as one array. """
+    count = prim.getNumVertices()
+    if not prim.isIndexed():
+        first = prim.getFirstVertex()
+        return numpy.arange(first, first + count, dtype=numpy.uint32)
+    raw = getArrayBytes(prim.getVertices())
+    return raw.view(INDEX_TYPES[prim.getIndexType()])[:count]
+
+
+def getTriangleIndices(prim):
+    """ Get the triangles @prim makes, as an array of shape (triangles, 3). """
+    tris = prim.decompose()
+    return getPrimitiveIndices(tris).reshape(-1, 3)
+
+
+def addFloorTriangles(grid, vertices, triangles):
+    """
+    Add triangles to a FloorGrid in bulk.
+    @param vertices: the corner positions, shape (rows, 3)
+    @param triangles: indices into @vertices, shape (triangles, 3)
+    :return: how many were added (walls are skipped)
+    """
+    corners = numpy.asarray(vertices, dtype=numpy.float64)[numpy.asarray(triangles)]
+    a = corners[:, 0]
+    e1 = corners[:, 1] - a
+    e2 = corners[:, 2] - a
+
+    det = e1[:, 0] * e2[:, 1] - e2[:, 0] * e1[:, 1]
+    floors = numpy.abs(det) >= MIN_FLOOR_AREA
+    if not floors.all():
+        corners, a, e1, e2, det = corners[floors], a[floors], e1[floors], e2[floors], det[floors]
+
+    terms = numpy.column_stack((a, e1, e2, 1.0 / det))
+
+    cells = numpy.floor(corners[:, :, 0:2] * grid.invCellSize).astype(int)
+    bounds = numpy.column_stack((cells[:, :, 0].min(axis=1), cells[:, :, 0].max(axis=1),
+                                 cells[:, :, 1].min(axis=1), cells[:, :, 1].max(axis=1)))
+
+    grid.insertTriangles(terms, bounds)
+    return len(terms)
@@ -0,0 +1,362 @@
+'''
+Save drawn paths to a compact binary file, and load them back with their
+render and floor geometry already built.
+
+Baking turns a path's centerline (points, directions, widths and colors)
+into vertex rows, triangle indices and floor triangles, split into pieces
+of a few segments each, one Geom apiece for PathChunks. Given a spacing,
+the geometry follows a smooth spline through the points (see pathspline)
+sampled that finely, instead of joining the points with straight segments;
+the file keeps only the points either way. The loader maps
+the file and copies each piece's rows and indices into its Geom with one
+call each, so nothing is rebuilt vertex by vertex.
+
+makePathGeoms builds the same kind of Geoms straight from a centerline,
+which is how the coarser levels of detail are made: resampled along the
+spline every few units, so far fewer rings than the path has points.
+
+The file is:
+
+    header: 'PATH', version, kind, and the counts of what follows
+    centerline: a CENTERLINE_DTYPE record per point
+    rows: a ROW_DTYPE record (as in GeomVertexFormat.getV3c4) per vertex
+    pieces: a PIECE_DTYPE record per piece
+    triangles: 3 uint16 per triangle, counting from its piece's first row
+    floor triangles: 3 uint32 per triangle, counting from the first row
+
+with each section starting on an 8-byte boundary.
+
+To record while drawing:
+
+    recorder = PathRecorder(KIND_TUNNEL)
+    recorder.addSegment(a, b, into, width, leftColor, rightColor)
+    ...
+    recorder.save("tunnel.path", spacing=0.5)
+
+Created on Oct 18, 2026
+'''
+import mmap
+import struct
+
+import numpy
+
+from panda3d.core import GeomVertexFormat, GeomVertexData, GeomTriangles, Geom
+
+import geomarrays
+from pathbuilder import TUNNEL_SIDES
+from pathspline import PathSpline
+
+MAGIC = 'PATH'
+VERSION = 1
+
+# magic, version, kind, points, rows, pieces, triangles, floor triangles
+HEADER = struct.Struct('<4sHHIIIII')
+
+KIND_QUAD = 0
+KIND_TUNNEL = 1
+KIND_NAMES = {KIND_QUAD: 'quad', KIND_TUNNEL: 'tunnel'}
+
+# vertex rows made for each point
+ROWS_PER_POINT = {KIND_QUAD: 2, KIND_TUNNEL: 4}
+
+# the sides joining one point's rows to the next's, as pairs of rows;
+# the first is the floor (for a tunnel: bottom, right, top, left)
+SIDES = {KIND_QUAD: ((0, 1),), KIND_TUNNEL: TUNNEL_SIDES}
+
+# a tunnel is this many times as high as its half-width (as drawTunnelBoundary does)
+TUNNEL_HEIGHT = 3
+
+# segments in each piece
+SEGMENTS_PER_PIECE = 16
+
+# flag for a point that starts a new run, not joined to the point before
+FLAG_START = 1
+
+CENTERLINE_DTYPE = numpy.dtype([('center', '<f4', (3,)), ('into', '<f4', (3,)), ('width', '<f4'),
+                                ('leftColor', 'u1', (4,)), ('rightColor', 'u1', (4,)),
+                                ('flags', '<u4')])
+ROW_DTYPE = numpy.dtype([('vertex', '<f4', (3,)), ('color', 'u1', (4,))])
+PIECE_DTYPE = numpy.dtype([('firstRow', '<u4'), ('numRows', '<u4'),
+                           ('firstTriangle', '<u4'), ('numTriangles', '<u4')])
+
+
+def makeRows(centerline, kind):
+    """ Get the vertex rows for @centerline, as drawQuadRow or drawTunnelBoundary makes them. """
+    center = centerline['center'].astype(numpy.float64)
+    into = centerline['into'].astype(numpy.float64)
+    width = centerline['width'].astype(numpy.float64)
+    left, right = centerline['leftColor'], centerline['rightColor']
+
+    side = numpy.column_stack((-into[:, 1], into[:, 0], numpy.zeros(len(into)))) * width[:, None]
+    if kind == KIND_QUAD:
+        vertices = (center + side, center - side)
+        colors = (left, right)
+    else:
+        up = numpy.zeros_like(center)
+        up[:, 2] = width * TUNNEL_HEIGHT
+        vertices = (center + side, center - side, center - side + up, center + side + up)
+        colors = (left, right, left, right)
+
+    rows = numpy.zeros(len(center) * ROWS_PER_POINT[kind], dtype=ROW_DTYPE)
+    rows['vertex'] = numpy.stack(vertices, axis=1).reshape(-1, 3)
+    rows['color'] = numpy.stack(colors, axis=1).reshape(-1, 4)
+    return rows
+
+
+def smoothCenterline(centerline, spacing, resample=False):
+    """
+    Sample each run of @centerline along a spline through its points, about
+    every @spacing units, blending the widths and colors between points.
+    @param resample: if True, sample exactly every @spacing units instead
+    of at every point as well (see PathSpline.resample), for fewer samples
+    """
+    starts = numpy.flatnonzero(centerline['flags'] & FLAG_START)
+    runs = numpy.split(centerline, starts[starts > 0])
+
+    smoothed = []
+    for run in runs:
+        if len(run) < 2:
+            smoothed.append(run)
+            continue
+
+        spline = PathSpline(run['center'])
+        if resample:
+            centers, intos, segments, u = spline.resample(spacing)
+        else:
+            centers, intos, segments, u = spline.tessellate(spacing)
+        t = u[:, None]
+
+        points = numpy.zeros(len(centers), dtype=CENTERLINE_DTYPE)
+        points['center'] = centers
+        points['into'] = intos
+        width = run['width'].astype(numpy.float64)
+        points['width'] = width[segments] * (1 - u) + width[segments + 1] * u
+        for name in ('leftColor', 'rightColor'):
+            color = run[name].astype(numpy.float64)
+            points[name] = numpy.rint(color[segments] * (1 - t) + color[segments + 1] * t)
+        points['flags'][0] = FLAG_START
+        smoothed.append(points)
+
+    return numpy.concatenate(smoothed)
+
+
+def makeTriangles(centerline, kind):
+    """
+    Get the triangles joining each point of @centerline to the next.
+    :return: (segments, triangles) where segments are the points each
+    segment starts at, and triangles has shape (segments, triangles per segment, 3)
+    """
+    segments = numpy.nonzero((centerline['flags'][1:] & FLAG_START) == 0)[0]
+    perPoint = ROWS_PER_POINT[kind]
+    a = (segments * perPoint)[:, None]
+    b = a + perPoint
+
+    triangles = []
+    for p, q in SIDES[kind]:
+        triangles.append(numpy.column_stack((a + p, a + q, b + p)))
+        triangles.append(numpy.column_stack((a + q, b + q, b + p)))
+    return segments, numpy.stack(triangles, axis=1)
+
+
+def makePieces(segments, triangles, kind, segmentsPerPiece=SEGMENTS_PER_PIECE):
+    """
+    Split segments into pieces of up to @segmentsPerPiece, breaking at gaps.
+    :return: (pieces, triangles counted from each piece's first row)
+    """
+    perPoint = ROWS_PER_POINT[kind]
+    perSegment = triangles.shape[1]
+
+    bounds = []
+    segs = segments.tolist()
+    start = 0
+    for k in xrange(1, len(segs) + 1):
+        if k == len(segs) or k - start == segmentsPerPiece or segs[k] != segs[k-1] + 1:
+            bounds.append((start, k))
+            start = k
+
+    pieces = numpy.zeros(len(bounds), dtype=PIECE_DTYPE)
+    if not bounds:
+        return pieces, numpy.zeros((0, 3), dtype='<u2')
+
+    first, end = numpy.array(bounds).T
+    pieces['firstRow'] = segments[first] * perPoint
+    pieces['numRows'] = (segments[end - 1] + 2) * perPoint - pieces['firstRow']
+    pieces['firstTriangle'] = first * perSegment
+    pieces['numTriangles'] = (end - first) * perSegment
+
+    base = numpy.repeat(pieces['firstRow'].astype(numpy.int64), end - first)
+    local = triangles - base[:, None, None]
+    return pieces, local.reshape(-1, 3).astype('<u2')
+
+
+def makeGeoms(rows, pieces, triangles):
+    """
+    Make a Geom for each piece.
+    @param rows: ROW_DTYPE records
+    @param pieces: PIECE_DTYPE records
+    @param triangles: as makePieces gives them
+    """
+    fmt = GeomVertexFormat.getV3c4()
+    rowDtype = geomarrays.getArrayDtype(fmt.getArray(0))
+    if rowDtype != ROW_DTYPE:
+        converted = numpy.zeros(len(rows), dtype=rowDtype)
+        converted['vertex'] = rows['vertex']
+        converted['color'] = rows['color']
+        rows = converted
+
+    geoms = []
+    for firstRow, numRows, firstTriangle, numTriangles in pieces.tolist():
+        vertexData = GeomVertexData("path", fmt, Geom.UHStatic)
+        vertexData.uncleanSetNumRows(numRows)
+        data = rows[firstRow:firstRow + numRows].tostring()
+        vertexData.modifyArray(0).modifyHandle().setSubdata(0, len(data), data)
+
+        tris = GeomTriangles(Geom.UHStatic)
+        tris.setIndexType(Geom.NTUint16)
+        indices = triangles[firstTriangle:firstTriangle + numTriangles].tostring()
+        indexArray = tris.modifyVertices()
+        indexArray.uncleanSetNumRows(numTriangles * 3)
+        indexArray.modifyHandle().setSubdata(0, len(indices), indices)
+
+        geom = Geom(vertexData)
+        geom.addPrimitive(tris)
+        geoms.append(geom)
+    return geoms
+
+
+def makePathGeoms(centerline, kind, spacing, segmentsPerPiece=SEGMENTS_PER_PIECE):
+    """
+    Make Geoms for a coarse version of @centerline, resampled along its
+    spline every @spacing units, without baking it to a file.
+    """
+    centerline = smoothCenterline(numpy.asarray(centerline, dtype=CENTERLINE_DTYPE),
+                                  spacing, resample=True)
+    rows = makeRows(centerline, kind)
+    segments, triangles = makeTriangles(centerline, kind)
+    pieces, local = makePieces(segments, triangles, kind, segmentsPerPiece)
+    return makeGeoms(rows, pieces, local)
+
+
+def bakePath(filename, centerline, kind, spacing=None):
+    """
+    Write @centerline (a CENTERLINE_DTYPE array) and its geometry to @filename.
+    @param spacing: if not None, make the geometry along a spline through the
+    points, sampled this finely
+    """
+    centerline = numpy.asarray(centerline, dtype=CENTERLINE_DTYPE)
+    extruded = centerline
+    if spacing:
+        extruded = smoothCenterline(centerline, spacing)
+
+    rows = makeRows(extruded, kind)
+    segments, triangles = makeTriangles(extruded, kind)
+    pieces, local = makePieces(segments, triangles, kind)
+    floor = triangles[:, 0:2].reshape(-1, 3).astype('<u4')
+
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, kind, len(centerline), len(rows),
+                            len(pieces), len(local), len(floor)))
+        for section in (centerline, rows, pieces, local, floor):
+            f.write('\0' * (-f.tell() % 8))
+            f.write(section.tostring())
+
+
+class PathRecorder(object):
+    """ Collects a path's centerline as it is drawn, to bake it. """
+    def __init__(self, kind):
+        self.kind = kind
+        self.points = []
+        # centerlines already baked (e.g. loaded)
+        self.baked = []
+        self.newRun = True
+        # where in points the last breakPath() left off
+        self.runStart = 0
+
+    def getNumPoints(self):
+        return len(self.points) + sum(len(centerline) for centerline in self.baked)
+
+    def breakPath(self):
+        """ Don't join the next segment to the last one. """
+        self.newRun = True
+        self.runStart = len(self.points)
+
+    def addSegment(self, a, b, into, width, leftColor, rightColor):
+        """ Add the segment from point @a to @b, heading @into. """
+        if self.newRun:
+            self.points.append((tuple(a), tuple(into), width, tuple(leftColor), tuple(rightColor), FLAG_START))
+            self.newRun = False
+        self.points.append((tuple(b), tuple(into), width, tuple(leftColor), tuple(rightColor), 0))
+
+    def addCenterline(self, centerline):
+        """ Add an already baked centerline (e.g. BakedPath.centerline), as its own run. """
+        self.baked.append(numpy.array(centerline, dtype=CENTERLINE_DTYPE))
+        self.newRun = True
+
+    def getCenterline(self):
+        return numpy.concatenate(self.baked + [self._makeCenterline(self.points)])
+
+    def getLastRun(self):
+        """ Get the centerline added since the last breakPath(). """
+        return self._makeCenterline(self.points[self.runStart:])
+
+    def _makeCenterline(self, records):
+        points = numpy.zeros(len(records), dtype=CENTERLINE_DTYPE)
+        if records:
+            center, into, width, left, right, flags = zip(*records)
+            points['center'] = center
+            points['into'] = into
+            points['width'] = width
+            # (wrapping around like GeomVertexWriter.addData4i does)
+            points['leftColor'] = numpy.asarray(left, dtype=numpy.int64).astype(numpy.uint8)
+            points['rightColor'] = numpy.asarray(right, dtype=numpy.int64).astype(numpy.uint8)
+            points['flags'] = flags
+        return points
+
+    def save(self, filename, spacing=None):
+        bakePath(filename, self.getCenterline(), self.kind, spacing)
+
+
+class BakedPath(object):
+    """ A baked path file, mapped into memory. """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.kind, numPoints, numRows, numPieces, numTriangles, numFloor = \
+            HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a baked path" % filename)
+        if version != VERSION:
+            raise ValueError("%s has path version %d, expected %d" % (filename, version, VERSION))
+
+        offset = HEADER.size
+        self.centerline, offset = self._section(offset, CENTERLINE_DTYPE, numPoints)
+        self.rows, offset = self._section(offset, ROW_DTYPE, numRows)
+        self.pieces, offset = self._section(offset, PIECE_DTYPE, numPieces)
+        triangles, offset = self._section(offset, numpy.dtype('<u2'), numTriangles * 3)
+        floor, offset = self._section(offset, numpy.dtype('<u4'), numFloor * 3)
+        self.triangles = triangles.reshape(-1, 3)
+        self.floorTriangles = floor.reshape(-1, 3)
+
+    def _section(self, offset, dtype, count):
+        offset += -offset % 8
+        size = dtype.itemsize * count
+        if offset + size > len(self.data):
+            raise ValueError("%s is truncated" % self.filename)
+        if not count:
+            return numpy.zeros(0, dtype=dtype), offset
+        return numpy.frombuffer(self.data, dtype=dtype, count=count, offset=offset), offset + size
+
+    def makeGeoms(self):
+        """ Make a Geom for each piece. """
+        return makeGeoms(self.rows, self.pieces, self.triangles)
+
+    def addFloor(self, grid):
+        """ Add the path's floor to a FloorGrid. """
+        return geomarrays.addFloorTriangles(grid, self.rows['vertex'], self.floorTriangles)
+
+    def close(self):
+        """ Unmap the file (the arrays from it can't be used after). """
+        self.centerline = self.rows = self.pieces = self.triangles = self.floorTriangles = None
+        self.data.close()
@@ -0,0 +1,156 @@
+'''
+Build a path's GeomVertexData a row, or many rows, at a time.
+
+Many rows at once (addRows, writeRows) are packed into a NumPy record
+array laid out like the vertex format and copied into the vertex table
+with one call, instead of a GeomVertexWriter call per column per vertex.
+A row or two at a time, as the programs draw, packing costs more than it
+saves, so addRow writes single rows with GeomVertexWriters. The table is
+grown ahead of use, doubling each time, so adding rows doesn't reallocate
+it every time.
+
+Created on Oct 18, 2026
+'''
+import numpy
+
+from panda3d.core import GeomVertexFormat, GeomVertexData, GeomVertexWriter, Geom
+
+import geomarrays
+
+# rows reserved to start with
+DEFAULT_CAPACITY = 256
+
+# the sides of a tunnel ring, as pairs of its rows (low left, low right,
+# high right, high left): bottom, right, top, left
+TUNNEL_SIDES = ((0, 1), (1, 2), (2, 3), (3, 0))
+
+
+def makeQuadRows(centers, intos, width):
+    """
+    Get the rows for a flat path through @centers, as drawQuadRow makes them.
+    @param centers: the points along the path, shape (points, 3)
+    @param intos: the normalized direction at each point, shape (points, 3)
+    :return: left and right corners, interleaved, shape (points * 2, 3)
+    """
+    centers = numpy.asarray(centers, dtype=numpy.float64)
+    intos = numpy.asarray(intos, dtype=numpy.float64)
+    side = numpy.column_stack((-intos[:, 1], intos[:, 0], numpy.zeros(len(intos)))) * width
+
+    rows = numpy.empty((len(centers), 2, 3))
+    rows[:, 0] = centers + side
+    rows[:, 1] = centers - side
+    return rows.reshape(-1, 3)
+
+
+def addTunnelTriangles(tris, row, verts):
+    """
+    Join the tunnel ring starting at @row to the ring before it, sharing
+    both rings' rows, with two triangles per side.
+    @param tris: a GeomTriangles
+    @param verts: the rows in a ring
+    :return: the number of indices added
+    """
+    prev = row - verts
+    for p, q in TUNNEL_SIDES:
+        tris.addVertices(prev + p, prev + q, row + p)
+        tris.addVertices(prev + q, row + q, row + p)
+    return len(TUNNEL_SIDES) * 6
+
+
+class PathBuilder(object):
+    def __init__(self, name='path', capacity=DEFAULT_CAPACITY, fmt=None):
+        """
+        @param fmt: a single-array format with 'vertex' and 'color' columns;
+        V3c4 if None
+        """
+        fmt = fmt or GeomVertexFormat.getV3c4()
+        if fmt.getNumArrays() != 1:
+            raise ValueError("only single-array vertex formats are supported")
+
+        self.vertexData = GeomVertexData(name, fmt, Geom.UHStatic)
+        self.dtype = geomarrays.getArrayDtype(fmt.getArray(0))
+        self.stride = self.dtype.itemsize
+
+        self.numRows = 0
+        self.capacity = 0
+        # (vertex, color) GeomVertexWriters for addRow, or None to make
+        # them again at the next row
+        self.writers = None
+        self.reserve(capacity)
+
+    def getNumRows(self):
+        """ Get the number of rows written (not reserved). """
+        return self.numRows
+
+    def reserve(self, rows):
+        """ Make room for at least @rows rows in all. """
+        if rows <= self.capacity:
+            return
+        self.capacity = max(rows, self.capacity * 2)
+        self.vertexData.setNumRows(self.capacity)
+        self.writers = None
+
+    def addRow(self, vertex, color):
+        """
+        Add one row.
+        @param vertex: its position (x, y, z)
+        @param color: 0-255 RGBA
+        :return: the row
+        """
+        row = self.numRows
+        self.reserve(row + 1)
+        if self.writers is None:
+            vertexWriter = GeomVertexWriter(self.vertexData, 'vertex')
+            colorWriter = GeomVertexWriter(self.vertexData, 'color')
+            vertexWriter.setRow(row)
+            colorWriter.setRow(row)
+            self.writers = (vertexWriter, colorWriter)
+        vertexWriter, colorWriter = self.writers
+
+        # (into the rows already reserved, so set rather than add)
+        vertexWriter.setData3f(vertex[0], vertex[1], vertex[2])
+        colorWriter.setData4i(color[0], color[1], color[2], color[3])
+        self.numRows = row + 1
+        return row
+
+    def addRows(self, vertices, colors):
+        """
+        Add rows to the end.
+        @param vertices: positions, shape (rows, 3)
+        @param colors: 0-255 RGBA, shape (rows, 4), or one color for every row
+        :return: the first new row
+        """
+        vertices = numpy.asarray(vertices, dtype=numpy.float32).reshape(-1, 3)
+        rows = numpy.zeros(len(vertices), dtype=self.dtype)
+        rows['vertex'] = vertices
+        # (wrapping around like GeomVertexWriter.addData4i does)
+        rows['color'] = numpy.asarray(colors, dtype=numpy.int64).astype(numpy.uint8)
+        return self.writeRows(rows)
+
+    def writeRows(self, rows):
+        """
+        Add rows already packed in a record array of self.dtype.
+        :return: the first new row
+        """
+        first = self.numRows
+        self.reserve(first + len(rows))
+        # (the writers might not see what is written behind them)
+        self.writers = None
+
+        data = rows.tostring()
+        handle = self.vertexData.modifyArray(0).modifyHandle()
+        handle.setSubdata(first * self.stride, len(data), data)
+
+        self.numRows += len(rows)
+        return first
+
+    def finish(self):
+        """
+        Drop the reserved rows that were never written, once no more rows
+        are coming.
+        :return: the vertex data
+        """
+        self.vertexData.setNumRows(self.numRows)
+        self.capacity = self.numRows
+        self.writers = None
+        return self.vertexData
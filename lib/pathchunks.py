@@ -0,0 +1,283 @@
+'''
+Group generated path geometry into square chunks by position, so each
+chunk has its own bounds for culling, and page out the far ones.
+
+Chunks near the player are left as drawn. Farther ones are flattened into
+as few Geoms as they will go, and beyond that they are written out as BAM
+and removed from the scene graph, to be read back when the player comes
+near again.
+
+Each chunk is an LODNode with a GeomNode per level of detail: level 0 for
+the geometry as drawn, and coarser ones (e.g. pathbake.makePathGeoms at a
+wider spacing) added with addGeom(geom, level). A level shows from its
+LOD_DISTANCES entry out to the next level's, and a level with nothing in
+it leaves the one before showing further out. Once a chunk is showing a
+level, the switch distances on either side of it move LOD_HYSTERESIS
+further away, so standing near a switch distance doesn't flicker between
+two levels.
+
+Created on Oct 18, 2026
+'''
+import atexit
+import os
+import shutil
+import tempfile
+from math import floor
+
+from panda3d.core import GeomNode, LODNode, NodePath, Point3
+
+# size of a chunk, in world units
+DEFAULT_CHUNK_SIZE = 32.0
+
+# distances in chunks from the player's chunk (a diagonal neighbor is 1)
+FLATTEN_RADIUS = 1
+LOAD_RADIUS = 3
+# (further out than LOAD_RADIUS, so walking along a chunk edge doesn't
+# read and write the same chunks over and over)
+UNLOAD_RADIUS = 4
+
+# where each level of detail starts showing, in world units from a
+# chunk's center; level 0 is the geometry as drawn
+LOD_DISTANCES = (0.0, 64.0, 128.0)
+
+# how much further the camera must go past a switch distance before a
+# chunk changes level again
+LOD_HYSTERESIS = 8.0
+
+# the last level shows out to here
+LOD_FAR = 1e6
+
+
+class PathChunk(object):
+    def __init__(self, key):
+        self.key = key
+        # None while paged out
+        self.nodePath = None
+        # the GeomNode for each level of detail, under nodePath
+        self.levels = None
+        # the level last shown, or None
+        self.level = None
+        self.flat = False
+        # the BAM file and whether it is up to date
+        self.filename = None
+        self.saved = False
+
+
+class PathChunks(object):
+    def __init__(self, parent, chunkSize=DEFAULT_CHUNK_SIZE, cacheDir=None,
+                 flattenRadius=FLATTEN_RADIUS, loadRadius=LOAD_RADIUS, unloadRadius=UNLOAD_RADIUS,
+                 lodDistances=LOD_DISTANCES, lodHysteresis=LOD_HYSTERESIS):
+        """
+        @param parent: the NodePath to put the chunks under
+        @param cacheDir: where to page chunks out to; if None, a temporary
+        directory, removed at exit
+        @param lodDistances: where each level of detail starts, increasing from 0
+        """
+        if unloadRadius <= loadRadius:
+            raise ValueError("unloadRadius must be larger than loadRadius")
+        if not lodDistances or lodDistances[0] != 0 or list(lodDistances) != sorted(lodDistances):
+            raise ValueError("lodDistances must increase from 0")
+
+        self.root = parent.attachNewNode('pathChunks')
+        self.chunkSize = float(chunkSize)
+        self.invChunkSize = 1.0 / self.chunkSize
+        self.cacheDir = cacheDir
+        self.ownCacheDir = False
+
+        self.flattenRadius = flattenRadius
+        self.loadRadius = loadRadius
+        self.unloadRadius = unloadRadius
+
+        self.lodDistances = tuple(float(dist) for dist in lodDistances)
+        self.lodHysteresis = float(lodHysteresis)
+
+        # (ix, iy) -> PathChunk
+        self.chunks = {}
+        # the player's chunk at the last update
+        self.center = None
+        # where the camera was when the levels were last checked
+        self.lodPos = None
+
+    def getChunkKey(self, x, y):
+        inv = self.invChunkSize
+        return int(floor(x * inv)), int(floor(y * inv))
+
+    def getNumChunks(self):
+        return len(self.chunks)
+
+    def getNumLoaded(self):
+        return sum(1 for chunk in self.chunks.itervalues() if chunk.nodePath is not None)
+
+    def getNumLevels(self):
+        return len(self.lodDistances)
+
+    def getChunkCenter(self, key):
+        """ Get the (x, y) of the middle of the chunk at @key. """
+        return (key[0] + 0.5) * self.chunkSize, (key[1] + 0.5) * self.chunkSize
+
+    def addGeom(self, geom, level=0):
+        """
+        Add a finished Geom to the chunk around its center.
+        @param level: the level of detail it is for, 0 being the finest
+        :return: the PathChunk, or None if @geom is empty
+        """
+        if not 0 <= level < len(self.lodDistances):
+            raise ValueError("no level of detail %d" % level)
+
+        bounds = geom.getBounds()
+        if bounds.isEmpty():
+            return None
+        center = bounds.getApproxCenter()
+        key = self.getChunkKey(center.x, center.y)
+
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = PathChunk(key)
+        if chunk.nodePath is None:
+            if chunk.filename:
+                self._load(chunk)
+            else:
+                self._makeNode(chunk, center.z)
+
+        geomNode = chunk.levels[level].node()
+        wasEmpty = not geomNode.getNumGeoms()
+        geomNode.addGeom(geom)
+        if wasEmpty:
+            self._setSwitches(chunk)
+        chunk.flat = False
+        chunk.saved = False
+        return chunk
+
+    def _makeNode(self, chunk, z):
+        lod = LODNode('chunk %d,%d' % chunk.key)
+        x, y = self.getChunkCenter(chunk.key)
+        lod.setCenter(Point3(x, y, z))
+        chunk.nodePath = self.root.attachNewNode(lod)
+        chunk.levels = []
+        for level in xrange(len(self.lodDistances)):
+            lod.addSwitch(0, 0)
+            chunk.levels.append(chunk.nodePath.attachNewNode(GeomNode('level %d' % level)))
+
+    def _getRanges(self, chunk):
+        """
+        Get where each level with geometry shows, with the hysteresis
+        around the current one.
+        :return: list of (level, near, far)
+        """
+        shown = [level for level, nodePath in enumerate(chunk.levels) if nodePath.node().getNumGeoms()]
+        ranges = []
+        near = 0.0
+        for i, level in enumerate(shown):
+            if i + 1 < len(shown):
+                far = self.lodDistances[shown[i + 1]]
+                if level == chunk.level:
+                    far += self.lodHysteresis
+                elif shown[i + 1] == chunk.level:
+                    far -= self.lodHysteresis
+                far = max(far, near)
+            else:
+                far = LOD_FAR
+            ranges.append((level, near, far))
+            near = far
+        return ranges
+
+    def _setSwitches(self, chunk):
+        lod = chunk.nodePath.node()
+        for level in xrange(len(chunk.levels)):
+            lod.setSwitch(level, 0, 0)
+        for level, near, far in self._getRanges(chunk):
+            lod.setSwitch(level, far, near)
+
+    def _updateLevel(self, chunk, x, y, z):
+        """ Note which level the chunk shows with the camera at (@x, @y, @z), moving its switches if it changed. """
+        # (measured as the LODNode does, from its center)
+        center = chunk.nodePath.node().getCenter()
+        dist = ((x - center.x) ** 2 + (y - center.y) ** 2 + (z - center.z) ** 2) ** 0.5
+        for level, near, far in self._getRanges(chunk):
+            if dist < far:
+                break
+        else:
+            return
+        if level != chunk.level:
+            chunk.level = level
+            self._setSwitches(chunk)
+
+    def update(self, x, y, z):
+        """
+        Flatten, page out and page in chunks for the camera at (@x, @y, @z),
+        when it has moved to another chunk, and keep track of the level
+        each chunk shows, when it has moved far enough for that to change.
+        """
+        key = self.getChunkKey(x, y)
+        moved = key != self.center
+        if moved:
+            self.center = key
+            self._page(key)
+
+        if not moved and self.lodPos is not None:
+            dx, dy, dz = x - self.lodPos[0], y - self.lodPos[1], z - self.lodPos[2]
+            # (so the levels here are never more than half the hysteresis behind the LODNodes')
+            if dx * dx + dy * dy + dz * dz <= (self.lodHysteresis * 0.5) ** 2:
+                return
+        self.lodPos = x, y, z
+        for chunk in self.chunks.itervalues():
+            if chunk.nodePath is not None:
+                self._updateLevel(chunk, x, y, z)
+
+    def _page(self, key):
+        cx, cy = key
+        for chunk in self.chunks.itervalues():
+            dist = max(abs(chunk.key[0] - cx), abs(chunk.key[1] - cy))
+            if chunk.nodePath is None:
+                if dist <= self.loadRadius:
+                    self._load(chunk)
+            elif dist > self.unloadRadius:
+                self._unload(chunk)
+            elif dist > self.flattenRadius and not chunk.flat:
+                self._flatten(chunk)
+
+    def _flatten(self, chunk):
+        # (each level on its own; the LODNode must keep one child per level)
+        for nodePath in chunk.levels:
+            nodePath.flattenStrong()
+        chunk.flat = True
+
+    def _unload(self, chunk):
+        if not chunk.flat:
+            self._flatten(chunk)
+
+        if not chunk.saved:
+            if not chunk.filename:
+                chunk.filename = os.path.join(self._getCacheDir(), 'chunk_%d_%d.bam' % chunk.key)
+            with open(chunk.filename, 'wb') as f:
+                f.write(chunk.nodePath.encodeToBamStream())
+            chunk.saved = True
+
+        chunk.nodePath.removeNode()
+        chunk.nodePath = None
+        chunk.levels = None
+
+    def _load(self, chunk):
+        with open(chunk.filename, 'rb') as f:
+            chunk.nodePath = NodePath.decodeFromBamStream(f.read())
+        chunk.nodePath.reparentTo(self.root)
+        chunk.levels = [chunk.nodePath.getChild(i) for i in xrange(chunk.nodePath.getNumChildren())]
+
+    def _getCacheDir(self):
+        if self.cacheDir is None:
+            self.cacheDir = tempfile.mkdtemp(prefix='pathchunks')
+            self.ownCacheDir = True
+            atexit.register(self.close)
+        return self.cacheDir
+
+    def close(self):
+        """ Remove the paged-out files (the chunks in them are lost). """
+        for chunk in self.chunks.itervalues():
+            if chunk.filename and os.path.exists(chunk.filename):
+                os.remove(chunk.filename)
+            chunk.filename = None
+            chunk.saved = False
+        if self.ownCacheDir and self.cacheDir and os.path.isdir(self.cacheDir):
+            shutil.rmtree(self.cacheDir)
+            self.cacheDir = None
+            self.ownCacheDir = False
@@ -0,0 +1,120 @@
+'''
+Simplify a path as it is sampled, by merging nearly collinear segments.
+
+The points since the last emitted one are held back, and the segment
+reaching them is only emitted once a new point can't be reached without
+one of them straying more than the tolerance from the straight line (or
+the segment would get too long). That is Douglas-Peucker's error bound,
+applied to a sliding window of at most a segment's worth of points, so
+each point costs a bounded amount of work.
+
+    simplifier = PathSimplifier()
+    segment = simplifier.addPoint(pos)   # (start, end) to draw, or None
+    ...
+    segment = simplifier.flush()         # the last one, when done
+
+Created on Oct 18, 2026
+'''
+from math import sqrt
+
+# how far (in world units) a sampled point may be from the simplified path
+DEFAULT_TOLERANCE = 0.1
+
+# the longest a merged segment may be, so no one piece of geometry (or
+# floor triangle) gets too big, and drawing doesn't lag far behind
+DEFAULT_MAX_LENGTH = 16.0
+
+
+def getDistanceToSegment(p, a, b):
+    """ Get how far point @p is from the segment @a to @b. """
+    abx, aby, abz = b[0] - a[0], b[1] - a[1], b[2] - a[2]
+    apx, apy, apz = p[0] - a[0], p[1] - a[1], p[2] - a[2]
+    lenSq = abx * abx + aby * aby + abz * abz
+    t = 0.0
+    if lenSq > 0:
+        t = min(1.0, max(0.0, (apx * abx + apy * aby + apz * abz) / lenSq))
+    dx, dy, dz = apx - t * abx, apy - t * aby, apz - t * abz
+    return sqrt(dx * dx + dy * dy + dz * dz)
+
+
+class PathSimplifier(object):
+    def __init__(self, tolerance=DEFAULT_TOLERANCE, maxLength=DEFAULT_MAX_LENGTH):
+        self.tolerance = tolerance
+        self.maxLength = maxLength
+        self.samples = 0
+        self.segments = 0
+        self.runs = 0
+        self.reset()
+
+    def reset(self):
+        """ Start a new path (flush() the old one first to keep its end). """
+        # the end of the last segment emitted (or the first point)
+        self.anchor = None
+        # the points since, the last being where the next segment ends so far
+        self.pending = []
+
+    def addPoint(self, p):
+        """
+        Add the next sampled point.
+        :return: (start, end) of a segment to draw now, or None
+        """
+        self.samples += 1
+        if self.anchor is None:
+            self.anchor = p
+            self.runs += 1
+            return None
+
+        if self.pending and not self._fits(p):
+            segment = self._emit()
+            self.pending = [p]
+            return segment
+
+        self.pending.append(p)
+        return None
+
+    def flush(self):
+        """
+        End the path at the last point added.
+        :return: (start, end) of the last segment to draw, or None
+        """
+        if not self.pending:
+            return None
+        segment = self._emit()
+        self.pending = []
+        return segment
+
+    def _fits(self, p):
+        """ Tell whether the held points all lie along anchor -> @p. """
+        a = self.anchor
+        dx, dy, dz = p[0] - a[0], p[1] - a[1], p[2] - a[2]
+        if dx * dx + dy * dy + dz * dz > self.maxLength * self.maxLength:
+            return False
+
+        tolerance = self.tolerance
+        for q in self.pending:
+            if getDistanceToSegment(q, a, p) > tolerance:
+                return False
+        return True
+
+    def _emit(self):
+        segment = (self.anchor, self.pending[-1])
+        self.anchor = self.pending[-1]
+        self.segments += 1
+        return segment
+
+    def getNumSamples(self):
+        return self.samples
+
+    def getNumSegments(self):
+        return self.segments
+
+    def getReduction(self):
+        """
+        Get the fraction of segments saved, compared to drawing one per
+        sampled point.
+        """
+        # (each run's first point starts a segment rather than ending one)
+        unsimplified = self.samples - self.runs
+        if unsimplified <= 0:
+            return 0.0
+        return max(0.0, 1.0 - float(self.segments) / unsimplified)
@@ -1,18 +1,477 @@
 import heapq
+import itertools
+import math
+from timeit import default_timer
 
 from panda3d.direct import CInterval
+from direct.showbase.DirectObject import DirectObject
+from direct.showbase.MessengerGlobal import messenger
 
-class Scheduler(object):
+
+class ScheduledAction(object):
+    """
+    Handle for an action or interval queued on a Scheduler.
+
+    Cancelling is lazy: the queue entry stays where it is and is skipped
+    when it comes up, so cancel() is O(1).
+    """
+    __slots__ = ('_scheduler', '_time', '_seq', '_func', '_interval', '_state', '_callbacks')
+
+    PENDING, RUNNING, DONE, CANCELLED = range(4)
+
+    def __init__(self, scheduler, time, seq, func, interval=None):
+        self._scheduler = scheduler
+        self._time = time
+        self._seq = seq
+        self._func = func
+        self._interval = interval
+        self._state = self.PENDING
+        self._callbacks = None
+
+    def getTime(self):
+        """ :return: the time the action runs (or ran) at """
+        return self._time
+
+    def getInterval(self):
+        return self._interval
+
+    def isPending(self):
+        return self._state == self.PENDING
+
+    def isRunning(self):
+        """ :return: True if this is an interval which has started but not finished """
+        return self._state == self.RUNNING
+
+    def isDone(self):
+        """ :return: True once the action ran, or the interval finished """
+        return self._state == self.DONE
+
+    def isCancelled(self):
+        return self._state == self.CANCELLED
+
+    def cancel(self):
+        """
+        Drop the action if it has not run yet.  A running interval is paused.
+        :return: True if anything was cancelled
+        """
+        return self._scheduler._cancel(self)
+
+    def reschedule(self, delay):
+        """
+        Move a pending (or cancelled) action to @delay seconds from now.
+        :return: True if the action was rescheduled
+        """
+        return self._scheduler._reschedule(self, delay)
+
+    def addDoneCallback(self, callback):
+        """
+        Call @callback(handle) once the action is done or cancelled
+        (right away, if it already is).
+        """
+        if self._state == self.DONE or self._state == self.CANCELLED:
+            callback(self)
+        elif self._callbacks is None:
+            self._callbacks = [callback]
+        else:
+            self._callbacks.append(callback)
+
+    def _settle(self, state):
+        self._state = state
+        callbacks = self._callbacks
+        if callbacks:
+            self._callbacks = None
+            for callback in callbacks:
+                callback(self)
+
+
+class CancelledError(Exception):
+    """ Raised inside a Coroutine when what it was waiting for is cancelled """
+
+
+class Coroutine(object):
+    """
+    Drives a generator from a Scheduler's tick(), without threads.
+
+    The generator yields what it wants to wait for: a ScheduledAction
+    (e.g. from Scheduler.sleep() or Scheduler.waitInterval()), another
+    Coroutine, or a number of seconds to sleep.  It is resumed with the
+    thing it waited for once that is done; if that was cancelled instead,
+    CancelledError is raised at the yield.
+    """
+    __slots__ = ('_scheduler', '_gen', '_waiting', '_done', '_cancelled', '_callbacks', '_resume')
+
+    def __init__(self, scheduler, gen):
+        self._scheduler = scheduler
+        self._gen = gen
+        self._waiting = None
+        self._done = False
+        self._cancelled = False
+        self._callbacks = None
+        # bound once, rather than making a closure per step
+        self._resume = self._step
+
+    def isDone(self):
+        """ :return: True once the generator has finished, or was cancelled """
+        return self._done
+
+    def isCancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """
+        Stop the coroutine, cancelling whatever it is waiting for.
+        :return: True if it was still running
+        """
+        if self._done:
+            return False
+        self._cancelled = True
+        waiting, self._waiting = self._waiting, None
+        self._gen.close()
+        self._finish()
+        if waiting is not None:
+            waiting.cancel()
+        return True
+
+    def addDoneCallback(self, callback):
+        """ Call @callback(coroutine) once the coroutine ends (right away, if it has) """
+        if self._done:
+            callback(self)
+        elif self._callbacks is None:
+            self._callbacks = [callback]
+        else:
+            self._callbacks.append(callback)
+
+    def _finish(self):
+        self._done = True
+        callbacks = self._callbacks
+        if callbacks:
+            self._callbacks = None
+            for callback in callbacks:
+                callback(self)
+
+    def _step(self, value=None):
+        if self._done:
+            return
+        scheduler = self._scheduler
+        while True:
+            try:
+                if value is not None and value.isCancelled():
+                    waitFor = self._gen.throw(CancelledError())
+                else:
+                    waitFor = self._gen.send(value)
+            except StopIteration:
+                self._waiting = None
+                self._finish()
+                return
+            except CancelledError:
+                self._waiting = None
+                self._cancelled = True
+                self._finish()
+                return
+            except:
+                import traceback
+                traceback.print_exc()
+                self._waiting = None
+                self._finish()
+                return
+
+            if waitFor is None:
+                waitFor = scheduler.sleep(0)
+            elif isinstance(waitFor, (int, long, float)):
+                waitFor = scheduler.sleep(waitFor)
+            elif not isinstance(waitFor, (ScheduledAction, Coroutine)):
+                waitFor = scheduler.waitInterval(waitFor)
+
+            if waitFor.isDone() or waitFor.isCancelled():
+                # loop instead of recursing through the callback
+                value = waitFor
+                continue
+
+            self._waiting = waitFor
+            waitFor.addDoneCallback(self._resume)
+            return
+
+
+class HeapQueue(object):
+    """
+    Binary heap of (start, seq, ScheduledAction) entries.  This is the
+    Scheduler's default queue.
+    """
     def __init__(self):
+        self._heap = []
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, entry):
+        heapq.heappush(self._heap, entry)
+
+    def peek(self, limit=None):
+        """
+        :param limit: if not None, only return an entry starting by this time
+        :return: the earliest entry, or None
+        """
+        heap = self._heap
+        if heap and (limit is None or heap[0][0] <= limit):
+            return heap[0]
+        return None
+
+    def pop(self):
+        """ Remove and return the earliest entry """
+        return heapq.heappop(self._heap)
+
+    def entries(self):
+        return iter(self._heap)
+
+    def clear(self):
+        self._heap = []
+
+    def compact(self, keep):
+        """ Drop the entries for which @keep(entry) is false """
+        self._heap = [entry for entry in self._heap if keep(entry)]
+        heapq.heapify(self._heap)
+
+
+class TimingWheelQueue(object):
+    """
+    Hierarchical timing wheel of (start, seq, ScheduledAction) entries.
+
+    Time is cut into ticks of @resolution seconds.  Level 0 has a slot per
+    tick; each higher level has a slot per full turn of the level below,
+    and its slots are cascaded down as the cursor reaches them.  Entries
+    past the top level wait in an overflow heap.  Inserting is O(1), and
+    only the entries for the tick(s) the cursor has reached are kept
+    sorted, in a small heap, so they still come out in (start, seq) order.
+    """
+    def __init__(self, resolution=0.001, bits=8, levels=4):
+        self._resolution = float(resolution)
+        self._bits = bits
+        self._mask = (1 << bits) - 1
+        self._levels = levels
+        self._wheels = [[[] for _ in xrange(1 << bits)] for _ in xrange(levels)]
+        self._counts = [0] * levels
+        # entries beyond the top level
+        self._overflow = []
+        # entries at or before the cursor, i.e. the earliest ones
+        self._ready = []
+        # tick of the cursor; set by the first push
+        self._cursor = None
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def _tickOf(self, time):
+        return int(math.floor(time / self._resolution))
+
+    def push(self, entry):
+        tick = self._tickOf(entry[0])
+        if self._cursor is None:
+            self._cursor = tick
+        self._len += 1
+        self._place(tick, entry)
+
+    def _place(self, tick, entry):
+        cursor = self._cursor
+        if tick <= cursor:
+            heapq.heappush(self._ready, entry)
+            return
+
+        bits = self._bits
+        if (tick >> bits) == (cursor >> bits):
+            # the common case: due within this turn of level 0
+            self._wheels[0][tick & self._mask].append(entry)
+            self._counts[0] += 1
+            return
+
+        for level in xrange(1, self._levels):
+            shift = bits * (level + 1)
+            if (tick >> shift) == (cursor >> shift):
+                self._wheels[level][(tick >> (bits * level)) & self._mask].append(entry)
+                self._counts[level] += 1
+                return
+
+        heapq.heappush(self._overflow, entry)
+
+    def _advance(self, target):
+        """
+        Move the cursor towards tick @target (or without limit, if None),
+        stopping once any entries are ready.
+        """
+        bits = self._bits
+        mask = self._mask
+        levels = self._levels
+        wheels = self._wheels
+        counts = self._counts
+        ready = self._ready
+        while not ready and (target is None or self._cursor < target):
+            if not self._len:
+                if target is not None:
+                    self._cursor = target
+                return
+
+            # skip straight to the next boundary of the lowest level
+            # holding anything, since every level below it is empty
+            level = 0
+            while level < levels and not counts[level]:
+                level += 1
+            step = 1 << (bits * level)
+            cursor = (self._cursor | (step - 1)) + 1
+            if target is not None and cursor > target:
+                self._cursor = target
+                return
+            self._cursor = cursor
+
+            # cascade the slots we just reached, from the top down
+            if not cursor & ((1 << (bits * levels)) - 1):
+                overflow = self._overflow
+                top = cursor >> (bits * levels)
+                while overflow and self._tickOf(overflow[0][0]) >> (bits * levels) == top:
+                    entry = heapq.heappop(overflow)
+                    self._place(self._tickOf(entry[0]), entry)
+
+            for level in xrange(levels - 1, -1, -1):
+                if level and cursor & ((1 << (bits * level)) - 1):
+                    continue
+                index = (cursor >> (bits * level)) & mask
+                slot = wheels[level][index]
+                if slot:
+                    wheels[level][index] = []
+                    counts[level] -= len(slot)
+                    if not level and not ready:
+                        # everything in the slot is now ready
+                        ready.extend(slot)
+                        heapq.heapify(ready)
+                    else:
+                        for entry in slot:
+                            self._place(self._tickOf(entry[0]), entry)
+
+    def peek(self, limit=None):
+        """
+        :param limit: if not None, only return an entry starting by this time
+        :return: the earliest entry, or None
+        """
+        ready = self._ready
+        if not ready and self._len:
+            self._advance(None if limit is None else self._tickOf(limit))
+        # anything still in the wheels starts after everything ready
+        if ready and (limit is None or ready[0][0] <= limit):
+            return ready[0]
+        return None
+
+    def pop(self):
+        """ Remove and return the earliest entry (as found by peek()) """
+        if not self._ready:
+            self._advance(None)
+        self._len -= 1
+        return heapq.heappop(self._ready)
+
+    def entries(self):
+        return itertools.chain(self._ready, self._overflow,
+                               itertools.chain.from_iterable(
+                                   slot for wheel in self._wheels for slot in wheel))
+
+    def clear(self):
+        for wheel in self._wheels:
+            for index in xrange(len(wheel)):
+                wheel[index] = []
+        self._counts = [0] * self._levels
+        self._overflow = []
+        self._ready = []
+        self._len = 0
+
+    def compact(self, keep):
+        """ Drop the entries for which @keep(entry) is false """
+        self._ready = [entry for entry in self._ready if keep(entry)]
+        heapq.heapify(self._ready)
+        self._overflow = [entry for entry in self._overflow if keep(entry)]
+        heapq.heapify(self._overflow)
+        for level, wheel in enumerate(self._wheels):
+            count = 0
+            for index, slot in enumerate(wheel):
+                if slot:
+                    slot = wheel[index] = [entry for entry in slot if keep(entry)]
+                    count += len(slot)
+            self._counts[level] = count
+        self._len = len(self._ready) + len(self._overflow) + sum(self._counts)
+
+
+class VirtualClock(object):
+    """
+    Simulated time for a Scheduler, in place of globalClock.  Nothing moves
+    until advance() or setTime() is called, so a run is deterministic and
+    can go as fast as the CPU allows.
+    """
+    def __init__(self, time=0.0):
+        self._time = time
+        self._dt = 0.0
+
+    def getFrameTime(self):
+        return self._time
+
+    def getRealTime(self):
+        return self._time
+
+    def getDt(self):
+        return self._dt
+
+    def setTime(self, time):
+        self._dt = time - self._time
+        self._time = time
+
+    def advance(self, dt):
+        self._dt = dt
+        self._time += dt
+        return self._time
+
+
+class Scheduler(object):
+    def __init__(self, queue=None, clock=None):
+        """
+        :param queue: the queue holding pending actions: HeapQueue (the
+        default) or TimingWheelQueue, which does better with very many
+        short-lived actions
+        :param clock: a VirtualClock, to run headless on simulated time:
+        the scheduler then plays its intervals itself rather than leaving
+        them to the interval manager (and globalClock)
+        """
         self._listener = None
+        self._clock = clock
+        # virtual clock only: seq -> (ScheduledAction, start time) for the
+        # intervals being played; keyed by seq so the order they're
+        # stepped in doesn't vary from run to run
+        self._playing = {}
 
-        # sorted list of (start, func)
-        self._queue = []
-        # sorted list of (start, Interval)
-        self._intervals = []
+        # (start, seq, ScheduledAction) entries; seq keeps FIFO order for
+        # equal start times and ensures the handles are never compared.
+        # An entry is stale if its handle was cancelled or rescheduled
+        # (the handle's seq no longer matches).
+        self._queue = queue if queue is not None else HeapQueue()
+        # actions scheduled from inside tick(), merged when the tick ends
+        self._pending = []
+        self._seq = itertools.count()
+        # number of handles still waiting to run
+        self._live = 0
+        # ScheduledActions for intervals scheduled or running
+        self._intervals = set()
+        # done event name -> set of handles whose interval throws it
+        self._intervalEvents = {}
+        # listens for the intervals' done events
+        self._events = DirectObject()
 
         self._ticking = False
         self._time = 0
+        # latest deadline of anything queued (actions or intervals);
+        # schedule() appends to the timeline after this.  Cancelling
+        # doesn't pull it back in, it only resets once the queue drains.
+        self._tail = 0
+
+        # frame budget counters, see tick()
+        self._deferredTicks = 0
+        self._deferredActions = 0
+        self._worstOverrun = 0.0
+        # True if the last tick left due actions behind
+        self._deferring = False
 
     def start(self):
         self._listener = lambda x: self._updateIntervals(x)
@@ -22,31 +481,72 @@ class Scheduler(object):
         Remove any pending actions or scheduled intervals
         :return
         """
-        for _, itvl in self._intervals:
+        # forget the intervals first, so their done events are ignored
+        intervals = self._intervals
+        self._intervals = set()
+        self._intervalEvents = {}
+        self._events.ignoreAll()
+
+        for handle in intervals:
+            if self._playing.pop(handle._seq, None) is not None:
+                handle._interval.finish()
+
+        for handle in intervals:
+            itvl = handle._interval
             if itvl.getState() == CInterval.SStarted:
                 itvl.finish()
             else:
                 itvl.pause()
-        self._intervals = []
-        self._queue = []
+
+        cancelled = list(intervals)
+        for entry in itertools.chain(self._queue.entries(), self._pending):
+            if self._isLive(entry) and not entry[2]._interval:
+                cancelled.append(entry[2])
+        self._queue.clear()
+        self._pending = []
+        self._live = 0
+        self._tail = 0
+
+        # only now let anyone waiting know, in case they schedule more
+        for handle in cancelled:
+            handle._settle(ScheduledAction.CANCELLED)
 
     def isQueueEmpty(self):
-        return not self._queue and not self._intervals
+        return not self._live and not self._intervals
 
     def stop(self):
         self.clearQueue()
 
     def _getEndTime(self):
-        # initial guess
-        deadline = self._time
-        if self._queue:
-            deadline = self._queue[-1][0] + 0.001
-        if self._intervals:
-            for start, itvl in self._intervals:
-                deadline = max(deadline, start + itvl.getDuration())
-        return deadline
+        """
+        The time at which everything queued so far is done.  This is kept
+        up to date as actions and intervals are added, so it costs nothing
+        to look up; once the queue drains it falls back to the current time.
+        """
+        return max(self._time, self._tail)
+
+    def _extendTail(self, deadline):
+        if deadline > self._tail:
+            self._tail = deadline
+
+    def _push(self, handle):
+        entry = (handle._time, handle._seq, handle)
+        if self._ticking:
+            # do this later, so we don't have 0-scheduled stuff
+            # constantly jumping to the front of the queue
+            self._pending.append(entry)
+        else:
+            self._queue.push(entry)
 
     def schedule(self, secs, doit, fromNow=False):
+        """
+        Run @doit after @secs seconds, measured from now or from the
+        end of everything already queued.
+        :return: ScheduledAction
+        """
+        return self._schedule(secs, doit, None, fromNow)
+
+    def _schedule(self, secs, doit, interval, fromNow):
         if fromNow:
             startTime = self._time
         else:
@@ -55,50 +555,334 @@ class Scheduler(object):
         startTime += secs
 
         #print services.mission.gameTime, "start Time:",startTime
-        self._queue.append((startTime, doit))
-
-        if not self._ticking:
-            # do this later, so we don't have 0-scheduled stuff
-            # constantly jumping to the front of the queue
-            heapq.heapify(self._queue)
+        handle = ScheduledAction(self, startTime, next(self._seq), doit, interval)
+        self._extendTail(startTime + 0.001)
+        self._live += 1
+        self._push(handle)
 
         #print services.mission.gameTime,"new end time after",secs,"for",doit,"=",startTime
-        return startTime
+        return handle
 
     def scheduleInterval(self, secs, interval, fromNow=False):
-        startTime = self.schedule(secs, lambda: interval.start(), fromNow)
+        """
+        Start @interval after @secs seconds, measured from now or from the
+        end of everything already queued.
+        :return: ScheduledAction, which is done when the interval finishes
+        """
+        handle = self._schedule(secs, None, interval, fromNow)
 
-        self._intervals.append((startTime, interval))
-        heapq.heapify(self._intervals)
+        self._intervals.add(handle)
+        self._extendTail(handle._time + interval.getDuration())
+        self._watchInterval(handle)
+        return handle
 
-    def tick(self, now, fullSpeed=False):
-        self._time = now
-        while self._queue:
-            start, doit = self._queue[0]
-            if now >= start or fullSpeed:
-                #print "starting",doit
-                self._queue[0:1] = []
-                self._ticking = True
-                try:
-                    doit()
-                except:
-                    import traceback
-                    traceback.print_exc()
-                finally:
-                    self._ticking = False
-                    if now < start and fullSpeed:
-                        self._time = start
-                        break
+    def startInterval(self, interval):
+        """
+        Start @interval now, on the scheduler's clock.  Unlike
+        scheduleInterval(), this does not queue it, so it doesn't hold
+        up the timeline or isQueueEmpty().
+        :return: ScheduledAction, which is done when the interval finishes
+        """
+        handle = ScheduledAction(self, self._time, next(self._seq), None, interval)
+        handle._state = ScheduledAction.RUNNING
+        self._watchInterval(handle)
+        self._playInterval(handle, self._time)
+        return handle
+
+    def _watchInterval(self, handle):
+        interval = handle._interval
+
+        # be told when the interval is done rather than polling it;
+        # keep any done event the caller has set, since others may
+        # be listening for it too
+        event = interval.getDoneEvent()
+        if not event:
+            event = 'scheduler-interval-done-%d' % handle._seq
+            interval.setDoneEvent(event)
+
+        handles = self._intervalEvents.get(event)
+        if handles is None:
+            handles = self._intervalEvents[event] = set()
+            self._events.accept(event, self._intervalDone, [event])
+        handles.add(handle)
+
+    def sleep(self, secs):
+        """
+        For coroutines: yield this to wait @secs seconds from now.
+        :return: ScheduledAction
+        """
+        return self._schedule(secs, None, None, True)
+
+    def waitInterval(self, interval):
+        """
+        For coroutines: yield this to start @interval now and wait for it to finish.
+        :return: ScheduledAction
+        """
+        return self.scheduleInterval(0, interval, fromNow=True)
+
+    def spawn(self, gen):
+        """
+        Run the generator @gen as a Coroutine, up to the first thing it waits for.
+        :return: Coroutine
+        """
+        coroutine = Coroutine(self, gen)
+        coroutine._step()
+        return coroutine
+
+    def _cancel(self, handle):
+        if handle._state == ScheduledAction.PENDING:
+            # leave the queue entry as a tombstone
+            self._live -= 1
+        elif handle._state == ScheduledAction.RUNNING:
+            self._playing.pop(handle._seq, None)
+            handle._interval.pause()
+        else:
+            return False
+
+        handle._state = ScheduledAction.CANCELLED
+        if handle._interval:
+            self._forgetInterval(handle)
+        self._checkIdle()
+        handle._settle(ScheduledAction.CANCELLED)
+        return True
+
+    def _reschedule(self, handle, delay):
+        if handle._state == ScheduledAction.CANCELLED:
+            if handle._interval:
+                # it has to be scheduled again to be tracked again
+                return False
+            self._live += 1
+        elif handle._state != ScheduledAction.PENDING:
+            return False
+
+        handle._state = ScheduledAction.PENDING
+        handle._time = self._time + delay
+        # a new seq leaves the old queue entry stale
+        handle._seq = next(self._seq)
+        self._extendTail(handle._time + 0.001)
+        if handle._interval:
+            self._extendTail(handle._time + handle._interval.getDuration())
+        self._push(handle)
+        return True
+
+    def _intervalDone(self, event):
+        handles = self._intervalEvents.get(event)
+        if not handles:
+            return
+        for handle in list(handles):
+            # ignore intervals that haven't been started by us yet
+            if handle._state == ScheduledAction.RUNNING and \
+                    handle._interval.getState() == CInterval.SFinal:
+                self._forgetInterval(handle)
+                self._checkIdle()
+                handle._settle(ScheduledAction.DONE)
+
+    def _forgetInterval(self, handle):
+        self._intervals.discard(handle)
+        event = handle._interval.getDoneEvent()
+        handles = self._intervalEvents.get(event)
+        if handles is not None:
+            handles.discard(handle)
+            if not handles:
+                del self._intervalEvents[event]
+                self._events.ignore(event)
+
+    def _checkIdle(self):
+        if self.isQueueEmpty():
+            # nothing left to wait for, e.g. intervals were finished early
+            self._tail = 0
+
+    @staticmethod
+    def _isLive(entry):
+        handle = entry[2]
+        return entry[1] == handle._seq and handle._state == ScheduledAction.PENDING
+
+    def _playInterval(self, handle, start):
+        if self._clock is None:
+            handle._interval.start()
+        else:
+            self._playing[handle._seq] = (handle, start)
+            handle._interval.setT(max(0.0, self._time - start))
+
+    def _stepPlaying(self, now):
+        """ Virtual clock only: move the playing intervals to @now """
+        for handle, start in self._playing.values():
+            if handle._seq not in self._playing:
+                # cancelled or finished by an earlier one's done callback
+                continue
+            itvl = handle._interval
+            if now >= start + itvl.getDuration():
+                self._finishPlaying(handle)
+            else:
+                itvl.setT(now - start)
+
+    def _finishPlaying(self, handle):
+        self._playing.pop(handle._seq, None)
+        itvl = handle._interval
+
+        # nothing would deliver the done event from the interval
+        # manager's queue, so send it ourselves
+        event = itvl.getDoneEvent()
+        itvl.setDoneEvent('')
+        itvl.finish()
+        itvl.setDoneEvent(event)
+
+        self._forgetInterval(handle)
+        self._checkIdle()
+        handle._settle(ScheduledAction.DONE)
+        if event:
+            messenger.send(event)
+
+    def _run(self, handle):
+        self._live -= 1
+        if handle._interval:
+            handle._state = ScheduledAction.RUNNING
+            # start from when it was due, to stay deterministic
+            self._playInterval(handle, handle._time)
+        else:
+            handle._state = ScheduledAction.DONE
+            if handle._func:
+                handle._func()
+            handle._settle(ScheduledAction.DONE)
+
+    def getClock(self):
+        """ :return: the VirtualClock, or None if running on real time """
+        return self._clock
+
+    def advance(self, dt):
+        """
+        Virtual clock only: move time on by @dt and tick.
+        """
+        self.tick(self._clock.advance(dt))
+
+    def runUntil(self, until, frameTime=None):
+        """
+        Virtual clock only: fast-forward to time @until.  By default this
+        jumps straight from one action or interval end to the next, since
+        nothing is drawn in between; give @frameTime to tick at a fixed
+        rate instead.
+        :return: the number of ticks run
+        """
+        clock = self._clock
+        ticks = 0
+        while clock.getFrameTime() < until:
+            if frameTime is not None:
+                now = min(until, clock.getFrameTime() + frameTime)
             else:
+                now = until
+                entry = self._queue.peek()
+                if entry is not None:
+                    now = min(now, entry[0])
+                for handle, start in self._playing.itervalues():
+                    now = min(now, start + handle._interval.getDuration())
+                # don't stall on something due right now
+                now = max(now, clock.getFrameTime())
+
+            clock.setTime(now)
+            self.tick(now)
+            ticks += 1
+
+            if frameTime is None and now == until:
+                break
+        return ticks
+
+    def getDeferredTicks(self):
+        """ :return: how many budgeted ticks ran out of time with actions still due """
+        return self._deferredTicks
+
+    def getDeferredActions(self):
+        """ :return: how many actions ran at a later tick than the one they were due in """
+        return self._deferredActions
+
+    def getWorstOverrun(self):
+        """ :return: the most milliseconds a budgeted tick went over its budget """
+        return self._worstOverrun * 1000.0
+
+    def resetBudgetStats(self):
+        self._deferredTicks = 0
+        self._deferredActions = 0
+        self._worstOverrun = 0.0
+
+    def tick(self, now, fullSpeed=False, budgetMs=None):
+        """
+        Run the actions due by @now.
+        :param fullSpeed: if True, run the next action even if it is not
+        due yet, jumping the scheduler's time forward to it
+        :param budgetMs: if not None, stop running actions once this many
+        milliseconds of wall time have passed (at least one action always
+        runs), leaving the rest for the next tick
+        """
+        lastTime = self._time
+        deferring = self._deferring
+        self._deferring = False
+        self._time = now
+        queue = self._queue
+        limit = None if fullSpeed else now
+        if budgetMs is not None:
+            budget = budgetMs / 1000.0
+            started = default_timer()
+        while True:
+            entry = queue.peek(limit)
+            if entry is None:
                 break
+            queue.pop()
+            start, seq, handle = entry
+            if not self._isLive(entry):
+                # cancelled or rescheduled
+                continue
+
+            if deferring and start <= lastTime:
+                # was due last tick, but the budget ran out
+                self._deferredActions += 1
+
+            #print "starting",doit
+            self._ticking = True
+            try:
+                self._run(handle)
+            except:
+                import traceback
+                traceback.print_exc()
+            finally:
+                self._ticking = False
+                if now < start and fullSpeed:
+                    self._time = start
+                    break
+
+            if budgetMs is not None:
+                elapsed = default_timer() - started
+                if elapsed >= budget:
+                    self._worstOverrun = max(self._worstOverrun, elapsed - budget)
+                    if queue.peek(limit) is not None:
+                        self._deferredTicks += 1
+                        self._deferring = True
+                    break
 
         # in case anything was scheduled from doit()
-        heapq.heapify(self._queue)
+        if self._pending:
+            for entry in self._pending:
+                queue.push(entry)
+            self._pending = []
 
-        for secs, itvl in list(self._intervals):
-            if itvl.getState() == CInterval.SStarted and fullSpeed:
-                itvl.finish()
-            if itvl.getState() == CInterval.SFinal:
-                self._intervals.remove((secs, itvl))
+        if len(queue) > 64 and self._live * 2 < len(queue):
+            # mostly tombstones; sweep them out
+            queue.compact(self._isLive)
+
+        if self._playing:
+            if fullSpeed:
+                for handle, _ in self._playing.values():
+                    if handle._seq in self._playing:
+                        self._finishPlaying(handle)
+            else:
+                self._stepPlaying(self._time)
 
+        if fullSpeed:
+            # skipping ahead: don't wait for running intervals to play out
+            for handle in list(self._intervals):
+                itvl = handle._interval
+                if itvl.getState() == CInterval.SStarted:
+                    itvl.finish()
+                if handle._state == ScheduledAction.RUNNING and itvl.getState() == CInterval.SFinal:
+                    self._forgetInterval(handle)
+                    handle._settle(ScheduledAction.DONE)
 
+        self._checkIdle()
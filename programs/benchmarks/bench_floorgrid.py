@@ -0,0 +1,148 @@
+'''
+Micro-benchmark for lib/floorgrid.py.
+
+Builds a winding floor path like the dynamic-geometry programs draw (a
+quad 4 units wide per 1-unit segment) at several lengths, and times floor
+height queries at points along it, both with a FloorGrid and with the
+CollisionTraverser + CollisionHandlerFloor setup it replaced (one
+CollisionFloorMesh per few quads).
+
+Run from this directory:  python bench_floorgrid.py
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import math
+import random
+import time
+
+from floorgrid import FloorGrid
+
+LENGTHS = [100, 10000, 100000]
+QUERIES = 20000
+
+# the traverser gets slow enough on long paths to only sample it
+TRAVERSER_QUERIES = 200
+
+# quads per CollisionFloorMesh, as when the programs complete a strip
+QUADS_PER_MESH = 2
+
+
+def makePath(length, seed=1234):
+    """
+    Make a wandering path of @length 1-unit segments.
+    :return: the list of quads, each as (left0, right0, left1, right1)
+    """
+    rand = random.Random(seed)
+    x = y = z = 0.0
+    heading = 0.0
+    width = 2.0
+    quads = []
+    prevLeft = prevRight = None
+    for i in xrange(length + 1):
+        heading += rand.uniform(-0.1, 0.1)
+        z += rand.uniform(-0.05, 0.05)
+        dx, dy = math.cos(heading), math.sin(heading)
+        left = (x - dy * width, y + dx * width, z)
+        right = (x + dy * width, y - dx * width, z)
+        if prevLeft:
+            quads.append((prevLeft, prevRight, left, right))
+        prevLeft, prevRight = left, right
+        x += dx
+        y += dy
+    return quads
+
+
+def queryPoints(quads, count, seed=4321):
+    """ Pick @count points on the path, as (x, y, z) a little above the floor. """
+    rand = random.Random(seed)
+    points = []
+    for i in xrange(count):
+        l0, r0, l1, r1 = rand.choice(quads)
+        s, t = rand.random(), rand.random()
+        x = (l0[0] * (1 - s) + r0[0] * s) * (1 - t) + (l1[0] * (1 - s) + r1[0] * s) * t
+        y = (l0[1] * (1 - s) + r0[1] * s) * (1 - t) + (l1[1] * (1 - s) + r1[1] * s) * t
+        points.append((x, y, l0[2] + 0.5))
+    return points
+
+
+def benchGrid(quads, points):
+    grid = FloorGrid()
+    t0 = time.time()
+    for l0, r0, l1, r1 in quads:
+        grid.addQuad(l0, r0, l1, r1)
+    t1 = time.time()
+
+    found = 0
+    for x, y, z in points:
+        if grid.getFloorHeight(x, y, z + 1, z - 1) is not None:
+            found += 1
+    t2 = time.time()
+    return t1 - t0, (t2 - t1) / len(points), found
+
+
+def benchTraverser(quads, points):
+    from panda3d.core import NodePath, CollisionNode, CollisionSphere, \
+        CollisionTraverser, CollisionHandlerFloor, CollisionFloorMesh, Point3
+
+    render = NodePath('render')
+    t0 = time.time()
+    floorNode = CollisionNode('geom')
+    for start in xrange(0, len(quads), QUADS_PER_MESH):
+        floorMesh = CollisionFloorMesh()
+        p = 0
+        for l0, r0, l1, r1 in quads[start:start + QUADS_PER_MESH]:
+            for v in (l0, r0, l1, r1):
+                floorMesh.addVertex(Point3(*v))
+            floorMesh.addTriangle(p, p+1, p+2)
+            floorMesh.addTriangle(p+1, p+3, p+2)
+            p += 4
+        floorNode.addSolid(floorMesh)
+    render.attachNewNode(floorNode)
+
+    player = render.attachNewNode('player')
+    playerNode = CollisionNode('player')
+    playerNode.addSolid(CollisionSphere(0, 0, 0, 1))
+    playerC = player.attachNewNode(playerNode)
+
+    trav = CollisionTraverser()
+    floor = CollisionHandlerFloor()
+    trav.addCollider(playerC, floor)
+    floor.addCollider(playerC, player)
+    t1 = time.time()
+
+    found = 0
+    for x, y, z in points:
+        player.setPos(x, y, z)
+        trav.traverse(render)
+        if abs(player.getZ() - z) > 1e-6:
+            found += 1
+    t2 = time.time()
+
+    render.removeNode()
+    return t1 - t0, (t2 - t1) / len(points), found
+
+
+def benchFloors(lengths=LENGTHS):
+    try:
+        import panda3d.core # @UnusedImport
+        haveTraverser = True
+    except ImportError:
+        haveTraverser = False
+
+    for length in lengths:
+        quads = makePath(length)
+        points = queryPoints(quads, QUERIES)
+
+        build, query, found = benchGrid(quads, points)
+        print "%6d segments: grid built in %.3f s, %.2f us/query, %d/%d found" % (
+            length, build, query * 1e6, found, len(points))
+
+        if haveTraverser:
+            build, query, found = benchTraverser(quads, points[:TRAVERSER_QUERIES])
+            print "%6d segments: traverser built in %.3f s, %.2f us/query, %d/%d found" % (
+                length, build, query * 1e6, found, TRAVERSER_QUERIES)
+
+
+if __name__ == '__main__':
+    benchFloors()
@@ -0,0 +1,113 @@
+'''
+Micro-benchmark for building floor collision data from a drawn path.
+
+Makes a path Geom the way draw_path_tris.py does (a V3c4 vertex table with
+a left and right vertex per point, in short triangle strips), then times:
+
+ - the old per-vertex loop building a CollisionFloorMesh,
+ - the same per-vertex loop feeding a FloorGrid,
+ - the bulk path in geomarrays feeding a FloorGrid.
+
+Run from this directory:  python bench_floormesh.py
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import time
+
+from panda3d.core import GeomVertexFormat, GeomVertexData, GeomVertexWriter, \
+    GeomVertexReader, GeomTristrips, Geom, CollisionFloorMesh, Point3
+
+from bench_floorgrid import makePath
+from floorgrid import FloorGrid
+import geomarrays
+
+LENGTHS = [10000, 100000]
+
+# quads per strip, as the programs close a strip every couple of quads
+QUADS_PER_STRIP = 2
+
+
+def makePathGeom(length):
+    """ :return: (vertex data, triangle strips) for a @length-segment path """
+    quads = makePath(length)
+    vertexData = GeomVertexData("path", GeomVertexFormat.getV3c4(), Geom.UHStatic)
+    vertexData.uncleanSetNumRows(2 * (len(quads) + 1))
+    vertexWriter = GeomVertexWriter(vertexData, 'vertex')
+    colorWriter = GeomVertexWriter(vertexData, 'color')
+
+    l0, r0, l1, r1 = quads[0]
+    for v in (l0, r0):
+        vertexWriter.setData3f(*v)
+        colorWriter.setData4i(224, 224, 64, 255)
+    for l0, r0, l1, r1 in quads:
+        for v in (l1, r1):
+            vertexWriter.setData3f(*v)
+            colorWriter.setData4i(224, 224, 64, 255)
+
+    triStrips = GeomTristrips(Geom.UHStatic)
+    for quad in xrange(0, len(quads), QUADS_PER_STRIP):
+        count = min(QUADS_PER_STRIP, len(quads) - quad)
+        triStrips.addConsecutiveVertices(quad * 2, 2 + count * 2)
+        triStrips.closePrimitive()
+    return vertexData, triStrips
+
+
+def buildMeshPerVertex(vertexData, triStrips):
+    """ The old completePath. """
+    floorMesh = CollisionFloorMesh()
+    tris = triStrips.decompose()
+    p = 0
+    vertexReader = GeomVertexReader(vertexData, 'vertex')
+    for i in range(tris.getNumPrimitives()):
+        v0 = tris.getPrimitiveStart(i)
+        ve = tris.getPrimitiveEnd(i)
+        if v0 < ve:
+            vertexReader.setRow(tris.getVertex(v0))
+            floorMesh.addVertex(Point3(vertexReader.getData3f()))
+            vertexReader.setRow(tris.getVertex(v0+1))
+            floorMesh.addVertex(Point3(vertexReader.getData3f()))
+            vertexReader.setRow(tris.getVertex(v0+2))
+            floorMesh.addVertex(Point3(vertexReader.getData3f()))
+            floorMesh.addTriangle(p, p+1, p+2)
+            p += 3
+    return floorMesh.getNumTriangles()
+
+
+def buildGridPerVertex(vertexData, triStrips):
+    grid = FloorGrid()
+    tris = triStrips.decompose()
+    vertexReader = GeomVertexReader(vertexData, 'vertex')
+    for i in range(tris.getNumPrimitives()):
+        v0 = tris.getPrimitiveStart(i)
+        vertexReader.setRow(tris.getVertex(v0))
+        a = vertexReader.getData3f()
+        vertexReader.setRow(tris.getVertex(v0+1))
+        b = vertexReader.getData3f()
+        vertexReader.setRow(tris.getVertex(v0+2))
+        c = vertexReader.getData3f()
+        grid.addTriangle(a, b, c)
+    return grid.getNumTriangles()
+
+
+def buildGridBulk(vertexData, triStrips):
+    grid = FloorGrid()
+    vertices = geomarrays.getVertexArray(vertexData)
+    triangles = geomarrays.getTriangleIndices(triStrips)
+    geomarrays.addFloorTriangles(grid, vertices, triangles)
+    return grid.getNumTriangles()
+
+
+def benchBuilds(lengths=LENGTHS):
+    for length in lengths:
+        vertexData, triStrips = makePathGeom(length)
+        for func in (buildMeshPerVertex, buildGridPerVertex, buildGridBulk):
+            t0 = time.time()
+            count = func(vertexData, triStrips)
+            elapsed = time.time() - t0
+            print "%6d segments: %-20s %7.3f s for %d triangles" % (
+                length, func.__name__, elapsed, count)
+
+
+if __name__ == '__main__':
+    benchBuilds()
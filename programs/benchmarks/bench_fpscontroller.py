@@ -0,0 +1,241 @@
+'''
+Micro-benchmark for the FpsController step.
+
+Compares fixed steps per second of the current controller against a copy
+of the older step, which built Vec3s for every term and kept the velocity
+in a python tag on the player.  Runs without a window.
+
+Run from this directory:  python bench_fpscontroller.py
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import time
+from math import pi, sin, cos
+
+from panda3d.core import loadPrcFileData, NodePath, Vec3, Vec3F, KeyboardButton
+loadPrcFileData("", "window-type none\naudio-library-name null")
+
+from direct.showbase.ShowBase import ShowBase
+
+import fpscontroller
+from fpscontroller import FpsController, DEG_TO_RAD, ACCELERATION, STEPS, KEY_BITS
+
+STEPS_TO_RUN = 200000
+
+# keys held during the run, as (from step, to step, key)
+SCRIPT = [
+    (0, 1.0, "front"),
+    (0.25, 0.5, "strafeLeft"),
+    (0.1, 0.3, "turnLeft"),
+    (0.6, 0.8, "turnRight"),
+    (0.7, 0.75, "lookUp"),
+]
+
+
+class LegacyController(FpsController):
+    """ The step as it was before the state moved into MoveState. """
+
+    def reset(self):
+        FpsController.reset(self)
+        self.truePos = self.player.getPos()
+        self.setVelocity(self.player, Vec3(0, 0, 0))
+        self.keys = dict((key, 0) for key in KEY_BITS)
+        self.released = []
+
+    def setKey(self, key, val, time=None):
+        FpsController.setKey(self, key, val, time)
+        # the input ring still reports a key for the step it is released in
+        if val:
+            self.keys[key] = val
+        else:
+            self.released.append(key)
+
+    def movePlayer(self, player, dt):
+        mw = self.mouseWatcher
+
+        heading = self.headingTurner.getHeading()
+        lookAngle = self.lookTurner.getHeading()
+
+        curVel = self.getVelocity(player)
+
+        y = 0
+        if self.keys["front"]:
+            y = 1
+        elif self.keys["back"]:
+            y = -1
+        x = 0
+        if self.keys["strafeLeft"]:
+            x = -1
+        elif self.keys["strafeRight"]:
+            x = 1
+
+        z = 0
+        if self.keys["up"]:
+            z = 1
+        elif self.keys["down"]:
+            z = -1
+
+        if mw and mw.isButtonDown(KeyboardButton.shift()):
+            x *= 2
+            y *= 2
+
+        if self.keys["jump"]:
+            if not self.jumping:
+                self.jumpTime = 0
+                self.jumping = True
+                self.jumpZ = 0
+
+        now = self.stepTime
+        if x or y:
+            if not self.walkCycle:
+                self.walkCycle = now
+
+        heading_rad = DEG_TO_RAD * (360 - heading)
+
+        newFwdBack = Vec3(sin(heading_rad)*y, cos(heading_rad) * y, 0)
+
+        if self.flyMode:
+            newFwdBack.z = sin(DEG_TO_RAD * lookAngle) * y
+
+        newStrafe = Vec3(-sin(heading_rad-pi/2) * x, -cos(heading_rad-pi/2)*x, 0)
+
+        newUpDown = Vec3(0, 0, z)
+
+        newVel = (newFwdBack + newStrafe + newUpDown) * ACCELERATION
+        playerVel = (curVel * (STEPS-1) + newVel) / STEPS
+
+        self.setVelocity(player, playerVel)
+
+        if self.keys["turnRight"]:
+            self.headingTurner.updateTurn(-1, dt)
+        elif self.keys["turnLeft"]:
+            self.headingTurner.updateTurn(1, dt)
+        elif self.keys["reverse"]:
+            self.headingTurner.setTarget(heading + 180)
+        elif not self.mouseLook:
+            self.headingTurner.unTurn(dt)
+
+        heading = self.headingTurner.update(dt)
+
+        if self.keys["lookDown"]:
+            self.lookTurner.updateTurn(-1, dt)
+            self.lookSticky = True
+        elif self.keys["lookUp"]:
+            self.lookTurner.updateTurn(1, dt)
+            self.lookSticky = True
+        elif self.keys["lookReset"]:
+            self.lookTurner.setTarget(0)
+            self.lookSticky = False
+        elif not self.mouseLook:
+            self.lookTurner.unTurn(dt)
+
+            if self.lookTurner.getTurnRate() == 0:
+                if (x or y or self.jumpZ) and not self.mouseLook:
+                    self.lookSticky = False
+
+            if not self.lookSticky:
+                self.lookTurner.setTarget(0)
+
+        lookAngle = self.lookTurner.update(dt)
+
+        pos = self.updatePos(player, now, dt)
+
+        self.pose = (pos, heading, lookAngle)
+
+        for key in self.released:
+            self.keys[key] = 0
+        del self.released[:]
+
+    def updatePos(self, obj, now, dt):
+        vel = self.getVelocity(obj)
+
+        newPos = self.truePos + (vel*dt)
+
+        self.truePos = newPos
+
+        pos = Vec3F(newPos)
+        if not self.jumping:
+            if self.keys["front"] or self.keys["back"] or self.keys["strafeLeft"] or self.keys["strafeRight"]:
+                self.bob.z = sin((now - self.walkCycle) * 1.5 * 2 * pi) * 0.25
+            else:
+                self.bob.z = self.bob.z * (STEPS-1) / STEPS
+        else:
+            self.jumpTime += dt
+            if self.jumpTime >= fpscontroller.JUMP_TIME*2:
+                self.jumping = False
+                self.jumpZ = 0
+            else:
+                self.jumpZ = fpscontroller.JUMP_HEIGHT - fpscontroller.JUMP_SCALE*((self.jumpTime - fpscontroller.JUMP_TIME) ** 2)
+            pos.z += self.jumpZ
+
+        return Vec3(pos)
+
+    def setVelocity(self, obj, val):
+        obj.setPythonTag("velocity", val)
+
+    def getVelocity(self, obj):
+        return obj.getPythonTag("velocity")
+
+    def getPose(self):
+        pos, h, p = self.pose
+        return (pos.x, pos.y, pos.z, h, p)
+
+
+def getPose(ctl):
+    state = ctl.state
+    return (state.showX, state.showY, state.showZ, state.showH, state.showP)
+
+
+def runScript(base, cls, count, getPoseFunc):
+    """
+    Step a fresh controller of @cls @count times through SCRIPT.
+    :return: (seconds taken, the final pose)
+    """
+    player = NodePath('player')
+    ctl = cls(base, player)
+    base.taskMgr.remove(ctl.fpsCameraTask)
+
+    # key changes, as (step, key, value), in step order
+    changes = []
+    for start, end, key in SCRIPT:
+        changes.append((int(start * count), key, 1))
+        changes.append((int(end * count), key, 0))
+    changes.sort()
+
+    dt = ctl.tickQuantum
+    index = 0
+    t0 = time.time()
+    for i in xrange(count):
+        while index < len(changes) and changes[index][0] == i:
+            ctl.setKey(changes[index][1], changes[index][2])
+            index += 1
+        ctl.stepKeys = ctl.input.advance(ctl.inputClock())
+        ctl.stepTime += dt
+        ctl.movePlayer(player, dt)
+    elapsed = time.time() - t0
+
+    pose = getPoseFunc(ctl)
+    player.removeNode()
+    return elapsed, pose
+
+
+def benchStep(base, count=STEPS_TO_RUN):
+    """
+    Time @count fixed steps through the same inputs for both versions of
+    the step, and check that they end up in the same place.
+    """
+    oldTime, oldPose = runScript(base, LegacyController, count, LegacyController.getPose)
+    newTime, newPose = runScript(base, FpsController, count, getPose)
+
+    print "legacy step:  %8.0f steps/s" % (count / oldTime)
+    print "current step: %8.0f steps/s  (%.2fx)" % (count / newTime, oldTime / newTime)
+
+    # the legacy step accumulates in single precision
+    err = max(abs(a - b) for a, b in zip(oldPose, newPose))
+    print "final poses differ by at most %.4f" % err
+
+
+if __name__ == '__main__':
+    base = ShowBase(windowType='none')
+    benchStep(base)
@@ -0,0 +1,90 @@
+'''
+Micro-benchmark for lib/fpscrowd.py.
+
+Moves N walkers with one FpsCrowd and with N separate FpsControllers,
+all walking and turning, and reports frames per second for each, where
+a frame is one fixed step plus placing every NodePath.  Runs without a
+window.
+
+Run from this directory:  python bench_fpscrowd.py
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import time
+
+from panda3d.core import loadPrcFileData, NodePath
+loadPrcFileData("", "window-type none\naudio-library-name null")
+
+from direct.showbase.ShowBase import ShowBase
+
+from fpscontroller import FpsController
+from fpscrowd import FpsCrowd
+
+COUNTS = [10, 100, 500]
+FRAMES = 600
+
+
+def makePlayers(count):
+    root = NodePath('walkers')
+    players = []
+    for i in xrange(count):
+        player = root.attachNewNode('walker%d' % i)
+        player.setPos(i * 3, 0, 0)
+        players.append(player)
+    return root, players
+
+
+def benchControllers(base, count, frames=FRAMES):
+    """ Step @count FpsControllers @frames times; return frames per second. """
+    root, players = makePlayers(count)
+    controllers = []
+    for player in players:
+        ctl = FpsController(base, player)
+        base.taskMgr.remove(ctl.fpsCameraTask)
+        ctl.setKey("front", 1)
+        ctl.setKey("turnLeft", 1)
+        controllers.append(ctl)
+
+    dt = controllers[0].tickQuantum
+    t0 = time.time()
+    for i in xrange(frames):
+        for ctl in controllers:
+            ctl.tickTime += dt
+            ctl.runSteps()
+    elapsed = time.time() - t0
+
+    root.removeNode()
+    return frames / elapsed
+
+
+def benchCrowd(base, count, frames=FRAMES):
+    """ Step an FpsCrowd of @count walkers @frames times; return frames per second. """
+    root, players = makePlayers(count)
+    crowd = FpsCrowd(base, players)
+    base.taskMgr.remove(crowd.crowdTask)
+    crowd.move[:, 1] = 1
+    crowd.turnRate[:] = 90
+
+    dt = crowd.tickQuantum
+    t0 = time.time()
+    for i in xrange(frames):
+        crowd.tickTime += dt
+        crowd.runSteps()
+    elapsed = time.time() - t0
+
+    root.removeNode()
+    return frames / elapsed
+
+
+def benchCrowds(base, counts=COUNTS):
+    print "%8s %16s %16s %8s" % ("walkers", "controllers fps", "crowd fps", "speedup")
+    for count in counts:
+        separate = benchControllers(base, count)
+        batched = benchCrowd(base, count)
+        print "%8d %16.1f %16.1f %7.2fx" % (count, separate, batched, batched / separate)
+
+
+if __name__ == '__main__':
+    base = ShowBase(windowType='none')
+    benchCrowds(base)
@@ -0,0 +1,104 @@
+'''
+Replay a recorded FpsController session without a window, checking the
+poses and reporting steps per second.
+
+Run from this directory:
+
+    python bench_fpsreplay.py session.fpslog [repeats]
+
+With no log given, first records two scripted sessions (walking,
+strafing, turning, jumping and quick taps, with raw mouse turns in one and
+non-raw mouse look steered by the pointer in the other) to temporary files.
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import os
+import random
+import tempfile
+
+from panda3d.core import loadPrcFileData, NodePath
+loadPrcFileData("", "window-type none\naudio-library-name null")
+
+from direct.showbase.ShowBase import ShowBase
+
+from fpscontroller import FpsController, KEY_BITS
+from fpsrecord import SessionRecorder, SessionReplayer
+
+SCRIPT_SECONDS = 600
+FRAME_RATE = 60
+
+
+def recordScripted(base, filename, seconds=SCRIPT_SECONDS, seed=1234, pointerLook=False):
+    """
+    Drive a controller with random key changes and mouse turns at uneven
+    frame times for @seconds of virtual time, recording it to @filename.
+    @param pointerLook: if True, use non-raw mouse look, with a wandering
+    pointer steering the turn rates, instead of raw mouse turns
+    :return: the number of steps recorded
+    """
+    rand = random.Random(seed)
+    ctl = FpsController(base, NodePath('player'))
+    base.taskMgr.remove(ctl.fpsCameraTask)
+
+    clock = [0.0]
+    ctl.inputClock = lambda: clock[0]
+
+    pointer = [0.0, 0.0]
+    if pointerLook:
+        # no window to set this up, or to read the pointer from
+        ctl.mouseLook, ctl.rawMouse, ctl.mouseGrabbed = True, False, False
+        ctl.samplePointer = lambda: tuple(pointer)
+
+    recorder = SessionRecorder(ctl, filename)
+    recorder.start()
+
+    keys = sorted(key for key in KEY_BITS if key not in ("reverse", "run"))
+    while clock[0] < seconds:
+        dt = rand.uniform(0.5, 1.5) / FRAME_RATE
+        # a few changes somewhere in this frame, some of them quick taps
+        for i in xrange(rand.randint(0, 2)):
+            when = clock[0] + rand.random() * dt
+            ctl.setKey(rand.choice(keys), rand.randint(0, 1), when)
+        if pointerLook:
+            pointer[0] = min(1.0, max(-1.0, pointer[0] + rand.uniform(-0.05, 0.05)))
+            pointer[1] = min(1.0, max(-1.0, pointer[1] + rand.uniform(-0.05, 0.05)))
+        elif rand.random() < 0.3:
+            ctl.turnBy(rand.uniform(-5, 5), rand.uniform(-2, 2))
+        clock[0] += dt
+        ctl.tickTime += dt
+        ctl.runSteps()
+
+    recorder.stop()
+    ctl.player.removeNode()
+    return recorder.getSteps()
+
+
+def benchReplay(base, filename, repeats=3):
+    replayer = SessionReplayer(base, filename)
+    print "log: %s, %d bytes" % (filename, len(replayer.data))
+    for i in xrange(repeats):
+        steps, elapsed, mismatches, first = replayer.run()
+        print "replayed %d steps in %.3f s (%.0f steps/s), %d mismatched%s" % (
+            steps, elapsed, steps / elapsed, mismatches,
+            first is not None and " (first at step %d)" % first or "")
+    return mismatches
+
+
+if __name__ == '__main__':
+    base = ShowBase(windowType='none')
+    repeats = len(sys.argv) > 2 and int(sys.argv[2]) or 3
+    if len(sys.argv) > 1:
+        sys.exit(benchReplay(base, sys.argv[1], repeats) and 1 or 0)
+
+    mismatches = 0
+    for pointerLook in (False, True):
+        fd, filename = tempfile.mkstemp(suffix='.fpslog')
+        os.close(fd)
+        try:
+            print "recorded %d steps%s" % (recordScripted(base, filename, pointerLook=pointerLook),
+                                          pointerLook and " with non-raw mouse look" or "")
+            mismatches += benchReplay(base, filename, repeats)
+        finally:
+            os.remove(filename)
+    sys.exit(mismatches and 1 or 0)
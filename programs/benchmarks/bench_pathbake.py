@@ -0,0 +1,65 @@
+'''
+Micro-benchmark for lib/pathbake.py.
+
+Bakes a procedural tunnel of 50k segments (as draw_path_tunnel.py would
+save it) and times loading it back: mapping the file, making the Geoms,
+and filling a FloorGrid.
+
+Run from this directory:  python bench_pathbake.py [segments]
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import os
+import tempfile
+import time
+
+import numpy
+
+from bench_pathbuilder import makeCenterline
+from floorgrid import FloorGrid
+import pathbake
+
+SEGMENTS = 50000
+WIDTH = 3
+
+
+def makeTunnel(segments):
+    """ :return: a CENTERLINE_DTYPE array for a tunnel of @segments segments """
+    centers, intos = makeCenterline(segments)
+    centerline = numpy.zeros(len(centers), dtype=pathbake.CENTERLINE_DTYPE)
+    centerline['center'] = centers
+    centerline['into'] = intos
+    centerline['width'] = WIDTH
+    centerline['leftColor'] = (224, 224, 64, 255)
+    centerline['rightColor'] = (64, 224, 224, 255)
+    centerline['flags'][0] = pathbake.FLAG_START
+    return centerline
+
+
+def benchBake(segments=SEGMENTS):
+    fd, filename = tempfile.mkstemp(suffix='.path')
+    os.close(fd)
+    try:
+        t0 = time.time()
+        pathbake.bakePath(filename, makeTunnel(segments), pathbake.KIND_TUNNEL)
+        t1 = time.time()
+        print "baked %d segments in %.3f s, %d bytes" % (segments, t1 - t0, os.path.getsize(filename))
+
+        t0 = time.time()
+        path = pathbake.BakedPath(filename)
+        t1 = time.time()
+        geoms = path.makeGeoms()
+        t2 = time.time()
+        grid = FloorGrid()
+        path.addFloor(grid)
+        t3 = time.time()
+        print "mapped in %.3f s, %d Geoms in %.3f s, %d floor triangles in %.3f s; %.3f s in all" % (
+            t1 - t0, len(geoms), t2 - t1, grid.getNumTriangles(), t3 - t2, t3 - t0)
+        path.close()
+    finally:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    benchBake(len(sys.argv) > 1 and int(sys.argv[1]) or SEGMENTS)
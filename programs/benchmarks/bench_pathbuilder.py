@@ -0,0 +1,101 @@
+'''
+Micro-benchmark for lib/pathbuilder.py.
+
+Makes the vertex table for a procedural flat path of many segments, the
+way drawQuadRow does (a left and right vertex per point), three ways:
+
+ - GeomVertexWriter.addData3f / addData4i per vertex, with a Vec3 each,
+ - PathBuilder.addRow per vertex, as the programs do while drawing,
+ - PathBuilder.addRows per segment, packing each pair of rows,
+ - makeQuadRows and one PathBuilder.addRows for the whole path.
+
+It also checks that each way makes the same bytes.
+
+Run from this directory:  python bench_pathbuilder.py
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import math
+import time
+
+import numpy
+
+from panda3d.core import GeomVertexFormat, GeomVertexData, GeomVertexWriter, \
+    Geom, Vec3, LVecBase4i
+
+import pathbuilder
+
+LENGTHS = [10000, 100000]
+WIDTH = 2
+
+LEFT_COLOR = LVecBase4i(224, 224, 64, 255)
+RIGHT_COLOR = LVecBase4i(64, 224, 224, 255)
+
+
+def makeCenterline(length):
+    """ :return: (centers, intos) for a winding path of @length segments """
+    t = numpy.arange(length + 1) * 0.05
+    heading = numpy.sin(t) * 2
+    intos = numpy.column_stack((numpy.cos(heading), numpy.sin(heading), numpy.zeros(len(t))))
+    centers = numpy.cumsum(intos, axis=0)
+    centers[:, 2] = numpy.sin(t * 0.3) * 5
+    return centers, intos
+
+
+def buildWriter(centers, intos):
+    vertexData = GeomVertexData("path", GeomVertexFormat.getV3c4(), Geom.UHStatic)
+    vertexWriter = GeomVertexWriter(vertexData, 'vertex')
+    colorWriter = GeomVertexWriter(vertexData, 'color')
+    for (x, y, z), (ix, iy, iz) in zip(centers.tolist(), intos.tolist()):
+        vertexWriter.addData3f(Vec3(x - iy * WIDTH, y + ix * WIDTH, z))
+        vertexWriter.addData3f(Vec3(x + iy * WIDTH, y - ix * WIDTH, z))
+        colorWriter.addData4i(LEFT_COLOR)
+        colorWriter.addData4i(RIGHT_COLOR)
+    return vertexData
+
+
+def buildRow(centers, intos):
+    builder = pathbuilder.PathBuilder("path")
+    for (x, y, z), (ix, iy, iz) in zip(centers.tolist(), intos.tolist()):
+        builder.addRow((x - iy * WIDTH, y + ix * WIDTH, z), LEFT_COLOR)
+        builder.addRow((x + iy * WIDTH, y - ix * WIDTH, z), RIGHT_COLOR)
+    return builder.finish()
+
+
+def buildRows(centers, intos):
+    builder = pathbuilder.PathBuilder("path")
+    colors = (LEFT_COLOR, RIGHT_COLOR)
+    for (x, y, z), (ix, iy, iz) in zip(centers.tolist(), intos.tolist()):
+        builder.addRows(((x - iy * WIDTH, y + ix * WIDTH, z),
+                         (x + iy * WIDTH, y - ix * WIDTH, z)), colors)
+    return builder.finish()
+
+
+def buildBatch(centers, intos):
+    builder = pathbuilder.PathBuilder("path", len(centers) * 2)
+    rows = pathbuilder.makeQuadRows(centers, intos, WIDTH)
+    colors = numpy.tile([tuple(LEFT_COLOR), tuple(RIGHT_COLOR)], (len(centers), 1))
+    builder.addRows(rows, colors)
+    return builder.finish()
+
+
+def benchBuilds(lengths=LENGTHS):
+    for length in lengths:
+        centers, intos = makeCenterline(length)
+        expected = None
+        for func in (buildWriter, buildRow, buildRows, buildBatch):
+            t0 = time.time()
+            vertexData = func(centers, intos)
+            elapsed = time.time() - t0
+
+            data = vertexData.getArray(0).getHandle().getData()
+            if expected is None:
+                expected = data
+            print "%6d segments: %-12s %7.3f s, %.2f us/segment, %d rows%s" % (
+                length, func.__name__, elapsed, elapsed * 1e6 / length,
+                vertexData.getNumRows(), data != expected and " (DIFFERENT)" or "")
+
+
+if __name__ == '__main__':
+    benchBuilds()
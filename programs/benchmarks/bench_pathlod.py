@@ -0,0 +1,92 @@
+'''
+Micro-benchmark for the levels of detail of a tunnel (pathbake.makePathGeoms
+and pathchunks.LOD_DISTANCES).
+
+Makes a procedural tunnel of 50k segments at full detail (a ring per point,
+as drawn) and at each of draw_path_tunnel.py's LOD_SPACINGS, and reports
+the time to build each level's Geoms and its size. Then, for the player
+standing at a few places along the tunnel, it counts the vertices in the
+chunks loaded around them, all at full detail and with each chunk at the
+level for its distance, which is what the LODNodes bound.
+
+Run from this directory:  python bench_pathlod.py [segments]
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import time
+
+import numpy
+
+from bench_pathbake import makeTunnel
+import pathbake
+import pathchunks
+
+SEGMENTS = 50000
+PLACES = 5
+
+# as in draw_path_tunnel.py
+LOD_SPACINGS = (4.0, 16.0)
+
+
+def makeLevel(centerline, kind, spacing, perPiece):
+    """
+    Make one level's pieces, as makePathGeoms does (or as drawn, if @spacing is None).
+    :return: (rows, pieces, triangles)
+    """
+    if spacing:
+        centerline = pathbake.smoothCenterline(centerline, spacing, resample=True)
+    rows = pathbake.makeRows(centerline, kind)
+    segments, triangles = pathbake.makeTriangles(centerline, kind)
+    pieces, local = pathbake.makePieces(segments, triangles, kind, perPiece)
+    return rows, pieces, local
+
+
+def getPieceChunks(rows, pieces, chunkSize):
+    """ :return: the (ix, iy) of the chunk each piece goes in, by the middle of its bounds """
+    keys = numpy.zeros((len(pieces), 2), dtype=numpy.int64)
+    for i, (firstRow, numRows, _, _) in enumerate(pieces.tolist()):
+        vertex = rows['vertex'][firstRow:firstRow + numRows, 0:2]
+        center = (vertex.min(axis=0) + vertex.max(axis=0)) * 0.5
+        keys[i] = numpy.floor(center / chunkSize)
+    return keys
+
+
+def benchLevels(segments=SEGMENTS):
+    kind = pathbake.KIND_TUNNEL
+    chunkSize = pathchunks.DEFAULT_CHUNK_SIZE
+    centerline = makeTunnel(segments)
+
+    levels = []
+    for spacing in (None,) + LOD_SPACINGS:
+        perPiece = spacing and max(1, int(chunkSize / spacing)) or pathbake.SEGMENTS_PER_PIECE
+        t0 = time.time()
+        rows, pieces, local = makeLevel(centerline, kind, spacing, perPiece)
+        geoms = pathbake.makeGeoms(rows, pieces, local)
+        elapsed = time.time() - t0
+
+        print "level %d (%s): %d Geoms, %d vertices, %d triangles, built in %.3f s" % (
+            len(levels), spacing and "every %g units" % spacing or "as drawn",
+            len(geoms), len(rows), pieces['numTriangles'].sum(), elapsed)
+        levels.append((pieces['numRows'], getPieceChunks(rows, pieces, chunkSize)))
+
+    # the vertices in the loaded chunks around a few places along the tunnel
+    for index in numpy.linspace(0, len(centerline) - 1, PLACES).astype(int):
+        x, y = centerline['center'][index, 0:2]
+        player = numpy.floor(numpy.array([x, y]) / chunkSize)
+        full = lod = 0
+        for level, (numRows, keys) in enumerate(levels):
+            loaded = numpy.abs(keys - player).max(axis=1) <= pathchunks.LOAD_RADIUS
+            dist = numpy.hypot(*((keys + 0.5) * chunkSize - (x, y)).T)
+            shown = dist >= pathchunks.LOD_DISTANCES[level]
+            if level + 1 < len(levels):
+                shown &= dist < pathchunks.LOD_DISTANCES[level + 1]
+            if level == 0:
+                full = numRows[loaded].sum()
+            lod += numRows[loaded & shown].sum()
+        print "at point %d: %d vertices loaded at full detail, %d with levels of detail (%.0f%%)" % (
+            index, full, lod, lod * 100.0 / max(1, full))
+
+
+if __name__ == '__main__':
+    benchLevels(len(sys.argv) > 1 and int(sys.argv[1]) or SEGMENTS)
@@ -0,0 +1,74 @@
+'''
+Micro-benchmark for lib/pathsimplify.py.
+
+Samples a walk a unit at a time, as drawHere does (long straight runs,
+gentle curves and tight turns, with a little jitter), feeds it through a
+PathSimplifier at a few tolerances, and reports the segments saved, the
+worst distance of any sample from the simplified path, and the time per
+sample.
+
+Run from this directory:  python bench_pathsimplify.py
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import math
+import random
+import time
+
+from pathsimplify import PathSimplifier, getDistanceToSegment
+
+SAMPLES = 100000
+TOLERANCES = [0.02, 0.1, 0.5]
+
+
+def makeWalk(count, seed=1234):
+    """ Sample a wandering walk at 1-unit steps. :return: list of (x, y, z) """
+    rand = random.Random(seed)
+    x = y = z = 0.0
+    heading = 0.0
+    turn = 0.0
+    points = []
+    for i in xrange(count):
+        if i % 200 == 0:
+            # straight, curving, or turning tightly for a while
+            turn = rand.choice([0.0, 0.0, rand.uniform(-0.05, 0.05), rand.uniform(-0.5, 0.5)])
+        heading += turn
+        x += math.cos(heading) + rand.gauss(0, 0.005)
+        y += math.sin(heading) + rand.gauss(0, 0.005)
+        z += rand.choice([0.0, 0.0, 0.0, 0.02])
+        points.append((x, y, z))
+    return points
+
+
+def benchSimplify(points, tolerance):
+    simplifier = PathSimplifier(tolerance)
+    segments = []
+    t0 = time.time()
+    for p in points:
+        segment = simplifier.addPoint(p)
+        if segment:
+            segments.append(segment)
+    segment = simplifier.flush()
+    if segment:
+        segments.append(segment)
+    elapsed = time.time() - t0
+
+    # each sample lies between its segment's ends, in order
+    worst = 0.0
+    i = 0
+    for a, b in segments:
+        while points[i] is not b:
+            worst = max(worst, getDistanceToSegment(points[i], a, b))
+            i += 1
+    return simplifier, elapsed, worst
+
+
+if __name__ == '__main__':
+    points = makeWalk(SAMPLES)
+    for tolerance in TOLERANCES:
+        simplifier, elapsed, worst = benchSimplify(points, tolerance)
+        print "tolerance %.2f: %d samples -> %d segments (%.1f%% fewer vertices), " \
+            "worst error %.3f, %.2f us/sample" % (
+            tolerance, simplifier.getNumSamples(), simplifier.getNumSegments(),
+            simplifier.getReduction() * 100, worst, elapsed * 1e6 / len(points))
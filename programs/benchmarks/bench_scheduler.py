@@ -0,0 +1,190 @@
+'''
+Micro-benchmarks for lib/scheduler.py.
+
+Run from this directory:  python bench_scheduler.py
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import random
+import time
+
+from scheduler import Scheduler, HeapQueue, TimingWheelQueue, VirtualClock
+
+ACTIONS = 100000
+TICKS = 1000
+
+
+def benchDrain(count=ACTIONS, ticks=TICKS):
+    """
+    Schedule @count actions spread over @ticks frames, then drain them one
+    frame at a time, reporting the average cost of a tick for each tenth
+    of the run.  With a real heap the cost per action stays flat instead
+    of growing with the size of the queue.
+    """
+    rand = random.Random(1234)
+    sched = Scheduler()
+    counter = [0]
+
+    def doit():
+        counter[0] += 1
+
+    t0 = time.time()
+    for i in xrange(count):
+        sched.schedule(rand.random() * ticks, doit, fromNow=True)
+    t1 = time.time()
+    print "scheduled %d actions in %.3f s (%.2f us/action)" % (
+        count, t1 - t0, (t1 - t0) * 1e6 / count)
+
+    buckets = 10
+    perBucket = ticks // buckets
+    for b in xrange(buckets):
+        start = counter[0]
+        t0 = time.time()
+        for f in xrange(b * perBucket, (b + 1) * perBucket):
+            sched.tick(f + 1)
+        t1 = time.time()
+        ran = counter[0] - start
+        print "ticks %4d-%4d: %6d actions, %.2f us/tick, %.3f us/action" % (
+            b * perBucket, (b + 1) * perBucket - 1, ran,
+            (t1 - t0) * 1e6 / perBucket, (t1 - t0) * 1e6 / max(1, ran))
+
+    assert counter[0] == count, counter[0]
+    assert sched.isQueueEmpty()
+
+
+def benchAppend(count=ACTIONS):
+    """
+    Append @count actions to the end of the timeline, like a burst of
+    typewriter keystrokes, checking that each one lands after the last.
+    """
+    sched = Scheduler()
+    doit = lambda: None
+
+    last = 0
+    t0 = time.time()
+    for i in xrange(count):
+        start = sched.schedule(0.01, doit).getTime()
+        assert start > last
+        last = start
+    t1 = time.time()
+    print "appended %d actions in %.3f s (%.2f us/action)" % (
+        count, t1 - t0, (t1 - t0) * 1e6 / count)
+
+
+def benchSteadyState(makeQueue, pending, frames=600, frameTime=1 / 60.0):
+    """
+    Keep @pending short timed actions in flight: every action that runs
+    schedules a replacement up to a second ahead.
+    :return: actions run per second of wall time
+    """
+    rand = random.Random(5678)
+    sched = Scheduler(makeQueue())
+    counter = [0]
+
+    def doit():
+        counter[0] += 1
+        sched.schedule(rand.random(), doit, fromNow=True)
+
+    for i in xrange(pending):
+        sched.schedule(rand.random(), doit, fromNow=True)
+
+    t0 = time.time()
+    for f in xrange(frames):
+        sched.tick(f * frameTime)
+    t1 = time.time()
+    return counter[0] / (t1 - t0)
+
+
+def benchQueues():
+    """
+    Compare HeapQueue and TimingWheelQueue throughput
+    """
+    for pending in (1000, 10000, 100000):
+        heap = benchSteadyState(HeapQueue, pending)
+        wheel = benchSteadyState(TimingWheelQueue, pending)
+        print "%6d pending: heap %9.0f actions/s, wheel %9.0f actions/s (%.2fx)" % (
+            pending, heap, wheel, wheel / heap)
+
+
+def benchBudget(count=20000, budgetMs=4.0, frameTime=1 / 60.0):
+    """
+    Drain a burst of @count actions which all become due at once, with and
+    without a frame budget, reporting the worst frame.
+    """
+    def doit():
+        sum(xrange(50))
+
+    for budget in (None, budgetMs):
+        sched = Scheduler()
+        for i in xrange(count):
+            sched.schedule(0, doit, fromNow=True)
+
+        frames = 0
+        worst = 0
+        while not sched.isQueueEmpty():
+            t0 = time.time()
+            sched.tick(frames * frameTime, budgetMs=budget)
+            worst = max(worst, time.time() - t0)
+            frames += 1
+
+        print "budget %-4s: %4d frames, worst frame %.2f ms, %d ticks deferred, worst overrun %.3f ms" % (
+            budget, frames, worst * 1000, sched.getDeferredTicks(), sched.getWorstOverrun())
+
+
+def replayTypingSession(minutes=10, keysPerSecond=5, lineLength=60):
+    """
+    Replay a synthetic typing session on a VirtualClock, headless: each
+    key nudges a carriage node with a short interval, and each line ends
+    with a queued carriage return.
+    :return: (wall seconds, ticks, final carriage position, intervals done)
+    """
+    from direct.interval.LerpInterval import LerpPosInterval
+    from panda3d.core import NodePath, Point3
+
+    carriage = NodePath('carriage')
+    sched = Scheduler(clock=VirtualClock())
+    done = [0]
+
+    def countDone(handle):
+        done[0] += 1
+
+    def key(column):
+        def doit():
+            here = carriage.getPos()
+            there = Point3(here.x + 0.01, 0, 0)
+            sched.startInterval(LerpPosInterval(carriage, 0.05, there, startPos=here)) \
+                .addDoneCallback(countDone)
+            if column == lineLength - 1:
+                back = LerpPosInterval(carriage, 0.5, Point3(0, 0, 0), blendType='easeIn')
+                sched.scheduleInterval(0.1, back, fromNow=True).addDoneCallback(countDone)
+        return doit
+
+    keys = minutes * 60 * keysPerSecond
+    for i in xrange(keys):
+        sched.schedule(1.0 / keysPerSecond, key(i % lineLength))
+
+    t0 = time.time()
+    ticks = sched.runUntil(minutes * 60 + 10)
+    t1 = time.time()
+    assert sched.isQueueEmpty()
+    return t1 - t0, ticks, tuple(carriage.getPos()), done[0]
+
+
+def benchVirtualReplay():
+    """
+    Replay a 10-minute typing session twice and check both runs agree
+    """
+    first = replayTypingSession()
+    second = replayTypingSession()
+    assert first[1:] == second[1:], (first, second)
+    print "replayed 10 minutes of typing in %.1f ms (%d ticks, %d intervals)" % (
+        first[0] * 1000, first[1], first[3])
+
+
+if __name__ == '__main__':
+    benchDrain()
+    benchAppend()
+    benchQueues()
+    benchBudget()
+    benchVirtualReplay()
@@ -0,0 +1,93 @@
+'''
+Compare the two ways draw_path_tunnel.py can index a tunnel:
+
+ - a closed GeomTristrips primitive of ten vertices per ring (drawTunnelRow),
+ - one indexed GeomTriangles per piece (pathbuilder.addTunnelTriangles).
+
+Builds a long tunnel in pieces of TUNNEL_GEOM_ROWS rows, as the program
+does, and reports the build time, the primitives to draw (a draw call each
+where primitive restart isn't available), and the index memory, for the
+strips also after decompose().
+
+Run from this directory:  python bench_tunnelprims.py [rings]
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import time
+
+from panda3d.core import GeomTristrips, GeomTriangles, Geom
+
+from bench_pathbake import makeTunnel
+import pathbake
+import pathbuilder
+
+RINGS = 50000
+
+# as in draw_path_tunnel.py
+TUNNEL_GEOM_ROWS = 64
+VERTS = 4
+
+
+def addTunnelStrip(triStrips, row, verts):
+    """ A copy of draw_path_tunnel.py's drawTunnelRow. """
+    triStrips.addConsecutiveVertices(row - verts + 3, 1)
+    triStrips.addConsecutiveVertices(row + 3, 1)
+    triStrips.addConsecutiveVertices(row - verts + 2, 1)
+    triStrips.addConsecutiveVertices(row + 2, 1)
+    triStrips.addConsecutiveVertices(row - verts + 1, 1)
+    triStrips.addConsecutiveVertices(row + 1, 1)
+    triStrips.addConsecutiveVertices(row - verts, 1)
+    triStrips.addConsecutiveVertices(row, 1)
+    triStrips.addConsecutiveVertices(row - verts + 3, 1)
+    triStrips.addConsecutiveVertices(row + 3, 1)
+    triStrips.closePrimitive()
+
+
+def buildStrips(rows):
+    prims = []
+    for first in xrange(0, rows - VERTS, TUNNEL_GEOM_ROWS - VERTS):
+        triStrips = GeomTristrips(Geom.UHStatic)
+        for row in xrange(VERTS, min(TUNNEL_GEOM_ROWS, rows - first), VERTS):
+            addTunnelStrip(triStrips, row, VERTS)
+        prims.append(triStrips)
+    return prims
+
+
+def buildTriangles(rows):
+    prims = []
+    for first in xrange(0, rows - VERTS, TUNNEL_GEOM_ROWS - VERTS):
+        tris = GeomTriangles(Geom.UHStatic)
+        tris.setIndexType(Geom.NTUint16)
+        for row in xrange(VERTS, min(TUNNEL_GEOM_ROWS, rows - first), VERTS):
+            pathbuilder.addTunnelTriangles(tris, row, VERTS)
+        prims.append(tris)
+    return prims
+
+
+def getIndexBytes(prim):
+    size = prim.getVertices().getDataSizeBytes()
+    if prim.isComposite():
+        size += len(prim.getEnds()) * 4
+    return size
+
+
+def benchPrims(rings=RINGS):
+    rows = len(pathbake.makeRows(makeTunnel(rings), pathbake.KIND_TUNNEL))
+    for func in (buildStrips, buildTriangles):
+        t0 = time.time()
+        prims = func(rows)
+        elapsed = time.time() - t0
+
+        draws = sum(prim.isComposite() and prim.getNumPrimitives() or 1 for prim in prims)
+        indexBytes = sum(getIndexBytes(prim) for prim in prims)
+        print "%d rings, %-14s %6.3f s to build, %d Geoms, %d primitives to draw, %d index bytes" % (
+            rings, func.__name__, elapsed, len(prims), draws, indexBytes)
+
+        if func is buildStrips:
+            decomposed = sum(getIndexBytes(prim.decompose()) for prim in prims)
+            print "%d rings, %-14s %d index bytes after decompose()" % (rings, func.__name__, decomposed)
+
+
+if __name__ == '__main__':
+    benchPrims(len(sys.argv) > 1 and int(sys.argv[1]) or RINGS)
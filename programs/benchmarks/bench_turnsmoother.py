@@ -0,0 +1,147 @@
+'''
+Check TurnSmoother's analytic mode against the stepped one, and time it.
+
+First drives a stepped and an analytic TurnSmoother (set up as
+FpsController's heading and look turners) with the same random script of
+updateTurn, unTurn and setTarget calls at 60 Hz, and compares the headings
+after each update.  Then, in analytic mode, checks that one update with a
+large dt ends up where as many TURN_STEP updates do, for a turn ramp, an
+unturn decay and the easing towards a target, and times both.
+
+Run from this directory:  python bench_turnsmoother.py [steps]
+'''
+import sys
+sys.path.insert(0, "../../lib")
+
+import random
+import time
+
+from fpscontroller import TurnSmoother, TURN_STEP
+
+STEPS = 100000
+TOLERANCE = 1e-3
+
+# as FpsController's turners: (minRate, maxRate, targetLag, rangeX)
+TURNERS = (('heading', (8, 180, 16, None)),
+           ('look', (8, 90, 4, (-90, 90))))
+
+
+def angleDiff(a, b):
+    return abs((a - b + 180) % 360 - 180)
+
+
+def makeScript(steps, seed=1234):
+    """
+    Make @steps calls, each held for a few steps: (1 or -1) to turn,
+    0 to unturn, or an angle to target.
+    """
+    rand = random.Random(seed)
+    script = []
+    while len(script) < steps:
+        pick = rand.random()
+        if pick < 0.4:
+            op = rand.choice((1, -1))
+        elif pick < 0.8:
+            op = 0
+        else:
+            op = float(rand.randint(-80, 80) % 360)
+        # a target is set once, then eased towards
+        script.append(op)
+        script.extend([op if isinstance(op, int) else 0] * rand.randint(0, 30))
+    return script[:steps]
+
+
+def runScript(smoother, script, dt=TURN_STEP):
+    """ Run @script on @smoother.  :return: the heading after each update """
+    headings = []
+    for op in script:
+        if isinstance(op, float):
+            smoother.setTarget(op)
+        elif op:
+            smoother.updateTurn(op, dt)
+        else:
+            smoother.unTurn(dt)
+        headings.append(smoother.update(dt))
+    return headings
+
+
+def compareModes(steps=STEPS):
+    """ :return: the number of updates whose headings differ by more than TOLERANCE """
+    failures = 0
+    script = makeScript(steps)
+    for name, args in TURNERS:
+        for snap in (True, False):
+            stepped = TurnSmoother(*args)
+            analytic = TurnSmoother(*args, analytic=True)
+            stepped.setSnap(snap)
+            analytic.setSnap(snap)
+
+            t0 = time.time()
+            want = runScript(stepped, script)
+            steppedTime = time.time() - t0
+            t0 = time.time()
+            got = runScript(analytic, script)
+            analyticTime = time.time() - t0
+
+            diffs = [angleDiff(a, b) for a, b in zip(want, got)]
+            bad = sum(1 for d in diffs if d > TOLERANCE)
+            print "%s turner, snap %s: %d updates at 60 Hz, max difference %.2g degrees, %d over %g; " \
+                  "stepped %.2f us, analytic %.2f us per update" % (
+                name, snap, len(script), max(diffs), bad, TOLERANCE,
+                steppedTime * 1e6 / len(script), analyticTime * 1e6 / len(script))
+            failures += bad
+    return failures
+
+
+def compareLongStep(steps=600):
+    """
+    From the same start, do one update of @steps * TURN_STEP and @steps
+    updates of TURN_STEP, in analytic mode.
+    :return: the number of cases that differ by more than TOLERANCE
+    """
+    def turnRight(smoother, dt):
+        smoother.updateTurn(-1, dt)
+
+    def unTurn(smoother, dt):
+        smoother.unTurn(dt)
+
+    failures = 0
+    for n in (1, 7, 60, steps):
+        for case, prepare, call in (('turn', None, turnRight),
+                                    ('unturn', 'spin', unTurn),
+                                    # as FpsController, which unturns while not turning
+                                    ('target', 'target', unTurn)):
+            results = []
+            elapsed = []
+            for count, dt in ((1, n * TURN_STEP), (n, TURN_STEP)):
+                smoother = TurnSmoother(8, 180, 16, None, analytic=True)
+                smoother.setSnap(False)
+                smoother.setHeading(10.0)
+                if prepare == 'spin':
+                    # turning at full rate, to decay from
+                    for i in xrange(30):
+                        smoother.updateTurn(1, TURN_STEP)
+                        smoother.update(TURN_STEP)
+                elif prepare == 'target':
+                    smoother.setTarget(200.0)
+
+                t0 = time.time()
+                for i in xrange(count):
+                    call(smoother, dt)
+                    smoother.update(dt)
+                elapsed.append(time.time() - t0)
+                results.append(smoother.getHeading())
+
+            diff = angleDiff(*results)
+            print "%-6s over %3d steps: one update %.4f, %d updates %.4f, difference %.2g; %.1f vs %.1f us" % (
+                case, n, results[0], n, results[1], diff, elapsed[0] * 1e6, elapsed[1] * 1e6)
+            if diff > TOLERANCE:
+                failures += 1
+    return failures
+
+
+if __name__ == '__main__':
+    failures = compareModes(len(sys.argv) > 1 and int(sys.argv[1]) or STEPS)
+    failures += compareLongStep()
+    print failures and "%d FAILED" % failures or "all match"
+    sys.exit(failures and 1 or 0)
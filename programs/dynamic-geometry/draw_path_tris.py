@@ -15,14 +15,33 @@ loadPrcFileData("", "sync-video 1")
 
 from direct.gui.OnscreenText import OnscreenText
 from direct.showbase.ShowBase import ShowBase
-from panda3d.core import TextNode, GeomNode, LVecBase4i, GeomVertexFormat, Geom,\
-    GeomVertexWriter, GeomTristrips, GeomVertexData, Vec3, CollisionNode, \
-    CollisionTraverser, CollisionSphere,\
-    CollisionFloorMesh, GeomVertexReader, Point3, CollisionHandlerFloor
+from panda3d.core import TextNode, LVecBase4i, Geom, GeomTristrips
+import os
 import sys
 
 import fpscontroller
-from direct.directnotify import DirectNotifyGlobal
+import floorgrid
+import pathbake
+import pathbuilder
+import pathchunks
+import pathsimplify
+
+# how far above or below the player a floor is found (the radius of the
+# collision sphere this replaced)
+FLOOR_REACH = 1
+
+# where F2 saves the path; if given and it exists, it is loaded at startup
+PATH_FILE = len(sys.argv) > 1 and sys.argv[1] or "tris.path"
+
+# the saved path is smoothed along a spline, sampled this often (in world units)
+SMOOTH_SPACING = 0.5
+
+# vertex rows in one table before it is packed and a new one started
+GEOM_ROWS = 256
+
+# the spacing (in world units) of the rings in each coarser level of
+# detail, from level 1 on; see pathchunks.LOD_DISTANCES for where they show
+LOD_SPACINGS = (4.0, 16.0)
 
 class MyApp(ShowBase):
     def __init__(self):
@@ -42,6 +61,23 @@ class MyApp(ShowBase):
 
         self.makeInstructions()
         self.initCollisions()
+        
+        # the path's geometry, in chunks paged in and out by distance
+        self.pathChunks = pathchunks.PathChunks(self.render)
+        self.pathChunks.root.setTwoSided(True)
+        # apparently p3tinydisplay needs this
+        self.pathChunks.root.setColorOff()
+
+        # merges nearly straight runs of sampled positions into one segment
+        self.simplifier = pathsimplify.PathSimplifier()
+
+        # the centerline drawn, for saving
+        self.pathRecorder = pathbake.PathRecorder(pathbake.KIND_QUAD)
+        if len(sys.argv) > 1 and os.path.exists(PATH_FILE):
+            self.loadPath(PATH_FILE)
+
+        # (the chunks are kept up to date while drawing, too)
+        self.taskMgr.add(self.updatePhysics, 'updatePhysics')
 
         self.leftColor = LVecBase4i(224, 224, 64, 255)
         self.rightColor = LVecBase4i(64, 224, 224, 255)
@@ -51,39 +87,11 @@ class MyApp(ShowBase):
         
         self.accept("escape", sys.exit)            #Escape quits
         self.accept("enter", self.toggleDrawing)
+        self.accept("f2", self.savePath)
 
     def initCollisions(self):
-        # Initialize the collision traverser.
-        self.cTrav = CollisionTraverser()
-        
-        self.cTrav.showCollisions(self.render)
-        
-#         self.cQueue = CollisionHandlerQueue()
-         
-        # Initialize the Pusher collision handler.
-        #self.pusher = CollisionHandlerPusher()
-        self.pusher = CollisionHandlerFloor()
-                
-        ### player
-        
-        print DirectNotifyGlobal.directNotify.getCategories()
-        # Create a collsion node for this object.
-        playerNode = CollisionNode('player')
-        playerNode.addSolid(CollisionSphere(0, 0, 0, 1))
-        
-#         playerNode.setFromCollideMask(BitMask32.bit(0))
-#         playerNode.setIntoCollideMask(BitMask32.allOn())
-            
-        # Attach the collision node to the object's model.
-        self.playerC = self.fpscamera.player.attachNewNode(playerNode)
-        # Set the object's collision node to render as visible.
-        self.playerC.show()
-         
-        # Add the 'player' collision node to the Pusher collision handler.
-        #self.pusher.addCollider(self.playerC, self.fpscamera.player)
-        #self.pusher.addCollider(playerC, self.fpscamera.player)
-
-#         self.cTrav.addCollider(self.playerC, self.cQueue)
+        # the floor triangles, indexed for finding the height under the player
+        self.floorGrid = floorgrid.FloorGrid()
         
 
     def toggleDrawing(self):
@@ -93,35 +101,11 @@ class MyApp(ShowBase):
             self.drawText.setText("Enter: Turn off drawing")
             self.fpscamera.setFlyMode(True)
             self.prevPos = None
+            self.simplifier.reset()
+            self.pathRecorder.breakPath()
 
-            self.cTrav.removeCollider(self.playerC)
-            self.pusher.removeCollider(self.playerC)
-            
-            self.removeTask('updatePhysics')
             self.addTask(self.drawHere, 'drawHere')
             
-            self.geomNode = GeomNode('geomNode')
-            self.geomNodePath = self.render.attachNewNode(self.geomNode)
-            
-            self.geomNodePath.setTwoSided(True)
-            
-            # apparently p3tinydisplay needs this
-            self.geomNodePath.setColorOff()
-    
-    
-            # Create a collision node for this object.
-            self.floorCollNode = CollisionNode('geom')
-            
-#             self.floorCollNode.setFromCollideMask(BitMask32.bit(0))
-#             self.floorCollNode.setIntoCollideMask(BitMask32.allOn())
-        
-            # Attach the collision node to the object's model.
-            floorC = self.geomNodePath.attachNewNode(self.floorCollNode)
-            # Set the object's collision node to render as visible.
-            floorC.show()
-            
-            #self.pusher.addCollider(floorC, self.geomNodePath)
-
             self.newVertexData()
             
             self.newGeom()
@@ -130,24 +114,21 @@ class MyApp(ShowBase):
             self.drawText.setText("Enter: Turn on drawing")
             self.removeTask('drawHere')
             if self.prevPos:
+                segment = self.simplifier.flush()
+                if segment:
+                    self.drawSegment(*segment)
+                self.pathBuilder.finish()
                 self.completePath()
+                self.reportSimplified()
+                self.addLevels(self.pathRecorder.getLastRun())
             
             self.fpscamera.setFlyMode(True)
             
             self.drive.setPos(self.fpscamera.getPos())
-            
-            self.cTrav.addCollider(self.playerC, self.pusher)
-            self.pusher.addCollider(self.playerC, self.fpscamera.player)
-            
-            self.taskMgr.add(self.updatePhysics, 'updatePhysics')
 
     def newVertexData(self):
-        fmt = GeomVertexFormat.getV3c4()
-#         fmt = GeomVertexFormat.getV3n3c4()
-        self.vertexData = GeomVertexData("path", fmt, Geom.UHStatic)
-        self.vertexWriter = GeomVertexWriter(self.vertexData, 'vertex')
-#         self.normalWriter = GeomVertexWriter(self.vertexData, 'normal')
-        self.colorWriter = GeomVertexWriter(self.vertexData, 'color')
+        self.pathBuilder = pathbuilder.PathBuilder("path", GEOM_ROWS)
+        self.vertexData = self.pathBuilder.vertexData
 
     def newGeom(self):
         self.triStrips = GeomTristrips(Geom.UHDynamic)
@@ -164,6 +145,7 @@ class MyApp(ShowBase):
         self.genLabelText("Walk (W/S/A/D), Jump=Space, Look=PgUp/PgDn", 1)
         self.genLabelText("  (hint, go backwards with S to see your path immediately)", 2)
         self.genLabelText("ESC: Quit", 3)
+        self.genLabelText("F2: Save path to " + PATH_FILE, 5)
         
     def genLabelText(self, text, i):
         return OnscreenText(text = text, pos = (-1.3, .95-.05*i), fg=(1,1,0,1),
@@ -178,54 +160,69 @@ class MyApp(ShowBase):
         
         if not prevPos:
             self.prevPos = pos
+            self.simplifier.addPoint(pos)
             
         elif (pos - prevPos).length() > 1:
-            self.drawQuadTo(prevPos, pos, 2)
+            segment = self.simplifier.addPoint(pos)
+            if segment:
+                self.drawSegment(*segment)
             
-            row = self.vertexWriter.getWriteRow()
-            numPrims = self.triStrips.getNumPrimitives()
-            if numPrims == 0:
-                primVerts = row
-            else:
-                primVerts = row - self.triStrips.getPrimitiveEnd(numPrims-1)
+            self.prevPos = pos
+        
+        return task.cont
 
-            if primVerts >= 4:
-                self.triStrips.closePrimitive()
+    def drawSegment(self, prevPos, pos):
+        self.drawQuadTo(prevPos, pos, 2)
+        
+        row = self.pathBuilder.getNumRows()
+        numPrims = self.triStrips.getNumPrimitives()
+        if numPrims == 0:
+            primVerts = row
+        else:
+            primVerts = row - self.triStrips.getPrimitiveEnd(numPrims-1)
+
+        if primVerts >= 4:
+            self.triStrips.closePrimitive()
+            
+            if row >= GEOM_ROWS:
+                print "Packing and starting anew"
+                newGeom = True
+                self.pathBuilder.finish()
+                self.geom.unifyInPlace(row, False)
+            else:
+                newGeom = False
                 
-                if row >= 256:
-                    print "Packing and starting anew"
-                    newGeom = True
-                    self.geom.unifyInPlace(row, False)
-                else:
-                    newGeom = False
-                    
-                self.completePath()
+            self.completePath()
 
-                if newGeom:                
-                    self.newVertexData()
-                                    
-                self.newGeom()
-                if not newGeom:
-                    self.triStrips.addConsecutiveVertices(row - 2, 2)
-                else:
-                    self.drawQuadTo(prevPos, pos, 2)
-                    
-            self.leftColor[1] += 63
-            self.rightColor[2] += 37
+            if newGeom:                
+                self.newVertexData()
+                                
+            self.newGeom()
+            if not newGeom:
+                self.triStrips.addConsecutiveVertices(row - 2, 2)
+            else:
+                # (it is already in the floor grid and the recorded path)
+                self.drawQuadTo(prevPos, pos, 2, newSegment=False)
+                
+        self.leftColor[1] += 63
+        self.rightColor[2] += 37
             
-            self.prevPos = pos
-        
-        return task.cont
+    def reportSimplified(self):
+        print "Drew %d segments for %d positions (%.1f%% fewer vertices)" % (
+            self.simplifier.getNumSegments(), self.simplifier.getNumSamples(),
+            self.simplifier.getReduction() * 100)
 
     def drawLineTo(self, pos, color):
-        self.vertexWriter.addData3f(pos.x, pos.y, pos.z)
-#         self.normalWriter.addData3f(0, 0, 1)
-        self.colorWriter.addData4i(color)
+        self.pathBuilder.addRow((pos.x, pos.y, pos.z), color)
         
         self.triStrips.addNextVertices(1)
             
-    def drawQuadTo(self, a, b, width):
-        """ a (to) b are vectors defining a line bisecting a new quad. """
+    def drawQuadTo(self, a, b, width, newSegment=True):
+        """
+        a (to) b are vectors defining a line bisecting a new quad.
+        @param newSegment: if False, this is redrawing the last quad, which
+        is already in the floor grid and the recorded path
+        """
         into = (b - a)
         if abs(into.x) + abs(into.y) < 1:
             if not self.prevInto:
@@ -237,11 +234,16 @@ class MyApp(ShowBase):
         
         # the perpendicular of (a,b) is (-b,a); we want the path to be "flat" in Z=space
         
-        if self.vertexWriter.getWriteRow() == 0:
+        if self.pathBuilder.getNumRows() == 0:
             self.drawQuadRow(a, into, width)        
             
+        prevRow = self.lastRow
         self.drawQuadRow(b, into, width)        
         
+        if newSegment:
+            self.floorGrid.addQuad(*(prevRow + self.lastRow))
+            self.pathRecorder.addSegment(a, b, into, width, self.leftColor, self.rightColor)
+        
         self.prevInto = into
 
     def drawQuadRow(self, a, into, width):
@@ -249,53 +251,65 @@ class MyApp(ShowBase):
         
         # the perpendicular of (a,b) is (-b,a); we want the path to be "flat" in Z=space
         
-        aLeft = Vec3(a.x - into.y * width, a.y + into.x * width, a.z)
-        aRight = Vec3(a.x + into.y * width, a.y - into.x * width, a.z)
-        
-        row = self.vertexWriter.getWriteRow()
-        
-        self.vertexWriter.addData3f(aLeft)
-        self.vertexWriter.addData3f(aRight)
-
-#         self.normalWriter.addData3f(Vec3(0, 0, 1))
-#         self.normalWriter.addData3f(Vec3(0, 0, 1))
-
-        self.colorWriter.addData4i(self.leftColor)
-        self.colorWriter.addData4i(self.rightColor)
+        aLeft = (a.x - into.y * width, a.y + into.x * width, a.z)
+        aRight = (a.x + into.y * width, a.y - into.x * width, a.z)
         
+        row = self.pathBuilder.addRow(aLeft, self.leftColor)
+        self.pathBuilder.addRow(aRight, self.rightColor)
         self.triStrips.addConsecutiveVertices(row, 2)
+        
+        self.lastRow = (aLeft, aRight)
 
     def completePath(self):
-        self.geomNode.addGeom(self.geom)
-        
-        if self.triStrips.getNumPrimitives() == 0:
-            return
-        
-        floorMesh = CollisionFloorMesh()
-        
-        tris = self.triStrips.decompose()
-        p = 0
-        vertexReader = GeomVertexReader(self.vertexData, 'vertex') 
-        for i in range(tris.getNumPrimitives()):
-            v0 = tris.getPrimitiveStart(i)
-            ve = tris.getPrimitiveEnd(i)
-            if v0 < ve:
-                vertexReader.setRow(tris.getVertex(v0))
-                floorMesh.addVertex(Point3(vertexReader.getData3f()))
-                vertexReader.setRow(tris.getVertex(v0+1))
-                floorMesh.addVertex(Point3(vertexReader.getData3f()))
-                vertexReader.setRow(tris.getVertex(v0+2))
-                floorMesh.addVertex(Point3(vertexReader.getData3f()))
-                floorMesh.addTriangle(p, p+1, p+2)
-                p += 3
-        
-        self.floorCollNode.addSolid(floorMesh)
-        
+        # (the floor grid got each quad as it was drawn)
+        self.pathChunks.addGeom(self.geom)
         
           
+    def savePath(self):
+        self.pathRecorder.save(PATH_FILE, SMOOTH_SPACING)
+        print "Saved %d points to %s" % (self.pathRecorder.getNumPoints(), PATH_FILE)
+
+    def addLevels(self, centerline):
+        """ Add the coarser levels of detail for a finished path's centerline. """
+        for level, spacing in enumerate(LOD_SPACINGS, 1):
+            # (pieces no longer than a chunk, so each is switched near where it is)
+            perPiece = max(1, int(self.pathChunks.chunkSize / spacing))
+            for geom in pathbake.makePathGeoms(centerline, self.pathRecorder.kind, spacing, perPiece):
+                self.pathChunks.addGeom(geom, level)
+
+    def loadPath(self, filename):
+        path = pathbake.BakedPath(filename)
+        if path.kind != self.pathRecorder.kind:
+            # (its geometry and centerline don't mix with this program's)
+            print "Not loading %s: it is a %s path, not a %s path" % (
+                filename, pathbake.KIND_NAMES.get(path.kind, path.kind),
+                pathbake.KIND_NAMES[self.pathRecorder.kind])
+            path.close()
+            return
+        for geom in path.makeGeoms():
+            self.pathChunks.addGeom(geom)
+        path.addFloor(self.floorGrid)
+        self.addLevels(path.centerline)
+        self.pathRecorder.addCenterline(path.centerline)
+        path.close()
+        print "Loaded %d points from %s" % (self.pathRecorder.getNumPoints(), filename)
+
     def updatePhysics(self, task):
         pos = self.fpscamera.getPos()
-        self.info.setText("Position: {0}, {1}, {2}".format(int(pos.x*100)/100., int(pos.y*100)/100., int(pos.z)/100.))
+        
+        # stand on the floor, if there is one close enough; not while
+        # drawing, when the player flies over the floor just drawn
+        if not self.isDrawing:
+            floorZ = self.floorGrid.getFloorHeight(pos.x, pos.y, pos.z + FLOOR_REACH, pos.z - FLOOR_REACH)
+            if floorZ is not None:
+                self.fpscamera.player.setZ(floorZ)
+
+        # (from the camera, as the chunks' LODNodes measure)
+        eye = self.cam.getPos(self.render)
+        self.pathChunks.update(eye.x, eye.y, eye.z)
+            
+        if not self.isDrawing:
+            self.info.setText("Position: {0}, {1}, {2}".format(int(pos.x*100)/100., int(pos.y*100)/100., int(pos.z)/100.))
         return task.cont
                           
 
@@ -16,13 +16,38 @@ loadPrcFileData("", "sync-video 1")
 
 from direct.gui.OnscreenText import OnscreenText
 from direct.showbase.ShowBase import ShowBase
-from panda3d.core import TextNode, GeomNode, LVecBase4i, GeomVertexFormat, Geom,\
-    GeomVertexWriter, GeomTristrips, GeomVertexData, Vec3, CollisionNode, \
-    CollisionTraverser, CollisionSphere,\
-    CollisionFloorMesh, GeomVertexReader, Point3, CollisionHandlerFloor
+from panda3d.core import TextNode, LVecBase4i, Geom, GeomTristrips, GeomTriangles
+import os
 import sys
 
 import fpscontroller
+import floorgrid
+import pathbake
+import pathbuilder
+import pathchunks
+import pathsimplify
+
+# how far above or below the player a floor is found (the radius of the
+# collision sphere this replaced)
+FLOOR_REACH = 1
+
+# where F2 saves the path; if given and it exists, it is loaded at startup
+PATH_FILE = len(sys.argv) > 1 and sys.argv[1] or "tunnel.path"
+
+# the saved path is smoothed along a spline, sampled this often (in world units)
+SMOOTH_SPACING = 0.5
+
+# vertex rows (4 per ring) in one piece of tunnel before it is handed to
+# the chunks and a new one started
+TUNNEL_GEOM_ROWS = 64
+
+# make the tunnel from one indexed triangle list per piece, rather than a
+# triangle strip per ring
+TUNNEL_TRIANGLES = True
+
+# the spacing (in world units) of the rings in each coarser level of
+# detail, from level 1 on; see pathchunks.LOD_DISTANCES for where they show
+LOD_SPACINGS = (4.0, 16.0)
 
 
 class MyApp(ShowBase):
@@ -46,6 +71,23 @@ class MyApp(ShowBase):
 
         self.initCollisions()
 
+        # the path's geometry, in chunks paged in and out by distance
+        self.pathChunks = pathchunks.PathChunks(self.render)
+        self.pathChunks.root.setTwoSided(True)
+        # apparently p3tinydisplay needs this
+        self.pathChunks.root.setColorOff()
+
+        # merges nearly straight runs of sampled positions into one segment
+        self.simplifier = pathsimplify.PathSimplifier()
+
+        # the centerline drawn, for saving
+        self.pathRecorder = pathbake.PathRecorder(pathbake.KIND_TUNNEL)
+        if len(sys.argv) > 1 and os.path.exists(PATH_FILE):
+            self.loadPath(PATH_FILE)
+
+        # (the chunks are kept up to date while drawing, too)
+        self.taskMgr.add(self.updatePhysics, 'updatePhysics')
+
         self.leftColor = LVecBase4i(224, 224, 64, 255)
         self.rightColor = LVecBase4i(64, 224, 224, 255)
         
@@ -54,26 +96,11 @@ class MyApp(ShowBase):
         
         self.accept("escape", sys.exit)            #Escape quits
         self.accept("enter", self.toggleDrawing)
+        self.accept("f2", self.savePath)
 
     def initCollisions(self):
-        # Initialize the collision traverser.
-        self.cTrav = CollisionTraverser()
-        
-        self.cTrav.showCollisions(self.render)
-        
-        # Initialize the Pusher collision handler.
-        self.pusher = CollisionHandlerFloor()
-                
-        ### player
-        
-        # Create a collsion node for this object.
-        playerNode = CollisionNode('player')
-        playerNode.addSolid(CollisionSphere(0, 0, 0, 1))
-        
-        # Attach the collision node to the object's model.
-        self.playerC = self.fpscamera.player.attachNewNode(playerNode)
-        # Set the object's collision node to render as visible.
-        self.playerC.show()
+        # the floor triangles, indexed for finding the height under the player
+        self.floorGrid = floorgrid.FloorGrid()
          
 
     def toggleDrawing(self):
@@ -84,29 +111,11 @@ class MyApp(ShowBase):
 
             self.fpscamera.setFlyMode(True)
             self.prevPos = None
+            self.simplifier.reset()
+            self.pathRecorder.breakPath()
 
-            # self.cTrav.remosveCollider(self.playerC)
-            
-            self.removeTask('updatePhysics')
             self.addTask(self.drawHere, 'drawHere')
             
-            self.geomNode = GeomNode('geomNode')
-            self.geomNodePath = self.render.attachNewNode(self.geomNode)
-            
-            self.geomNodePath.setTwoSided(True)
-            
-            
-            # apparently p3tinydisplay needs this
-            self.geomNodePath.setColorOff()
-
-            # Create a collision node for this object.
-            self.floorCollNode = CollisionNode('geom')
-
-            # Attach the collision node to the object's model.
-            floorC = self.geomNodePath.attachNewNode(self.floorCollNode)
-            # Set the object's collision node to render as visible.
-            floorC.show()
-
             self.newVertexData()
             
             self.newGeom()
@@ -116,31 +125,34 @@ class MyApp(ShowBase):
 
             self.removeTask('drawHere')
             if self.prevPos:
+                segment = self.simplifier.flush()
+                if segment:
+                    self.drawSegment(*segment)
+                self.pathBuilder.finish()
                 #self.completePath()
                 self.completeTunnelPath()
+                self.reportSimplified()
+                self.addLevels(self.pathRecorder.getLastRun())
             
             self.fpscamera.setFlyMode(True)
             
             self.drive.setPos(self.fpscamera.getPos())
 
-            self.cTrav.addCollider(self.playerC, self.pusher)
-            self.pusher.addCollider(self.playerC, self.fpscamera.player)
-
-            self.taskMgr.add(self.updatePhysics, 'updatePhysics')
-
     def newVertexData(self):
-        fmt = GeomVertexFormat.getV3c4()
-#         fmt = GeomVertexFormat.getV3n3c4()
-        self.vertexData = GeomVertexData("path", fmt, Geom.UHStatic)
-        self.vertexWriter = GeomVertexWriter(self.vertexData, 'vertex')
-#         self.normalWriter = GeomVertexWriter(self.vertexData, 'normal')
-        self.colorWriter = GeomVertexWriter(self.vertexData, 'color')
+        self.pathBuilder = pathbuilder.PathBuilder("path", TUNNEL_GEOM_ROWS)
+        self.vertexData = self.pathBuilder.vertexData
 
     def newGeom(self):
         self.triStrips = GeomTristrips(Geom.UHDynamic)
         self.geom = Geom(self.vertexData)
         self.geom.addPrimitive(self.triStrips)
         
+        if TUNNEL_TRIANGLES:
+            self.tunnelTris = GeomTriangles(Geom.UHDynamic)
+            # (a piece has far fewer rows than this can index)
+            self.tunnelTris.setIndexType(Geom.NTUint16)
+            self.geom.addPrimitive(self.tunnelTris)
+        
         
     def makeInstructions(self):
         OnscreenText(text="Draw Path by Walking (WSAD/space/mouselook)",
@@ -148,6 +160,7 @@ class MyApp(ShowBase):
                           pos=(0.5,-0.95), scale = .07)
         self.genLabelText("ESC: Quit", 0)
         self.instructionText = self.genLabelText("", 1)
+        self.genLabelText("F2: Save path to " + PATH_FILE, 3)
         
     def genLabelText(self, text, i):
         return OnscreenText(text = text, pos = (-1.3, .95-.05*i), fg=(1,1,0,1),
@@ -162,22 +175,33 @@ class MyApp(ShowBase):
         
         if not prevPos:
             self.prevPos = pos
+            self.simplifier.addPoint(pos)
             
         elif (pos - prevPos).length() >= 1:
-#             self.extendPathQuad(prevPos, pos, 2)
-            self.extendPathTunnel(prevPos, pos, 3)
-                    
-            self.leftColor[1] += 63
-            self.rightColor[2] += 37
+            segment = self.simplifier.addPoint(pos)
+            if segment:
+                self.drawSegment(*segment)
             
             self.prevPos = pos
         
         return task.cont
 
+    def drawSegment(self, prevPos, pos):
+#         self.extendPathQuad(prevPos, pos, 2)
+        self.extendPathTunnel(prevPos, pos, 3)
+                
+        self.leftColor[1] += 63
+        self.rightColor[2] += 37
+
+    def reportSimplified(self):
+        print "Drew %d segments for %d positions (%.1f%% fewer vertices)" % (
+            self.simplifier.getNumSegments(), self.simplifier.getNumSamples(),
+            self.simplifier.getReduction() * 100)
+
     def extendPathQuad(self, prevPos, pos, width):
         self.drawQuadTo(prevPos, pos, width)
 
-        row = self.vertexWriter.getWriteRow()
+        row = self.pathBuilder.getNumRows()
         numPrims = self.triStrips.getNumPrimitives()
         if numPrims == 0:
             primVerts = row
@@ -190,6 +214,7 @@ class MyApp(ShowBase):
             if row >= 256:
                 print "Packing and starting anew"
                 newGeom = True
+                self.pathBuilder.finish()
                 self.geom.unifyInPlace(row, False)
             else:
                 newGeom = False
@@ -201,7 +226,8 @@ class MyApp(ShowBase):
                                 
             self.newGeom()
             if newGeom:
-                self.drawQuadTo(prevPos, pos, width)
+                # (its floor is already in the grid)
+                self.drawQuadTo(prevPos, pos, width, newSegment=False)
             else:
                 self.triStrips.addConsecutiveVertices(row - 2, 2)
             
@@ -209,17 +235,29 @@ class MyApp(ShowBase):
     def extendPathTunnel(self, prevPos, pos, width):
         self.drawTunnelTo(prevPos, pos, width)
 
+        if self.pathBuilder.getNumRows() >= TUNNEL_GEOM_ROWS:
+            self.pathBuilder.finish()
+            self.completeTunnelPath()
+            self.newVertexData()
+            self.newGeom()
+            # start the new piece with a copy of this one's last ring, so
+            # they share it exactly even where the path turns
+            for vertex, color in self.lastRing:
+                self.pathBuilder.addRow(vertex, color)
+
     def drawLineTo(self, pos, color):
-        self.vertexWriter.addData3f(pos.x, pos.y, pos.z)
-#         self.normalWriter.addData3f(0, 0, 1)
-        self.colorWriter.addData4i(color)
+        self.pathBuilder.addRow((pos.x, pos.y, pos.z), color)
         
         self.triStrips.addNextVertices(1)
         
         return 1
             
-    def drawQuadTo(self, a, b, width):
-        """ a (to) b are vectors defining a line bisecting a new quad. """
+    def drawQuadTo(self, a, b, width, newSegment=True):
+        """
+        a (to) b are vectors defining a line bisecting a new quad.
+        @param newSegment: if False, this is redrawing the last quad, which
+        is already in the floor grid
+        """
         into = (b - a)
         if abs(into.x) + abs(into.y) < 1:
             # ensure that if we jump in place, we don't get a thin segment
@@ -231,11 +269,15 @@ class MyApp(ShowBase):
         
         # the perpendicular of (a,b) is (-b,a); we want the path to be "flat" in Z=space
         
-        if self.vertexWriter.getWriteRow() == 0:
+        if self.pathBuilder.getNumRows() == 0:
             self.drawQuadRow(a, into, width)        
         
+        prevRow = self.lastRow
         verts = self.drawQuadRow(b, into, width)
 
+        if newSegment:
+            self.floorGrid.addQuad(*(prevRow + self.lastRow))
+
         self.prevInto = into
         
         return verts
@@ -245,22 +287,16 @@ class MyApp(ShowBase):
         
         # the perpendicular of (a,b) is (-b,a); we want the path to be "flat" in Z=space
         
-        aLeft = Vec3(a.x - into.y * width, a.y + into.x * width, a.z)
-        aRight = Vec3(a.x + into.y * width, a.y - into.x * width, a.z)
-        
-        row = self.vertexWriter.getWriteRow()
-        
-        self.vertexWriter.addData3f(aLeft)
-        self.vertexWriter.addData3f(aRight)
+        aLeft = (a.x - into.y * width, a.y + into.x * width, a.z)
+        aRight = (a.x + into.y * width, a.y - into.x * width, a.z)
         
-#         self.normalWriter.addData3f(Vec3(0, 0, 1))
-#         self.normalWriter.addData3f(Vec3(0, 0, 1))
-        
-        self.colorWriter.addData4i(self.leftColor)
-        self.colorWriter.addData4i(self.rightColor)
+        row = self.pathBuilder.addRow(aLeft, self.leftColor)
+        self.pathBuilder.addRow(aRight, self.rightColor)
         
         self.triStrips.addConsecutiveVertices(row, 2)
 
+        self.lastRow = (aLeft, aRight)
+
         return 2
             
     def drawTunnelTo(self, a, b, width):
@@ -276,12 +312,20 @@ class MyApp(ShowBase):
         
         # the perpendicular of (a,b) is (-b,a); we want the path to be "flat" in Z=space
         
-        if self.vertexWriter.getWriteRow() == 0:
+        if self.pathBuilder.getNumRows() == 0:
             self.drawTunnelBoundary(a, into, width)        
             
-        row = self.vertexWriter.getWriteRow()
+        row = self.pathBuilder.getNumRows()
+        prevRow = self.lastRow
         verts = self.drawTunnelBoundary(b, into, width)        
-        totalVerts = self.drawTunnelRow(row, verts)        
+        if TUNNEL_TRIANGLES:
+            totalVerts = pathbuilder.addTunnelTriangles(self.tunnelTris, row, verts)
+        else:
+            totalVerts = self.drawTunnelRow(row, verts)        
+        
+        # only the bottom is floor; the walls and ceiling are not walked on
+        self.floorGrid.addQuad(*(prevRow + self.lastRow))
+        self.pathRecorder.addSegment(a, b, into, width, self.leftColor, self.rightColor)
         
         self.prevInto = into
         
@@ -290,20 +334,17 @@ class MyApp(ShowBase):
     def drawTunnelBoundary(self, a, into, width):
         """ a defines a point, with 'into' being the normalized direction. """
         
-        aLowLeft = Vec3(a.x - into.y * width, a.y + into.x * width, a.z)
-        aLowRight = Vec3(a.x + into.y * width, a.y - into.x * width, a.z)
-        aHighRight = Vec3(a.x + into.y * width, a.y - into.x * width, a.z + width * 3)
-        aHighLeft = Vec3(a.x - into.y * width, a.y + into.x * width, a.z + width * 3)
+        aLowLeft = (a.x - into.y * width, a.y + into.x * width, a.z)
+        aLowRight = (a.x + into.y * width, a.y - into.x * width, a.z)
+        aHighRight = (aLowRight[0], aLowRight[1], a.z + width * 3)
+        aHighLeft = (aLowLeft[0], aLowLeft[1], a.z + width * 3)
         
-        self.vertexWriter.addData3f(aLowLeft)
-        self.vertexWriter.addData3f(aLowRight)
-        self.vertexWriter.addData3f(aHighRight)
-        self.vertexWriter.addData3f(aHighLeft)
+        left, right = tuple(self.leftColor), tuple(self.rightColor)
+        self.lastRing = ((aLowLeft, left), (aLowRight, right), (aHighRight, left), (aHighLeft, right))
+        for vertex, color in self.lastRing:
+            self.pathBuilder.addRow(vertex, color)
         
-        self.colorWriter.addData4i(self.leftColor)
-        self.colorWriter.addData4i(self.rightColor)
-        self.colorWriter.addData4i(self.leftColor)
-        self.colorWriter.addData4i(self.rightColor)
+        self.lastRow = (aLowLeft, aLowRight)
         
         return 4
     
@@ -372,89 +413,70 @@ class MyApp(ShowBase):
         return verts * 4
         
     def completeQuadPath(self):
-        self.geomNode.addGeom(self.geom)
-        
-        if self.triStrips.getNumPrimitives() == 0:
-            return
-        
-        floorMesh = CollisionFloorMesh()
-        vertexReader = GeomVertexReader(self.vertexData, 'vertex') 
-        tris = self.triStrips.decompose()
-        print "Decomposed prims:",tris.getNumPrimitives()
-        p = 0
-        for i in range(tris.getNumPrimitives()):
-            v0 = tris.getPrimitiveStart(i)
-            ve = tris.getPrimitiveEnd(i)
-            if v0 < ve:
-                vertexReader.setRow(tris.getVertex(v0))
-                floorMesh.addVertex(Point3(vertexReader.getData3f()))
-                vertexReader.setRow(tris.getVertex(v0+1))
-                floorMesh.addVertex(Point3(vertexReader.getData3f()))
-                vertexReader.setRow(tris.getVertex(v0+2))
-                floorMesh.addVertex(Point3(vertexReader.getData3f()))
-                floorMesh.addTriangle(p, p+1, p+2)
-                p += 3
-        
-        self.floorCollNode.addSolid(floorMesh)
+        # (the floor grid got each quad as it was drawn)
+        self.dropEmptyPrimitives()
+        self.pathChunks.addGeom(self.geom)
         
 
     def completeTunnelPath(self):
-        self.geomNode.addGeom(self.geom)
-        
-        if self.triStrips.getNumPrimitives() == 0:
-            return
-        
-        floorMesh = CollisionFloorMesh()
-        vertexReader = GeomVertexReader(self.vertexData, 'vertex') 
-        
-        print "Original prims:",self.triStrips.getNumPrimitives()
-        
-        p = 0
-        for i in range(self.triStrips.getNumPrimitives()):
-            v0 = self.triStrips.getPrimitiveStart(i)
-            ve = self.triStrips.getPrimitiveEnd(i)
-            j = v0 + 4
-            
-            # add the bottom triangles
-            vertexReader.setRow(self.triStrips.getVertex(j))
-            floorMesh.addVertex(Point3(vertexReader.getData3f()))
-            vertexReader.setRow(self.triStrips.getVertex(j+1))
-            floorMesh.addVertex(Point3(vertexReader.getData3f()))
-            vertexReader.setRow(self.triStrips.getVertex(j+2))
-            floorMesh.addVertex(Point3(vertexReader.getData3f()))
-            floorMesh.addTriangle(p, p+1, p+2)
-            
-            vertexReader.setRow(self.triStrips.getVertex(j+3))
-            floorMesh.addVertex(Point3(vertexReader.getData3f()))
-            floorMesh.addTriangle(p+1, p+3, p+2)
-
-            p += 4
-        
-        # this adds every triangle, but is not appropriate for a closed path
-#         tris = self.triStrips.decompose()
-#         print "Decomposed prims:",tris.getNumPrimitives()
-#         p = 0
-#         for i in range(tris.getNumPrimitives()):
-#             v0 = tris.getPrimitiveStart(i)
-#             ve = tris.getPrimitiveEnd(i)
-#             if v0 < ve:
-#                 vertexReader.setRow(tris.getVertex(v0))
-#                 floorMesh.addVertex(Point3(vertexReader.getData3f()))
-#                 vertexReader.setRow(tris.getVertex(v0+1))
-#                 floorMesh.addVertex(Point3(vertexReader.getData3f()))
-#                 vertexReader.setRow(tris.getVertex(v0+2))
-#                 floorMesh.addVertex(Point3(vertexReader.getData3f()))
-#                 floorMesh.addTriangle(p, p+1, p+2)
-#                 p += 3
-        
-        self.floorCollNode.addSolid(floorMesh)
-        
+        # (the triangles or strips are already in the Geom, and the floor
+        # grid got each ring's bottom as it was drawn)
+        self.dropEmptyPrimitives()
+        self.pathChunks.addGeom(self.geom)
+
+    def dropEmptyPrimitives(self):
+        # only one of the strips and the triangle list was drawn into, and
+        # an empty GeomTristrips fails to decompose when it is rendered
+        for i in reversed(xrange(self.geom.getNumPrimitives())):
+            if not self.geom.getPrimitive(i).getNumVertices():
+                self.geom.removePrimitive(i)
     
           
+    def savePath(self):
+        self.pathRecorder.save(PATH_FILE, SMOOTH_SPACING)
+        print "Saved %d points to %s" % (self.pathRecorder.getNumPoints(), PATH_FILE)
+
+    def addLevels(self, centerline):
+        """ Add the coarser levels of detail for a finished path's centerline. """
+        for level, spacing in enumerate(LOD_SPACINGS, 1):
+            # (pieces no longer than a chunk, so each is switched near where it is)
+            perPiece = max(1, int(self.pathChunks.chunkSize / spacing))
+            for geom in pathbake.makePathGeoms(centerline, self.pathRecorder.kind, spacing, perPiece):
+                self.pathChunks.addGeom(geom, level)
+
+    def loadPath(self, filename):
+        path = pathbake.BakedPath(filename)
+        if path.kind != self.pathRecorder.kind:
+            # (its geometry and centerline don't mix with this program's)
+            print "Not loading %s: it is a %s path, not a %s path" % (
+                filename, pathbake.KIND_NAMES.get(path.kind, path.kind),
+                pathbake.KIND_NAMES[self.pathRecorder.kind])
+            path.close()
+            return
+        for geom in path.makeGeoms():
+            self.pathChunks.addGeom(geom)
+        path.addFloor(self.floorGrid)
+        self.addLevels(path.centerline)
+        self.pathRecorder.addCenterline(path.centerline)
+        path.close()
+        print "Loaded %d points from %s" % (self.pathRecorder.getNumPoints(), filename)
+
     def updatePhysics(self, task):
         pos = self.fpscamera.getPos()
 
-        self.info.setText("Position: {0}, {1}, {2}".format(int(pos.x*100)/100., int(pos.y*100)/100., int(pos.z)/100.))
+        # stand on the floor, if there is one close enough; not while
+        # drawing, when the player flies over the floor just drawn
+        if not self.isDrawing:
+            floorZ = self.floorGrid.getFloorHeight(pos.x, pos.y, pos.z + FLOOR_REACH, pos.z - FLOOR_REACH)
+            if floorZ is not None:
+                self.fpscamera.player.setZ(floorZ)
+
+        # (from the camera, as the chunks' LODNodes measure)
+        eye = self.cam.getPos(self.render)
+        self.pathChunks.update(eye.x, eye.y, eye.z)
+
+        if not self.isDrawing:
+            self.info.setText("Position: {0}, {1}, {2}".format(int(pos.x*100)/100., int(pos.y*100)/100., int(pos.z)/100.))
 
         return task.cont
                           
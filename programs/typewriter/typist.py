@@ -77,6 +77,11 @@ class Typist(object):
         self.setupTexture()
 
         self.scheduler = Scheduler()
+        # carriage and paper moves not yet made, which repeated keys fold into
+        self.carriageMove = None
+        self.carriageMoveBy = 0
+        self.paperMove = None
+        self.paperMoveBy = 0
         task = self.base.taskMgr.add(self.tick, 'timerTask')
         task.setDelay(0.01)
 
@@ -372,15 +377,24 @@ void main() {
         if self.scheduler.isQueueEmpty():
             #self.scheduler.schedule(0.1, self.moveCarriage)
             invl = self.createMoveCarriageInterval(newX, curX=curX)
-            invl.start()
+            self.scheduler.startInterval(invl)
 
     def schedAdjustCarriage(self, bx):
+        if self.carriageMove and self.carriageMove.isPending():
+            # coalesce with the move that is already waiting
+            self.carriageMoveBy += bx
+            if not self.carriageMoveBy:
+                self.carriageMove.cancel()
+            return
+
         if self.scheduler.isQueueEmpty():
             def doit():
-                self.paperX = max(0.0, min(1.0, self.paperX + bx * self.paperCharWidth()))
+                by, self.carriageMoveBy = self.carriageMoveBy, 0
+                self.paperX = max(0.0, min(1.0, self.paperX + by * self.paperCharWidth()))
                 self.moveCarriage()
 
-            self.scheduler.schedule(0.1, doit)
+            self.carriageMoveBy = bx
+            self.carriageMove = self.scheduler.schedule(0.1, doit)
 
 
     def calcPaperPos(self, paperY):
@@ -410,11 +424,20 @@ void main() {
         return posInterval
 
     def schedAdjustPaper(self, by):
+        if self.paperMove and self.paperMove.isPending():
+            # coalesce with the move that is already waiting
+            self.paperMoveBy += by
+            if not self.paperMoveBy:
+                self.paperMove.cancel()
+            return
+
         if self.scheduler.isQueueEmpty():
             def doit():
+                by, self.paperMoveBy = self.paperMoveBy, 0
                 self.schedRollPaper(by)
 
-            self.scheduler.schedule(0.1, doit)
+            self.paperMoveBy = by
+            self.paperMove = self.scheduler.schedule(0.1, doit)
 
     def schedRollPaper(self, by):
         """
@@ -422,16 +445,18 @@ void main() {
         :param percent:
         :return:
         """
+        self.scheduler.spawn(self.rollPaper(by))
 
-        def doit():
-            self.sounds['scroll'].play()
+    def rollPaper(self, by):
+        # wait our turn on the timeline
+        yield self.scheduler.schedule(0.1, None)
 
-            newY = min(1.0, max(0.0, self.paperY + self.paperLineHeight() * by))
+        self.sounds['scroll'].play()
 
-            invl = self.createMovePaperInterval(newY)
-            invl.start()
+        newY = min(1.0, max(0.0, self.paperY + self.paperLineHeight() * by))
 
-        self.scheduler.schedule(0.1, doit)
+        invl = self.createMovePaperInterval(newY)
+        self.scheduler.startInterval(invl)
 
     def schedTypeCharacter(self, keyname):
         # filter for visibility